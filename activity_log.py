@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+from metrics import REGISTRY
+
+FLUSH_INTERVAL = 2.0  # Seconds between writes when the buffer isn't full
+MAX_BATCH = 500  # Events per write (one multi-row INSERT / one LOG_EVENTS request)
+MAX_BUFFERED = 100000  # Beyond this, new events are dropped (and counted)
+MAX_ACTION_LENGTH = 100  # activity_logs.action is VARCHAR(100)
+
+log = logging.getLogger(__name__)
+
+
+def make_event(username, action, timestamp=None, client=None):
+    """One audit event as a dict (also the LOG_EVENTS wire format)."""
+    return {
+        "username": username,
+        "action": action[:MAX_ACTION_LENGTH],
+        "ts": time.time() if timestamp is None else timestamp,
+        "client": client,
+    }
+
+
+class BatchBuffer(ABC):
+    """
+    Buffers events in memory and hands them to write() in batches from a
+    background thread, every 'flush_interval' seconds or as soon as
+    'max_batch' events are waiting. log() never blocks on I/O.
+    Subclasses implement write(batch) -> True if the batch was stored.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH, max_buffered=MAX_BUFFERED, name="events"):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_buffered = max_buffered
+        self.name = name
+
+        self._events = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, username, action, timestamp=None, client=None):
+        self.extend([make_event(username, action, timestamp, client)])
+
+    def extend(self, events):
+        """Queues several events. Returns how many were accepted."""
+        with self._cond:
+            room = self.max_buffered - len(self._events)
+            accepted = events[:max(0, room)]
+            self._events.extend(accepted)
+            if len(accepted) < len(events):
+                self.dropped += len(events) - len(accepted)
+                REGISTRY.inc(f"{self.name}.dropped", len(events) - len(accepted))
+            if len(self._events) >= self.max_batch:
+                self._cond.notify()
+        return len(accepted)
+
+    def __len__(self):
+        return len(self._events)
+
+    def _take(self):
+        with self._cond:
+            count = min(len(self._events), self.max_batch)
+            return [self._events.popleft() for _ in range(count)]
+
+    def _put_back(self, batch):
+        """A failed batch goes back to the front, so events stay in order."""
+        with self._cond:
+            room = self.max_buffered - len(self._events)
+            if room < len(batch):
+                self.dropped += len(batch) - max(0, room)
+                REGISTRY.inc(f"{self.name}.dropped", len(batch) - max(0, room))
+                batch = batch[:max(0, room)]
+            self._events.extendleft(reversed(batch))
+
+    def flush(self):
+        """Writes everything that is buffered now. Returns False if a write failed."""
+        while True:
+            batch = self._take()
+            if not batch:
+                return True
+            if not self.write(batch):
+                self._put_back(batch)
+                return False
+            REGISTRY.inc(f"{self.name}.written", len(batch))
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self._events) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+            try:
+                if not self.flush():
+                    self._stop.wait(self.flush_interval)  # Back off before retrying a failed write
+            except Exception as e:
+                log.error("❌ %s writer error: %s", self.name, e)
+
+        # The last flush also happens here, so two flushes never run at once
+        try:
+            self.flush()
+        except Exception as e:
+            log.error("❌ %s writer error: %s", self.name, e)
+
+    def close(self, timeout=5.0):
+        """Stops the thread after one last flush, waiting up to 'timeout' seconds for it."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.warning("⚠ %s writer still busy after %ss, %s events not written", self.name, timeout, len(self))
+
+    @abstractmethod
+    def write(self, batch):
+        """Stores one batch of events. Returns True on success (False = retry later)."""
+
+
+class ActivityLogWriter(BatchBuffer):
+    """Server side: appends events to activity_logs with multi-row INSERTs."""
+
+    def __init__(self, db, **kwargs):
+        kwargs.setdefault("name", "activity_log")
+        self.db = db
+        super().__init__(**kwargs)
+
+    def write(self, batch):
+        return self.db.insert_activity_logs(batch)
+
+
+class EventUploader(BatchBuffer):
+    """
+    Client side: queues lock / unlock / presence events and uploads them in
+    batches with the LOG_EVENTS action, off the recognition thread.
+    Events survive a server outage (up to 'max_buffered') and are retried.
+    """
+
+    def __init__(self, net, flush_interval=5.0, max_batch=200, max_buffered=10000, **kwargs):
+        kwargs.setdefault("name", "event_upload")
+        self.net = net
+        super().__init__(flush_interval=flush_interval, max_batch=max_batch, max_buffered=max_buffered, **kwargs)
+
+    def write(self, batch):
+        response = self.net.send_request("LOG_EVENTS", {"events": batch})
+        return bool(response and response.get("status") == "SUCCESS")
@@ -0,0 +1,77 @@
+import math
+
+DEFAULT_FACTOR = 0.25  # Same as the fixed resize_factor identify() always used
+MIN_FACTOR = 0.1
+MAX_FACTOR = 1.0
+TARGET_FACE_SIZE = 100  # Face height (px) we want after downscaling, HOG needs ~80
+FRAME_BUDGET = 0.05  # Seconds identify() may spend on one frame
+FULL_SWEEP_EVERY = 15  # Scan the whole frame at least every N frames
+ROI_PADDING = 0.75  # Grow the search region by this many box sizes
+SMOOTHING = 0.3  # How fast the factor follows new measurements
+
+
+class AdaptiveResize:
+    """
+    Chooses how much to downscale and where to look for faces.
+
+    - The factor follows the observed face size (big, close faces can be
+      found in a much smaller image) and is lowered when a frame took
+      longer than the time budget (detection cost grows with factor^2).
+    - Between full-frame sweeps only a padded region around the previous
+      detections is searched.
+    """
+
+    def __init__(self, factor=DEFAULT_FACTOR, frame_budget=FRAME_BUDGET, full_sweep_every=FULL_SWEEP_EVERY,
+                 roi_padding=ROI_PADDING, target_face_size=TARGET_FACE_SIZE):
+        self.default_factor = factor
+        self.factor = factor
+        self.frame_budget = frame_budget
+        self.full_sweep_every = full_sweep_every
+        self.roi_padding = roi_padding
+        self.target_face_size = target_face_size
+
+        self.roi = None  # (top, right, bottom, left) of the next search region, None = whole frame
+        self.frames_since_sweep = None  # None = sweep the next frame
+
+    def plan(self):
+        """Returns (factor, region) for the next frame; region is None for a full sweep."""
+        if self.roi is None or self.frames_since_sweep is None or \
+                self.frames_since_sweep >= self.full_sweep_every - 1:
+            self.frames_since_sweep = 0
+            return self.factor, None
+
+        self.frames_since_sweep += 1
+        return self.factor, self.roi
+
+    def update(self, locations, elapsed, frame_shape, full_sweep):
+        """Feeds back the faces found (full-frame coordinates) and how long the frame took."""
+        if locations:
+            self.roi = self._padded_union(locations, frame_shape)
+
+            # 1. Scale so the smallest face still comes out around target_face_size
+            smallest = min(bottom - top for top, right, bottom, left in locations)
+            wanted = self.target_face_size / max(smallest, 1)
+        else:
+            # Nothing found: search the whole frame again, at the default scale
+            # (a far-away face may simply have been too small)
+            self.roi = None
+            wanted = self.default_factor if full_sweep else self.factor
+
+        # 2. Over budget: shrink, cost is roughly proportional to the pixel count
+        if elapsed > self.frame_budget:
+            wanted = min(wanted, self.factor * math.sqrt(self.frame_budget / elapsed))
+
+        wanted = min(MAX_FACTOR, max(MIN_FACTOR, wanted))
+        self.factor += SMOOTHING * (wanted - self.factor)
+
+    def _padded_union(self, locations, frame_shape):
+        """One region covering every face plus padding, clipped to the frame."""
+        top = min(loc[0] for loc in locations)
+        right = max(loc[1] for loc in locations)
+        bottom = max(loc[2] for loc in locations)
+        left = min(loc[3] for loc in locations)
+
+        pad_y = int((bottom - top) * self.roi_padding)
+        pad_x = int((right - left) * self.roi_padding)
+        return (max(0, top - pad_y), min(frame_shape[1], right + pad_x),
+                min(frame_shape[0], bottom + pad_y), max(0, left - pad_x))
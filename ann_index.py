@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Approximate nearest-neighbour index (inverted file / k-means partitions).
+
+    The gallery is split into 'n_lists' clusters. A query is only compared
+    against the rows of its 'n_probe' closest clusters, so the cost per query
+    is roughly n_probe / n_lists of a brute-force scan.
+    n_probe is the recall/speed knob: n_probe == n_lists is an exact search.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, iterations=10, train_sample=256, seed=0):
+        self.n_lists = n_lists  # None = pick sqrt(N) when building
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.train_sample = train_sample  # Training rows per cluster
+        self.seed = seed
+
+        self.centroids = None
+        self._lists = []  # Row ids per cluster (Python lists, cheap to append)
+        self._arrays = []  # Cached np.int64 copies of _lists, None when stale
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _nearest_centroids(self, rows, count):
+        """Ids of the 'count' closest centroids for every row (R x count)."""
+        c_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        dist_sq = c_sq[None, :] - 2 * (rows @ self.centroids.T)
+        if count == 1:
+            return dist_sq.argmin(axis=1)[:, None]
+        count = min(count, len(self.centroids))
+        nearest = np.argpartition(dist_sq, count - 1, axis=1)[:, :count]
+        return nearest
+
+    def build(self, matrix):
+        """Trains the clusters with k-means and assigns every row to one."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        total = len(matrix)
+        if total == 0:
+            raise ValueError("Cannot build an index over an empty gallery")
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(total)))
+        n_lists = min(n_lists, total)
+        rng = np.random.default_rng(self.seed)
+
+        # 1. Train on a subsample, k-means cost doesn't need every row
+        sample_size = min(total, n_lists * self.train_sample)
+        sample = matrix[rng.choice(total, sample_size, replace=False)]
+        self.centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            labels = self._nearest_centroids(sample, 1)[:, 0]
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, sample)
+
+            # Empty clusters keep their old centroid
+            filled = counts > 0
+            self.centroids[filled] = sums[filled] / counts[filled, None]
+
+        # 2. Assign every row to its closest cluster
+        self._lists = [[] for _ in range(n_lists)]
+        self._arrays = [None] * n_lists
+        self.add(np.arange(total), matrix)
+
+    def add(self, row_ids, rows):
+        """Adds new rows (incrementally, without re-training)."""
+        rows = np.asarray(rows, dtype=np.float32)
+        if len(rows) == 0:
+            return
+
+        labels = self._nearest_centroids(rows, 1)[:, 0]
+        for row_id, label in zip(row_ids, labels):
+            self._lists[label].append(int(row_id))
+            self._arrays[label] = None
+
+    def candidates(self, query, n_probe=None):
+        """Row ids that live in the clusters closest to 'query'."""
+        n_probe = n_probe or self.n_probe
+        probes = self._nearest_centroids(query[None, :], n_probe)[0]
+
+        parts = []
+        for label in probes:
+            if self._arrays[label] is None:
+                self._arrays[label] = np.array(self._lists[label], dtype=np.int64)
+            parts.append(self._arrays[label])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def search(self, matrix, sq_norms, queries, n_probe=None):
+        """
+        Approximate closest row for every query.
+        Returns (best_rows, best_distances); falls back to an exact scan
+        when the probed clusters happen to be empty.
+        """
+        best_rows = np.empty(len(queries), dtype=np.int64)
+        best_dist = np.empty(len(queries), dtype=np.float32)
+
+        for i, query in enumerate(queries):
+            rows = self.candidates(query, n_probe)
+            if len(rows) == 0:
+                rows = np.arange(len(matrix))
+
+            dist_sq = sq_norms[rows] - 2 * (matrix[rows] @ query) + query @ query
+            best = int(dist_sq.argmin())
+            best_rows[i] = rows[best]
+            best_dist[i] = np.sqrt(max(float(dist_sq[best]), 0.0))
+
+        return best_rows, best_dist
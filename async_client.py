@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import logging
+import random
+
+from framing import (DEFAULT_MAX_FRAME_SIZE, SUPPORTED_COMPRESSION, decode_json,
+                     encode_header, encode_payload, read_frame_async)
+
+log = logging.getLogger(__name__)
+
+
+class AsyncNetworkClient:
+    """
+    asyncio counterpart of NetworkClient (same protocol, same request ids).
+    Many coroutines can await requests on one connection at the same time;
+    a reader task routes every reply to the coroutine waiting for it.
+    """
+
+    def __init__(self, server_ip="127.0.0.1", server_port=5000, max_frame_size=DEFAULT_MAX_FRAME_SIZE,
+                 compression=True, timeout=30.0, auto_reconnect=True, max_retries=5,
+                 backoff_base=0.5, backoff_max=30.0):
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.max_frame_size = max_frame_size
+        self.use_compression = compression
+        self.compression = None
+        self.timeout = timeout
+
+        # Reconnect policy
+        self.auto_reconnect = auto_reconnect
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}  # request_id -> asyncio.Future or asyncio.Queue (streamed reply)
+        self._ids = itertools.count(1)
+        self._connect_lock = None  # asyncio.Lock, created inside the running loop
+        self._push_handlers = []  # Called with every server-initiated frame (request id 0)
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    async def connect(self):
+        """Establishes connection to the server."""
+        try:
+            self._reader, self._writer = await asyncio.open_connection(self.server_ip, self.server_port)
+            log.info("✅ Connected to Server at %s:%s", self.server_ip, self.server_port)
+        except OSError as e:
+            log.error("❌ Connection Failed: %s", e)
+            return False
+
+        self.compression = None
+        self._reader_task = asyncio.create_task(self._reader_loop(self._reader, self._writer))
+
+        if self.use_compression:
+            response = await self.request("HELLO", {"compression": list(SUPPORTED_COMPRESSION)})
+            if response and response.get("status") == "SUCCESS":
+                self.compression = response.get("compression")
+        return True
+
+    async def reconnect(self):
+        """Tries to connect again with exponential backoff. Returns True once connected."""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.connected:
+                return True
+            for attempt in range(self.max_retries):
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                log.info("🔄 Reconnecting in %.1fs (attempt %s/%s)...", delay, attempt + 1, self.max_retries)
+                await asyncio.sleep(delay)
+                if await self.connect():
+                    return True
+            return False
+
+    async def _reader_loop(self, reader, writer):
+        error = ConnectionError("Server closed the connection")
+        try:
+            while True:
+                frame = await read_frame_async(reader, self.max_frame_size)
+                if frame is None:
+                    break
+                flags, request_id, payload = frame
+                self._dispatch(request_id, decode_json(payload, flags, self.max_frame_size))
+        except asyncio.CancelledError:
+            error = ConnectionError("Connection closed")
+        except Exception as e:
+            log.warning("❌ Communication Error: %s", e)
+            error = e
+        finally:
+            self._connection_lost(writer, error)
+
+    def on_push(self, handler):
+        """handler(notice) is called on the event loop for every frame the server sends on its own."""
+        self._push_handlers.append(handler)
+
+    def _dispatch(self, request_id, response):
+        if request_id == 0:
+            for handler in list(self._push_handlers):
+                try:
+                    handler(response)
+                except Exception as e:
+                    log.error("❌ Push handler error: %s", e)
+            return
+
+        waiter = self._pending.get(request_id)
+        if isinstance(waiter, asyncio.Queue):
+            waiter.put_nowait(response)
+            if response.get("status") != "SUCCESS" or not response.get("more", False):
+                del self._pending[request_id]
+        elif waiter is not None:
+            del self._pending[request_id]
+            if not waiter.done():
+                waiter.set_result(response)
+
+    def _connection_lost(self, writer, error):
+        if self._writer is writer:
+            self._reader = self._writer = None
+            pending, self._pending = self._pending, {}
+            for waiter in pending.values():
+                if isinstance(waiter, asyncio.Queue):
+                    waiter.put_nowait(error)
+                elif not waiter.done():
+                    waiter.set_exception(error)
+        writer.close()
+
+    async def _submit(self, action, data, waiter):
+        if not self.connected and not (self.auto_reconnect and await self.reconnect()):
+            raise ConnectionError("Not connected to server")
+
+        req = {"action": action}
+        if data:
+            req.update(data)
+
+        request_id = next(self._ids) % 0xFFFFFFFF + 1  # 0 is reserved for pushes
+        self._pending[request_id] = waiter
+        payload, flags = encode_payload(req, self.compression)
+        # No await between the two writes, so frames from different coroutines never interleave
+        self._writer.write(encode_header(len(payload), flags, request_id))
+        self._writer.write(payload)
+        await self._writer.drain()
+        return request_id
+
+    async def request(self, action, data=None, timeout=None):
+        """Sends one request and waits for its reply. Returns None if it failed."""
+        future = asyncio.get_running_loop().create_future()
+        request_id = None
+        try:
+            request_id = await self._submit(action, data, future)
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except Exception as e:
+            self._pending.pop(request_id, None)
+            log.warning("❌ Communication Error: %s", e or type(e).__name__)
+            return None
+
+    async def batch(self, requests, timeout=None):
+        """Sends several (action, data) pairs in one frame; returns their replies in order."""
+        sub_requests = []
+        for action, data in requests:
+            req = {"action": action}
+            if data:
+                req.update(data)
+            sub_requests.append(req)
+
+        response = await self.request("BATCH", {"requests": sub_requests}, timeout)
+        if response and response.get("status") == "SUCCESS":
+            return response["responses"]
+        return None
+
+    async def fetch_users_stream(self, page_size=500, precision=None):
+        """Async generator over the pages of a paginated FETCH_USERS (see NetworkClient)."""
+        pages = asyncio.Queue()
+        request_id = None
+        data = {"page_size": page_size}
+        if precision:
+            data["precision"] = precision
+        try:
+            request_id = await self._submit("FETCH_USERS", data, pages)
+            while True:
+                page = await asyncio.wait_for(pages.get(), self.timeout)
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+                if page.get("status") != "SUCCESS" or not page.get("more", False):
+                    break
+
+        except Exception as e:
+            log.warning("❌ Communication Error: %s", e or type(e).__name__)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        writer = self._writer
+        if self._reader_task:
+            self._reader_task.cancel()
+        if writer:
+            self._connection_lost(writer, ConnectionError("Connection closed"))
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
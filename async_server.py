@@ -0,0 +1,223 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from framing import FrameError, decode_json, encode_header, encode_payload, read_frame_async
+from server_main import (RentalServer, ClientSession, StreamedResponse, log, record_request,
+                         SERVER_IP, SERVER_PORT, MAX_REQUEST_SIZE, IDENTIFY_TIMEOUT)
+
+# Configuration (asyncio mode)
+ASYNC_BACKLOG = 4096  # Morning logon storms need a deep accept queue
+DB_WORKERS = 16  # Threads that run blocking DB work and JSON encoding
+MAX_PENDING_REQUESTS = 256  # In-flight requests before we stop reading sockets
+MAX_IN_FLIGHT_PER_CONNECTION = 32  # Pipelined requests one client may have open
+
+
+def raise_fd_limit(target=65536):
+    """
+    Every idle workstation keeps a socket open, so the default limit of
+    1024 file descriptors is too small. Raises the soft limit (Unix only).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows: no RLIMIT_NOFILE, sockets are not fds there
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = target if hard == resource.RLIM_INFINITY else min(target, hard)
+    if soft < wanted:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+            soft = wanted
+        except (ValueError, OSError) as e:
+            log.warning("⚠ Could not raise file descriptor limit: %s", e)
+    return soft
+
+
+class AsyncRentalServer(RentalServer):
+    """
+    Same length-prefixed JSON protocol as RentalServer, but every client is
+    served by one asyncio event loop instead of an OS thread each.
+    Blocking DB work runs on a bounded thread pool; once 'max_pending'
+    requests are in flight we stop reading from sockets (backpressure).
+    """
+
+    def __init__(self, host=SERVER_IP, port=SERVER_PORT, backlog=ASYNC_BACKLOG,
+                 db_workers=DB_WORKERS, max_pending=MAX_PENDING_REQUESTS, idle_timeout=None, db=None):
+        super().__init__(host=host, port=port, backlog=backlog, db=db)
+        self.executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="db-worker")
+        self.max_pending = max_pending
+        self.idle_timeout = idle_timeout  # Seconds without a request before we hang up (None = never)
+        self.connections = 0
+
+        self._pending = None  # asyncio.Semaphore, must be created inside the running loop
+
+    def _process_and_encode(self, request, session):
+        """
+        Runs on the executor: routing may hit the DB and big replies are slow
+        to encode/compress. Returns (payload, flags), or the StreamedResponse
+        for paginated replies.
+        """
+        response = self.process_request(request, session)
+        if isinstance(response, StreamedResponse):
+            return response
+        return encode_payload(response, session.compression)
+
+    def _next_part(self, reply, session):
+        """Runs on the executor: produces and encodes the next page (None when done)."""
+        part = reply.next_part()
+        if part is None:
+            return None
+        return encode_payload(part, session.compression)
+
+    async def _send(self, writer, write_lock, payload, flags, request_id):
+        # Several requests of one client are answered concurrently: keep frames whole
+        async with write_lock:
+            writer.write(encode_header(len(payload), flags, request_id))
+            writer.write(payload)
+            await writer.drain()  # Waits while the client's socket buffer is full
+
+    async def _push(self, writer, write_lock, session, notice):
+        """Sends a server-initiated frame (request id 0), e.g. a rental expiry notice."""
+        try:
+            payload, flags = encode_payload(notice, session.compression)
+            await self._send(writer, write_lock, payload, flags, 0)
+        except Exception:
+            pass  # The connection is closing, unwatch_all will clean up
+
+    async def _serve_request(self, writer, write_lock, session, request, request_id, slots):
+        """Processes one request and sends its reply frame(s), tagged with request_id."""
+        loop = asyncio.get_running_loop()
+        try:
+            if request.get("action") == "IDENTIFY":
+                # Waits for the shared batch without holding a worker thread,
+                # so thousands of clients can be coalesced into one batch
+                start = time.perf_counter()
+                pending = self.start_identify(request)
+                if not isinstance(pending, dict):
+                    # Same replies as the threaded server
+                    try:
+                        matches = await asyncio.wait_for(asyncio.wrap_future(pending), IDENTIFY_TIMEOUT)
+                        pending = self.identify_response(matches)
+                    except asyncio.TimeoutError:
+                        pending = {"status": "ERROR", "message": "IDENTIFY timed out"}
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        log.warning("⚠ IDENTIFY failed: %s", e)
+                        pending = {"status": "ERROR", "message": "IDENTIFY failed"}
+                record_request("IDENTIFY", time.perf_counter() - start)
+                reply = encode_payload(pending, session.compression)
+            else:
+                # Process on the worker pool, bounded by the pending-requests semaphore
+                async with self._pending:
+                    reply = await loop.run_in_executor(self.executor, self._process_and_encode, request, session)
+
+            # A streamed reply is produced one page at a time,
+            # so a slow client also slows down how fast we read from the DB
+            if isinstance(reply, StreamedResponse):
+                try:
+                    while True:
+                        async with self._pending:
+                            encoded = await loop.run_in_executor(self.executor, self._next_part, reply, session)
+                        if encoded is None:
+                            break
+                        await self._send(writer, write_lock, *encoded, request_id)
+                finally:
+                    # Closing may run DB cleanup, keep that off the event loop. It waits for a
+                    # page still being read on another worker, and finishes even if we're cancelled.
+                    await asyncio.shield(loop.run_in_executor(self.executor, reply.close))
+            else:
+                await self._send(writer, write_lock, *reply, request_id)
+
+        except asyncio.CancelledError:
+            raise  # Connection is closing
+        except ConnectionError:
+            pass  # Client went away, nothing to answer
+        except Exception as e:
+            log.error("❌ Error handling %s from %s: %s", request.get('action'), session.addr, e)
+            try:
+                error, flags = encode_payload({"status": "ERROR", "message": "Internal server error"})
+                await self._send(writer, write_lock, error, flags, request_id)
+            except Exception:
+                pass
+        finally:
+            slots.release()
+
+    async def handle_client_async(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        session = ClientSession(addr)
+        write_lock = asyncio.Lock()
+        # Pipelining limit: once a client has this many requests open we stop reading its socket
+        slots = asyncio.Semaphore(MAX_IN_FLIGHT_PER_CONNECTION)
+        in_flight = set()
+        # Rental notices come from the expiry thread: hand them over to the event loop
+        loop = asyncio.get_running_loop()
+        session.push = lambda notice: loop.call_soon_threadsafe(
+            lambda: asyncio.ensure_future(self._push(writer, write_lock, session, notice))
+        )
+        self.connections += 1
+        log.info("🔗 New Connection from: %s (%s open)", addr, self.connections)
+
+        try:
+            while True:
+                # 1. Read one frame (header + payload)
+                frame = await asyncio.wait_for(read_frame_async(reader, MAX_REQUEST_SIZE), self.idle_timeout)
+                if frame is None:
+                    break  # Client disconnected
+
+                # 2. Decode the request
+                flags, request_id, payload = frame
+                request = decode_json(payload, flags, MAX_REQUEST_SIZE)
+                log.debug("📩 Request from %s: %s", addr, request.get('action'))
+
+                # 3. Serve it in its own task so pipelined requests don't wait for each other.
+                # HELLO changes the session, so it finishes before we read anything else.
+                await slots.acquire()
+                task = asyncio.create_task(
+                    self._serve_request(writer, write_lock, session, request, request_id, slots)
+                )
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                if request.get("action") == "HELLO":
+                    await task
+
+        except FrameError as e:
+            log.warning("⚠ Bad frame from %s: %s", addr, e)
+        except asyncio.TimeoutError:
+            log.info("⌛ Idle timeout: %s", addr)
+        except Exception as e:
+            log.warning("⚠ Connection Error %s: %s", addr, e)
+        finally:
+            for task in list(in_flight):
+                task.cancel()
+            self.unwatch_all(session)
+            self.connections -= 1
+            log.info("❌ Disconnected: %s", addr)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def serve(self):
+        self._pending = asyncio.Semaphore(self.max_pending)
+        server = await asyncio.start_server(
+            self.handle_client_async, self.host, self.port,
+            backlog=self.backlog, reuse_address=True
+        )
+        log.info("✅ ASYNC SERVER STARTED on %s:%s (backlog %s)", self.host, self.port, self.backlog)
+        log.info("Waiting for clients...")
+
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        limit = raise_fd_limit()
+        if limit:
+            log.info("📂 File descriptor limit: %s", limit)
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.executor.shutdown(wait=False)
+            self.close()
@@ -0,0 +1,3 @@
+# Offline benchmarks: no webcam and no MySQL needed.
+#   python -m benchmarks.recognition_bench --synthetic --frames 300
+#   python -m benchmarks.server_load --clients 50 --gallery-sizes 10,1000,100000
@@ -0,0 +1,174 @@
+import threading
+import time
+
+import numpy as np
+
+from database_manager import CHANGELOG_RETENTION, users_to_json
+from encoding_format import ENCODING_DTYPE
+from face_matcher import ENCODING_DIM
+
+
+class MemoryDatabase:
+    """
+    In-memory stand-in for DatabaseManager (same read/write methods the
+    server uses), so the server can be benchmarked without MySQL.
+    Keeps the same gallery version / change log semantics.
+    """
+
+    def __init__(self):
+        self._users = {}  # username -> (angles x dim float32 matrix, added_version), insertion ordered
+        self._changes = []  # (version, username, op), oldest first
+        self._version = 0
+        self.activity_logs = []
+        self.rental_sessions = {}  # session_id -> row dict
+        self._lock = threading.Lock()
+
+    def populate(self, count, angles=1, seed=0):
+        """Registers 'count' synthetic users with random (unit length) encodings."""
+        rng = np.random.default_rng(seed)
+        for i in range(count):
+            encodings = rng.standard_normal((angles, ENCODING_DIM)).astype(ENCODING_DTYPE)
+            encodings /= np.linalg.norm(encodings, axis=1, keepdims=True)
+            self.register_user(f"user{i:06d}", "x", encodings, quiet=True)
+
+    def register_user(self, username, password, face_encoding_list, quiet=False):
+        encodings = np.asarray(face_encoding_list, dtype=ENCODING_DTYPE).reshape(-1, ENCODING_DIM)
+        with self._lock:
+            if username in self._users:
+                print(f"⚠ Error: Username '{username}' already exists.")
+                return None
+            version = self._bump_version(username, "ADD")
+            self._users[username] = (encodings, version)
+        if not quiet:
+            print(f"✅ User {username} registered!")
+        return username
+
+    def register_users(self, users, chunk_size=None):
+        registered = []
+        failed = {}
+        seen = set()
+        for username, password, encodings in users:
+            if username in seen:
+                failed[username] = "Duplicate username in import"
+                continue
+            seen.add(username)
+            if self.register_user(username, password, encodings, quiet=True):
+                registered.append(username)
+            else:
+                failed[username] = "Username already exists"
+        return registered, failed
+
+    def delete_user(self, username):
+        with self._lock:
+            if self._users.pop(username, None) is None:
+                print(f"❌ User '{username}' not found.")
+                return False
+            self._bump_version(username, "DEL")
+        return True
+
+    def get_usernames(self):
+        with self._lock:
+            return sorted(self._users)
+
+    def delete_users(self, usernames):
+        deleted, missing = [], []
+        with self._lock:
+            for username in dict.fromkeys(usernames):
+                if self._users.pop(username, None) is None:
+                    missing.append(username)
+                else:
+                    self._bump_version(username, "DEL")
+                    deleted.append(username)
+        return deleted, missing
+
+    def delete_all_users(self):
+        with self._lock:
+            deleted = len(self._users)
+            self._users.clear()
+            self._changes.clear()
+            self._version += 1
+        return deleted
+
+    def _bump_version(self, username, op):
+        self._version += 1
+        self._changes.append((self._version, username, op))
+        if len(self._changes) > CHANGELOG_RETENTION:
+            del self._changes[:len(self._changes) - CHANGELOG_RETENTION]
+        return self._version
+
+    def get_gallery_version(self):
+        return self._version
+
+    def _gallery(self, users):
+        names = []
+        blocks = []
+        for name, (matrix, _) in users:
+            names.extend([name] * len(matrix))
+            blocks.append(matrix)
+        if not blocks:
+            return [], np.empty((0, 0), dtype=ENCODING_DTYPE)
+        return names, np.concatenate(blocks)
+
+    def get_gallery(self):
+        with self._lock:
+            users = list(self._users.items())
+        return self._gallery(users)
+
+    def get_gallery_changes(self, since_version):
+        with self._lock:
+            version = self._version
+            if since_version > version:
+                return None
+            if since_version == version:
+                return version, [], [], np.empty((0, 0), dtype=ENCODING_DTYPE)
+            if not self._changes or self._changes[0][0] > since_version + 1:
+                return None
+
+            removed = list(dict.fromkeys(name for v, name, op in self._changes if v > since_version))
+            added = [(name, user) for name, user in self._users.items() if user[1] > since_version]
+        names, matrix = self._gallery(added)
+        return version, removed, names, matrix
+
+    def iter_users(self, batch_size=500):
+        for names, matrix in self.iter_gallery(batch_size):
+            yield users_to_json(names, matrix)
+
+    def iter_gallery(self, batch_size=500):
+        with self._lock:
+            users = list(self._users.items())
+        for start in range(0, len(users), batch_size):
+            names, matrix = self._gallery(users[start:start + batch_size])
+            if names:
+                yield names, matrix
+
+    def get_all_users(self):
+        names, matrix = self.get_gallery()
+        return users_to_json(names, matrix)
+
+    def insert_activity_logs(self, events):
+        with self._lock:
+            self.activity_logs.extend(events)
+        return True
+
+    def get_activity_logs(self, username=None, since=None, until=None, limit=1000):
+        with self._lock:
+            events = [e for e in self.activity_logs if username is None or e["username"] == username]
+        return sorted(events, key=lambda e: e["ts"], reverse=True)[:limit]
+
+    def save_rental_sessions(self, sessions):
+        with self._lock:
+            for row in sessions:
+                self.rental_sessions[row["session_id"]] = dict(row)
+        return True
+
+    def load_active_rental_sessions(self):
+        now = time.time()
+        with self._lock:
+            return [dict(row) for row in self.rental_sessions.values()
+                    if row["status"] == "ACTIVE" and row["expires_at"] > now]
+
+    def pool_stats(self):
+        return {}
+
+    def close(self):
+        pass
@@ -0,0 +1,142 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from client_gallery import load_gallery, precision_of
+from face_matcher import DEFAULT_TOLERANCE, ENCODING_DIM, FaceMatcher
+from gallery_cache import encode_rows
+from quantization import PRECISIONS, dequantize
+
+BASELINE_CHUNK = 2048  # Gallery rows per float64 distance block
+
+
+def synthetic_gallery(users, angles=2, seed=0):
+    """
+    Users spread like dlib embeddings (unrelated people ~1.0 apart, angles of
+    one person ~0.35 apart). Returns (names, float32 matrix).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, (users, ENCODING_DIM))
+    rows = centers[:, None, :] + rng.normal(0, 0.02, (users, angles, ENCODING_DIM))
+    names = [f"user{i:06d}" for i in range(users) for _ in range(angles)]
+    return names, rows.reshape(-1, ENCODING_DIM).astype(np.float32)
+
+
+def make_queries(matrix, count, noise, seed=0):
+    """
+    Probes around random gallery rows, at distances spread over 0..2*noise,
+    so plenty of them land near the tolerance where rounding can flip a decision.
+    """
+    rng = np.random.default_rng(seed + 1)
+    picked = rng.integers(0, len(matrix), count)
+    directions = rng.standard_normal((count, matrix.shape[1]))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    lengths = rng.uniform(0, 2 * noise, (count, 1))
+    return (matrix[picked].astype(np.float64) + directions * lengths).astype(np.float32)
+
+
+def baseline_match(names, matrix, queries, tolerance):
+    """Exact float64 brute force: [(name, distance)] like FaceMatcher.match."""
+    gallery = matrix.astype(np.float64)
+    queries = queries.astype(np.float64)
+    best_rows = np.zeros(len(queries), dtype=np.int64)
+    best_dist = np.full(len(queries), np.inf)
+    q_sq = np.einsum('ij,ij->i', queries, queries)
+    for start in range(0, len(gallery), BASELINE_CHUNK):
+        block = gallery[start:start + BASELINE_CHUNK]
+        # In float64 the expanded form's rounding (~1e-15) is far below anything we measure
+        dist_sq = q_sq[:, None] + np.einsum('ij,ij->i', block, block)[None, :] - 2 * (queries @ block.T)
+        dist = np.sqrt(np.maximum(dist_sq, 0))
+        rows = dist.argmin(axis=1)
+        closest = dist[np.arange(len(queries)), rows]
+        better = closest < best_dist
+        best_dist[better] = closest[better]
+        best_rows[better] = rows[better] + start
+    return [(names[row] if d <= tolerance else "Unknown", float(d)) for row, d in zip(best_rows, best_dist)]
+
+
+def compare(names, matrix, queries, tolerance, precision, baseline):
+    """Agreement of one precision with the float64 decisions, plus its costs."""
+    matcher = FaceMatcher(tolerance=tolerance, precision=precision)
+    matcher.add_many(names, matrix)
+
+    start = time.perf_counter()
+    results = matcher.match(queries)
+    elapsed = time.perf_counter() - start
+
+    same = sum(a[0] == b[0] for a, b in zip(baseline, results))
+    # Accepted <-> Unknown flips matter more than one known user for another
+    lost = sum(a[0] != "Unknown" and b[0] == "Unknown" for a, b in zip(baseline, results))
+    gained = sum(a[0] == "Unknown" and b[0] != "Unknown" for a, b in zip(baseline, results))
+    errors = np.abs([a[1] - b[1] for a, b in zip(baseline, results)])
+    return {
+        "precision": precision,
+        "agreement": same / len(queries),
+        "rejected": lost,
+        "accepted": gained,
+        "swapped": len(queries) - same - lost - gained,
+        "dist_err_mean": float(errors.mean()),
+        "dist_err_max": float(errors.max()),
+        "memory": matcher.nbytes,
+        "wire": len(json.dumps(encode_rows(names, matrix, precision)).encode('utf-8')),
+        "ms_per_query": elapsed * 1000 / len(queries),
+    }
+
+
+def print_table(reports, json_bytes):
+    print(f"{'precision':<10}{'agree':>9}{'lost':>6}{'new':>6}{'swap':>6}{'dist err':>11}{'max':>9}"
+          f"{'memory':>12}{'wire':>12}{'ms/q':>8}")
+    for r in reports:
+        print(f"{r['precision']:<10}{r['agreement']:>9.4%}{r['rejected']:>6}{r['accepted']:>6}{r['swapped']:>6}"
+              f"{r['dist_err_mean']:>11.2e}{r['dist_err_max']:>9.1e}"
+              f"{r['memory'] / 1024:>10.0f}KB{r['wire'] / 1024:>10.0f}KB{r['ms_per_query']:>8.3f}")
+    print(f"(JSON numbers on the wire: {json_bytes / 1024:.0f}KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match-decision agreement of float32 / float16 / int8 galleries "
+                                                 "with an exact float64 baseline")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", action="store_true", help="Use the gallery stored in MySQL")
+    source.add_argument("--cache", help="Use a float32 .fgal gallery cache file")
+    parser.add_argument("--synthetic", type=int, default=5000, help="Synthetic users (when no gallery is given)")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--noise", type=float, default=DEFAULT_TOLERANCE,
+                        help="Probes are up to 2x this far from a gallery row")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.db:
+        from database_manager import DatabaseManager
+        names, matrix = DatabaseManager().get_gallery()
+    elif args.cache:
+        cached = load_gallery(args.cache)
+        if cached is None:
+            raise SystemExit(f"Can't read {args.cache}")
+        _, names, codes, _, scale = cached
+        precision = precision_of(codes.dtype)
+        if precision != "float32":
+            print(f"⚠ {args.cache} is already {precision}: the baseline is that, not the original gallery")
+        names, matrix = list(names), dequantize(codes, precision, scale)
+    else:
+        names, matrix = synthetic_gallery(args.synthetic, seed=args.seed)
+
+    if len(names) == 0:
+        raise SystemExit("The gallery is empty")
+    matrix = np.asarray(matrix, dtype=np.float32)
+    queries = make_queries(matrix, args.queries, args.noise, args.seed)
+    print(f"▶ {len(names)} gallery rows, {len(queries)} probes, tolerance {args.tolerance}")
+
+    baseline = baseline_match(names, matrix, queries, args.tolerance)
+    accepted = sum(name != "Unknown" for name, _ in baseline)
+    print(f"  float64 baseline accepts {accepted}/{len(queries)} probes")
+
+    reports = [compare(names, matrix, queries, args.tolerance, p, baseline) for p in PRECISIONS]
+    print_table(reports, len(json.dumps(encode_rows(names, matrix)).encode('utf-8')))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+import main_client
+from benchmarks.replay_source import ReplaySource, SyntheticSource
+from benchmarks.timing import LatencyRecorder, print_report
+from face_matcher import ENCODING_DIM
+from face_tracker import FaceTracker
+from main_client import FaceAuthenticator, SecuritySystem
+
+
+class HeadlessSecuritySystem(SecuritySystem):
+    """SecuritySystem without a window and without really locking the PC."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("show_window", False)
+        super().__init__(*args, **kwargs)
+        self.locks = 0
+        self.unlocks = 0
+
+    def lock_computer(self):
+        self.locks += 1
+        self.current_user = None
+        self.is_locked = True
+        self.missing_frames_count = 0
+
+    def unlock_computer(self, username):
+        self.unlocks += 1
+        super().unlock_computer(username)
+
+
+def build_gallery(auth, size, face_images, seed=0):
+    """'size' random users plus the real encodings of the replayed faces (face0, face1, ...)."""
+    rng = np.random.default_rng(seed)
+    if size:
+        encodings = rng.standard_normal((size, ENCODING_DIM)).astype(np.float32)
+        encodings *= 0.6 / np.linalg.norm(encodings, axis=1, keepdims=True)  # Typical dlib norm
+        auth.matcher.add_many([f"user{i:06d}" for i in range(size)], encodings)
+
+    for i, image in enumerate(face_images):
+        found = face_recognition.face_encodings(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if found:
+            auth.matcher.add(f"face{i}", found[0])
+        else:
+            print(f"⚠ No face found in face image #{i}, it won't be recognized")
+
+
+def instrument(auth):
+    """Times the stages of FaceAuthenticator.identify. Returns the recorders."""
+    detect = LatencyRecorder("detect")
+    encode = LatencyRecorder("encode")
+    match = LatencyRecorder("match")
+    main_client.face_recognition.face_locations = detect.wrap(face_recognition.face_locations)
+    main_client.face_recognition.face_encodings = encode.wrap(face_recognition.face_encodings)
+    auth.matcher.match = match.wrap(auth.matcher.match)
+    return [detect, encode, match]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless recognition benchmark (no webcam needed)")
+    parser.add_argument("--video", help="Video file to replay (default: synthetic frames)")
+    parser.add_argument("--face", action="append", default=[],
+                        help="Face image pasted into synthetic frames and enrolled in the gallery (repeatable)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--gallery", type=int, default=1000, help="Synthetic users in the gallery")
+    parser.add_argument("--mode", choices=("identify", "tracker", "system", "pipeline"), default="identify")
+    parser.add_argument("--adaptive", action="store_true", help="Adaptive resize factor + ROI")
+    parser.add_argument("--index", action="store_true", help="Use the IVF index for matching")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # 1. Frame source
+    face_images = [cv2.imread(path) for path in args.face]
+    if any(image is None for image in face_images):
+        parser.error("Could not read one of the --face images")
+    if args.video:
+        source = ReplaySource(args.video, max_frames=args.frames)
+    else:
+        source = SyntheticSource(args.width, args.height, args.frames, faces=face_images, seed=args.seed)
+
+    # 2. Recognizer with a gallery of the requested size
+    auth = FaceAuthenticator(cache_path=None, adaptive=args.adaptive, use_index=args.index)
+    build_gallery(auth, args.gallery, face_images, args.seed)
+    if args.index:
+        auth.matcher.build_index(n_probe=auth.n_probe)
+    stages = instrument(auth)
+    recognizer = FaceTracker(auth) if args.mode == "tracker" else auth
+    total = LatencyRecorder("frame")
+
+    print(f"▶ {args.mode}: {args.frames} frames, gallery {len(auth.matcher)} rows")
+    start = time.perf_counter()
+
+    # 3. Run
+    if args.mode in ("identify", "tracker"):
+        while True:
+            ret, frame = source.get_frame()
+            if not ret:
+                break
+            total.time(recognizer.identify, frame)
+    else:
+        system = HeadlessSecuritySystem(recognizer, source, pipelined=args.mode == "pipeline")
+        system.recognize = total.wrap(system.recognize)
+        system.run()
+        print(f"🔓 unlocks: {system.unlocks}  🔒 locks: {system.locks}")
+
+    elapsed = time.perf_counter() - start
+    print_report(f"{args.mode} ({elapsed:.2f}s)", [total] + stages, elapsed)
+    if isinstance(recognizer, FaceTracker):
+        print(f"  full detections: {recognizer.detections}, tracked frames: {recognizer.tracked_frames}")
+
+
+if __name__ == "__main__":
+    main()
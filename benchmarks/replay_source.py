@@ -0,0 +1,110 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class ReplaySource:
+    """
+    WebcamStream-compatible source that plays a video file.
+    With preload=True every frame is decoded up front, so disk and codec
+    speed don't end up in the measurement. realtime=True paces frames at
+    the file's fps, like a real camera would.
+    """
+
+    def __init__(self, path, loop=False, preload=True, realtime=False, max_frames=None):
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+        self.frames = None
+        self.position = 0
+
+        self.video_capture = cv2.VideoCapture(path)
+        if not self.video_capture.isOpened():
+            raise ValueError(f"Unable to open video '{path}'.")
+        fps = self.video_capture.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        self._next_frame_at = None
+
+        if preload:
+            self.frames = []
+            while max_frames is None or len(self.frames) < max_frames:
+                ret, frame = self.video_capture.read()
+                if not ret:
+                    break
+                self.frames.append(frame)
+            self.video_capture.release()
+
+    def _pace(self):
+        now = time.monotonic()
+        if self._next_frame_at is not None and now < self._next_frame_at:
+            time.sleep(self._next_frame_at - now)
+        self._next_frame_at = max(now, self._next_frame_at or now) + self.frame_interval
+
+    def get_frame(self):
+        if self.realtime:
+            self._pace()
+
+        if self.frames is not None:
+            if self.position >= len(self.frames):
+                if not self.loop or not self.frames:
+                    return False, None
+                self.position = 0
+            frame = self.frames[self.position]
+            self.position += 1
+            return True, frame.copy()  # Callers draw on the frame
+
+        ret, frame = self.video_capture.read()
+        if not ret and self.loop:
+            self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.video_capture.read()
+        return ret, frame
+
+    def release(self):
+        if self.frames is None:
+            self.video_capture.release()
+
+
+class SyntheticSource:
+    """
+    WebcamStream-compatible source of generated frames (reproducible, seeded).
+    Background noise, plus optional face images that drift slowly across
+    the picture, so detection, tracking and ROI logic have something to follow.
+    """
+
+    def __init__(self, width=640, height=480, frames=300, faces=(), seed=0, realtime_fps=None):
+        self.width = width
+        self.height = height
+        self.frame_count = frames
+        self.faces = list(faces)  # BGR images pasted into every frame
+        self.realtime_fps = realtime_fps
+        self.position = 0
+
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        # Start position and velocity (pixels per frame) of every face
+        self.paths = [
+            (rng.uniform(0, max(1, width - face.shape[1])), rng.uniform(0, max(1, height - face.shape[0])),
+             rng.uniform(-2, 2), rng.uniform(-2, 2))
+            for face in self.faces
+        ]
+
+    def get_frame(self):
+        if self.position >= self.frame_count:
+            return False, None
+        if self.realtime_fps:
+            time.sleep(1.0 / self.realtime_fps)
+
+        frame = self.background.copy()
+        for face, (x, y, vx, vy) in zip(self.faces, self.paths):
+            h, w = face.shape[:2]
+            # Bounce between the frame edges
+            px = int(abs((x + vx * self.position) % (2 * max(1, self.width - w)) - max(1, self.width - w)))
+            py = int(abs((y + vy * self.position) % (2 * max(1, self.height - h)) - max(1, self.height - h)))
+            frame[py:py + h, px:px + w] = face[:self.height - py, :self.width - px]
+
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        pass
@@ -0,0 +1,131 @@
+import argparse
+import random
+import socket
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.memory_db import MemoryDatabase
+from benchmarks.timing import LatencyRecorder, print_report
+from face_matcher import ENCODING_DIM
+from network_client import NetworkClient
+from server_main import RentalServer
+
+DEFAULT_MIX = "identify=5,check=4,sync=1"
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db, use_async, port):
+    """Runs a RentalServer (or AsyncRentalServer) on 'port' in a background thread."""
+    if use_async:
+        from async_server import AsyncRentalServer
+        server = AsyncRentalServer(host="127.0.0.1", port=port, db=db)
+    else:
+        server = RentalServer(host="127.0.0.1", port=port, db=db)
+    threading.Thread(target=server.start, daemon=True).start()
+
+    # Wait until it accepts connections
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Server did not start")
+
+
+def parse_mix(text):
+    """'identify=5,check=4,sync=1' -> (actions, weights)."""
+    actions, weights = [], []
+    for part in text.split(","):
+        action, weight = part.split("=")
+        actions.append(action.strip())
+        weights.append(float(weight))
+    return actions, weights
+
+
+def client_worker(port, duration, mix, recorders, errors, seed, compression):
+    """One simulated workstation: cold sync, then a random mix of requests until 'duration' is over."""
+    rng = random.Random(seed)
+    queries = np.random.default_rng(seed).standard_normal((16, ENCODING_DIM)).astype(np.float32) * 0.05
+    net = NetworkClient(server_ip="127.0.0.1", server_port=port, compression=compression, auto_reconnect=False)
+    if not recorders["connect"].time(net.connect):
+        errors.append("connect")
+        return
+
+    # Cold start: full gallery download
+    response = recorders["full_sync"].time(net.send_request, "FETCH_USERS")
+    version = response.get("version") if response else None
+
+    actions, weights = mix
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        action = rng.choices(actions, weights)[0]
+        if action == "identify":
+            response = recorders["identify"].time(
+                net.send_request, "IDENTIFY", {"embeddings": queries[:rng.randint(1, 2)].tolist()})
+        elif action == "check":
+            response = recorders["check"].time(net.send_request, "CHECK_RENTAL", {"user_id": "bench"})
+        else:
+            response = recorders["sync"].time(net.send_request, "FETCH_USERS", {"since_version": version or 0})
+            if response and response.get("status") == "SUCCESS":
+                version = response.get("version", version)
+
+        if not response or response.get("status") != "SUCCESS":
+            errors.append(action)
+
+    net.close()
+
+
+def run(gallery_size, clients, duration, mix, use_async, compression, seed):
+    db = MemoryDatabase()
+    db.populate(gallery_size, seed=seed)
+    port = free_port()
+    start_server(db, use_async, port)
+
+    recorders = {name: LatencyRecorder(name) for name in ("connect", "full_sync", "identify", "check", "sync")}
+    errors = []
+    threads = [
+        threading.Thread(target=client_worker,
+                         args=(port, duration, mix, recorders, errors, seed + i, compression), daemon=True)
+        for i in range(clients)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    kind = "async" if use_async else "threaded"
+    print_report(f"{kind} server, gallery {gallery_size}, {clients} clients ({elapsed:.1f}s)",
+                 recorders.values(), elapsed)
+    print(f"  errors: {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the rental server (in-memory DB, no MySQL)")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds every client keeps sending")
+    parser.add_argument("--gallery-sizes", default="10,1000,100000")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Relative weights of identify / check / sync requests")
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    parser.add_argument("--no-compression", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    for size in (int(s) for s in args.gallery_sizes.split(",")):
+        run(size, args.clients, args.duration, mix, args.use_async, not args.no_compression, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyRecorder:
+    """Collects latency samples (seconds) for one stage; thread-safe."""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def time(self, fn, *args, **kwargs):
+        """Calls fn and records how long it took. Returns fn's result."""
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def wrap(self, fn):
+        """Returns fn with every call timed."""
+        def timed(*args, **kwargs):
+            return self.time(fn, *args, **kwargs)
+        return timed
+
+    def summary(self):
+        """(count, mean ms, {percentile: ms}, max ms)."""
+        with self._lock:
+            samples = np.array(self.samples, dtype=np.float64) * 1000
+        if len(samples) == 0:
+            return 0, 0.0, {p: 0.0 for p in PERCENTILES}, 0.0
+        return (len(samples), float(samples.mean()),
+                {p: float(np.percentile(samples, p)) for p in PERCENTILES}, float(samples.max()))
+
+
+def print_report(title, recorders, elapsed=None):
+    """Prints one line per recorder: count, throughput and latency percentiles."""
+    print(f"\n📊 {title}")
+    header = "  " + f"{'stage':<16}{'count':>8}{'per sec':>10}{'mean':>9}" + \
+             "".join(f"{'p' + str(p):>9}" for p in PERCENTILES) + f"{'max':>9}  (ms)"
+    print(header)
+    for recorder in recorders:
+        count, mean, percentiles, worst = recorder.summary()
+        rate = f"{count / elapsed:.1f}" if elapsed else "-"
+        print("  " + f"{recorder.name:<16}{count:>8}{rate:>10}{mean:>9.2f}" +
+              "".join(f"{percentiles[p]:>9.2f}" for p in PERCENTILES) + f"{worst:>9.2f}")
@@ -0,0 +1,168 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import face_recognition
+
+from database_manager import REGISTER_CHUNK_SIZE, DatabaseManager
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+MAX_IMAGE_SIDE = 1600  # Bigger photos are shrunk first, detection time grows with pixels
+PROGRESS_EVERY = 100  # Images between progress lines
+
+
+def find_photos(root):
+    """
+    Walks root/<username>/<photos>.
+    Returns [(username, [photo paths])] sorted by username.
+    """
+    users = []
+    for username in sorted(os.listdir(root)):
+        folder = os.path.join(root, username)
+        if not os.path.isdir(folder):
+            continue
+        photos = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if photos:
+            users.append((username, photos))
+    return users
+
+
+def encode_photo(path, model="hog"):
+    """
+    Runs in a worker process: one photo -> one face encoding.
+    Returns (encoding list, None) or (None, reason).
+    """
+    try:
+        image = face_recognition.load_image_file(path)
+    except Exception as e:
+        return None, f"Can't read image: {e}"
+
+    # Badge photos from HR can be huge, detection doesn't need that many pixels
+    longest = max(image.shape[:2])
+    if longest > MAX_IMAGE_SIDE:
+        scale = MAX_IMAGE_SIDE / longest
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+
+    try:
+        locations = face_recognition.face_locations(image, model=model)
+        if not locations:
+            return None, "No face found"
+
+        # Several faces (someone in the background): enroll the biggest one
+        largest = max(locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+        encodings = face_recognition.face_encodings(image, [largest])
+    except Exception as e:
+        # dlib / cv2 errors on odd images (e.g. grayscale or 16-bit) only cost this photo
+        return None, f"Face detection failed: {e}"
+    if not encodings:
+        return None, "Face could not be encoded"
+    return encodings[0].tolist(), None
+
+
+def _encode_task(args):
+    path, model = args
+    return encode_photo(path, model)
+
+
+def bulk_import(root, password="", workers=None, chunk_size=REGISTER_CHUNK_SIZE, model="hog", db=None, dry_run=False):
+    """
+    Encodes every photo under 'root' on a process pool and registers one
+    user per folder (every usable photo becomes one stored angle).
+    Users are written in chunks of 'chunk_size' while encoding goes on.
+    Returns (registered names, failures) with failures as [(path or username, reason)].
+    """
+    users = find_photos(root)
+    total_photos = sum(len(photos) for _, photos in users)
+    print(f"📁 Found {len(users)} users with {total_photos} photos in {root}")
+    if not users:
+        return [], []
+
+    db = db or (None if dry_run else DatabaseManager())
+    registered = []
+    failures = []
+    pending = []  # (username, password, encodings) waiting for the next chunk write
+
+    def flush():
+        if not pending:
+            return
+        if dry_run:
+            registered.extend(username for username, _, _ in pending)
+        else:
+            names, failed = db.register_users(pending, chunk_size=chunk_size)
+            registered.extend(names)
+            failures.extend(failed.items())
+        pending.clear()
+
+    # Photos are submitted in user order and map() yields in that order,
+    # so all photos of one user arrive one after another.
+    tasks = [(path, model) for _, photos in users for path in photos]
+    start = time.monotonic()
+    done = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_encode_task, tasks, chunksize=4)
+
+            for username, photos in users:
+                encodings = []
+                for path in photos:
+                    encoding, error = next(results)
+                    if error:
+                        failures.append((path, error))
+                    else:
+                        encodings.append(encoding)
+
+                    done += 1
+                    if done % PROGRESS_EVERY == 0 or done == total_photos:
+                        rate = done / max(time.monotonic() - start, 1e-9)
+                        print(f"📷 {done}/{total_photos} photos ({rate:.1f}/s), "
+                              f"{len(registered)} users saved, {len(failures)} failures")
+
+                if encodings:
+                    pending.append((username, password, encodings))
+                else:
+                    failures.append((username, "No usable photo"))
+
+                if len(pending) >= chunk_size:
+                    flush()
+    finally:
+        # Even if the pool died (or Ctrl-C), users already encoded are saved
+        flush()
+    print(f"✅ Imported {len(registered)} users in {time.monotonic() - start:.1f}s, {len(failures)} failures")
+    return registered, failures
+
+
+def write_report(failures, path):
+    """Writes the failures as a tab separated file (what, reason)."""
+    with open(path, "w", encoding="utf-8") as f:
+        for what, reason in failures:
+            f.write(f"{what}\t{reason}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-enroll users from a folder of photos (one sub-folder per user)")
+    parser.add_argument("root", help="Folder with one sub-folder per username")
+    parser.add_argument("--password", default="", help="Backup password given to every imported user")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=REGISTER_CHUNK_SIZE, help="Users per DB transaction")
+    parser.add_argument("--model", choices=("hog", "cnn"), default="hog")
+    parser.add_argument("--report", help="Write every failure to this file")
+    parser.add_argument("--dry-run", action="store_true", help="Encode only, don't write to the database")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    _, failures = bulk_import(args.root, args.password, args.workers, args.chunk_size, args.model,
+                              dry_run=args.dry_run)
+    for what, reason in failures[:20]:
+        print(f" ⚠ {what}: {reason}")
+    if len(failures) > 20:
+        print(f" ... and {len(failures) - 20} more")
+    if args.report and failures:
+        write_report(failures, args.report)
+        print(f"📝 Failures written to {args.report}")
@@ -0,0 +1,206 @@
+import glob
+import logging
+import os
+import struct
+
+import numpy as np
+
+from face_matcher import ENCODING_DIM
+from quantization import CODE_DTYPES, dequantize
+
+GALLERY_CACHE_FILE = "gallery_cache.fgal"
+
+# File layout (little-endian, every section 64-byte aligned):
+#   header | [int8 only: float32 scale (dim)] | matrix (rows x dim, float32 / float16 / int8)
+#   | float32 squared norms (rows) | int32 name id per row | uint64 name offsets (names + 1) | UTF-8 names
+MAGIC = b"FGAL"
+FORMAT_VERSION = 1
+DTYPE_FLOAT32 = 1
+DTYPE_FLOAT16 = 2
+DTYPE_INT8 = 3
+DTYPE_CODES = {DTYPE_FLOAT32: "float32", DTYPE_FLOAT16: "float16", DTYPE_INT8: "int8"}
+PRECISION_CODES = {precision: code for code, precision in DTYPE_CODES.items()}
+HEADER = struct.Struct('<4sHHqQIIQQQQ')
+HEADER_SIZE = 64
+ALIGNMENT = 64
+
+log = logging.getLogger(__name__)
+
+
+class NameTable:
+    """
+    Read-only, lazily decoded view of the name table.
+    Behaves like a list of names (names[row]), but only decodes a name
+    when it is actually looked up.
+    """
+
+    def __init__(self, name_ids, offsets, blob):
+        self._name_ids = name_ids
+        self._offsets = offsets
+        self._blob = blob
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self._name_ids)
+
+    def _name(self, name_id):
+        name = self._decoded.get(name_id)
+        if name is None:
+            start, end = int(self._offsets[name_id]), int(self._offsets[name_id + 1])
+            name = bytes(self._blob[start:end]).decode('utf-8')
+            self._decoded[name_id] = name
+        return name
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self._name(int(i)) for i in self._name_ids[row]]
+        return self._name(int(self._name_ids[row]))
+
+    def __iter__(self):
+        for name_id in self._name_ids:
+            yield self._name(int(name_id))
+
+    def tolist(self):
+        return list(self)
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        return HEADER.unpack_from(f.read(HEADER_SIZE))
+
+
+def _versioned_files(path):
+    """Newer copies saved as '<path>.<version>' while 'path' itself was mapped."""
+    return [name for name in glob.glob(glob.escape(path) + ".*") if name[len(path) + 1:].isdigit()]
+
+
+def _newest_file(path):
+    """The gallery file with the highest version: 'path' or one of its versioned copies."""
+    candidates = [name for name in [path] + _versioned_files(path) if os.path.exists(name)]
+    if len(candidates) <= 1:
+        return candidates[0] if candidates else None
+
+    def version_of(name):
+        try:
+            return _read_header(name)[3]
+        except (OSError, struct.error):
+            return -1
+    return max(candidates, key=version_of)
+
+
+def _remove_stale(path, keep):
+    """Deletes the gallery files other than 'keep'; files still mapped somewhere are left for later."""
+    for name in [path] + _versioned_files(path):
+        if name != keep and os.path.exists(name):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+
+def precision_of(dtype):
+    """float16 / int8 matrices are saved as they are, anything else as float32."""
+    for precision in ("float16", "int8"):
+        if dtype == CODE_DTYPES[precision]:
+            return precision
+    return "float32"
+
+
+def load_gallery(path=GALLERY_CACHE_FILE):
+    """
+    Memory-maps the local gallery file. Nothing is parsed or copied: the
+    matrix and norms are views on the OS page cache, so several client
+    processes on one machine share a single copy.
+    If a newer copy had to be saved next to it (see save_gallery), that one is used.
+    Returns (version, names, matrix, sq_norms, scale) or None if there is no
+    usable file. 'matrix' keeps the stored precision; 'scale' is None unless it is int8.
+    """
+    path = _newest_file(path)
+    if path is None:
+        return None
+    try:
+        (magic, file_format, dtype_code, version, rows, dim, name_count,
+         matrix_offset, norms_offset, ids_offset, names_offset) = _read_header(path)
+
+        if magic != MAGIC or file_format != FORMAT_VERSION or dtype_code not in DTYPE_CODES:
+            log.warning("⚠ Ignoring gallery cache %s: unknown format", path)
+            return None
+
+        dtype = CODE_DTYPES[DTYPE_CODES[dtype_code]]
+        raw = np.memmap(path, dtype=np.uint8, mode='r')
+        scale = None
+        if dtype_code == DTYPE_INT8:
+            scale = np.array(raw[HEADER_SIZE:HEADER_SIZE + dim * 4].view('<f4'))
+        matrix = raw[matrix_offset:matrix_offset + rows * dim * dtype.itemsize].view(dtype).reshape(rows, dim)
+        sq_norms = raw[norms_offset:norms_offset + rows * 4].view('<f4')
+        name_ids = raw[ids_offset:ids_offset + rows * 4].view('<i4')
+        offsets = raw[names_offset:names_offset + (name_count + 1) * 8].view('<u8')
+        blob = raw[names_offset + (name_count + 1) * 8:]
+
+    except (OSError, struct.error, ValueError) as e:
+        log.warning("⚠ Ignoring broken gallery cache %s: %s", path, e)
+        return None
+
+    return version, NameTable(name_ids, offsets, blob), matrix, sq_norms, scale
+
+
+def save_gallery(version, names, matrix, path=GALLERY_CACHE_FILE, sq_norms=None, scale=None):
+    """
+    Writes the gallery file to a temp file and swaps it in atomically, so
+    clients that still map the old file keep a consistent view.
+    float16 / int8 matrices are stored as they are (int8 needs its 'scale').
+    """
+    matrix = np.asarray(matrix)
+    precision = precision_of(matrix.dtype)
+    if precision == "int8" and scale is None:
+        raise ValueError("An int8 gallery needs its scale")
+    matrix = np.ascontiguousarray(matrix, dtype=CODE_DTYPES[precision]).reshape(-1, ENCODING_DIM)
+    rows, dim = matrix.shape
+    if sq_norms is None:
+        widened = dequantize(matrix, precision, scale)
+        sq_norms = np.einsum('ij,ij->i', widened, widened)
+    sq_norms = np.ascontiguousarray(sq_norms, dtype='<f4')
+    scale_bytes = np.asarray(scale, dtype='<f4').tobytes() if precision == "int8" else b""
+
+    # Each user's name is stored once; rows point at it by id
+    unique = {}
+    name_ids = np.array([unique.setdefault(name, len(unique)) for name in names], dtype='<i4')
+    encoded = [name.encode('utf-8') for name in unique]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+
+    matrix_offset = _align(HEADER_SIZE + len(scale_bytes))
+    norms_offset = _align(matrix_offset + matrix.nbytes)
+    ids_offset = _align(norms_offset + sq_norms.nbytes)
+    names_offset = _align(ids_offset + name_ids.nbytes)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, PRECISION_CODES[precision], version, rows, dim, len(encoded),
+                         matrix_offset, norms_offset, ids_offset, names_offset)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for offset, data in ((0, header), (HEADER_SIZE, scale_bytes), (matrix_offset, matrix),
+                             (norms_offset, sq_norms), (ids_offset, name_ids), (names_offset, offsets)):
+            f.seek(offset)
+            f.write(data.tobytes() if isinstance(data, np.ndarray) else data)
+        f.write(b"".join(encoded))
+
+    try:
+        os.replace(tmp_path, path)
+        target = path
+    except PermissionError:
+        # Windows won't replace a file that is mapped (by this process after load_cache, or
+        # another client): keep the update under a versioned name, load_gallery picks the newest
+        target = f"{path}.{version}"
+        try:
+            os.replace(tmp_path, target)
+        except PermissionError:
+            # That version is already on disk and mapped as well
+            os.remove(tmp_path)
+            return
+        log.info("📂 Gallery cache %s is in use, saved version %s as %s", path, version, target)
+    _remove_stale(path, target)
@@ -1,14 +1,54 @@
 import mysql.connector
 import json
+import logging
 import uuid
+import numpy as np
 from datetime import datetime
+from db_pool import ConnectionPool
+from encoding_format import ENCODING_DTYPE, pack_encodings, unpack_encodings
+from metrics import REGISTRY
+
+# How many gallery changes we remember for delta syncs.
+# Clients further behind than this get a full snapshot instead.
+CHANGELOG_RETENTION = 5000
+REGISTER_CHUNK_SIZE = 200  # Users per multi-row INSERT / transaction in register_users
+ACTIVITY_LOG_QUERY_LIMIT = 1000  # Default max rows returned by get_activity_logs
+DELETE_NAMES_CHUNK = 1000  # Usernames per "IN (...)" list when deleting many users
+LOG_DELETE_CHUNK = 5000  # activity_logs rows deleted per statement (keeps transactions short)
+
+# Columns added after the first release (added to old databases on startup)
+USER_COLUMNS = {
+    "face_blob": "MEDIUMBLOB",
+    "face_angles": "SMALLINT",
+    "face_dim": "SMALLINT",
+    "added_version": "BIGINT",
+}
+ACTIVITY_LOG_COLUMNS = {
+    "username": "VARCHAR(50)",
+    "client": "VARCHAR(64)",
+}
+ACTIVITY_LOG_INDEXES = {
+    "idx_logs_time": "timestamp",
+    "idx_logs_user_time": "user_id, timestamp",
+    "idx_logs_username_time": "username, timestamp",
+}
+
+log = logging.getLogger(__name__)
+
+
+def users_to_json(names, matrix):
+    """Turns (names, matrix) into the [{"name", "encoding"}, ...] wire format."""
+    # One tolist() for the whole matrix is much cheaper than one per row
+    return [{"name": name, "encoding": encoding} for name, encoding in zip(names, matrix.tolist())]
 
 
 class DatabaseManager:
-    def __init__(self, host="localhost", user="root", password="BatTrot1!", database="rental_system"):
+    def __init__(self, host="localhost", user="root", password="BatTrot1!", database="rental_system",
+                 pool_size=8, pool_timeout=10.0):
         """
         Connects to the MySQL Server.
         Change 'host' to your Server's IP if running on a different machine.
+        Connections are reused through a bounded pool of 'pool_size' connections.
         """
         self.config = {
             "host": host,
@@ -17,12 +57,22 @@ class DatabaseManager:
             # "database": database # We add this later after checking if it exists
         }
         self.db_name = database
+        # Shared by every thread of the server, see db_pool.py
+        self.pool = ConnectionPool(self.get_connection, size=pool_size, timeout=pool_timeout)
         self.init_database()
 
     def get_connection(self):
-        """Creates a fresh connection to MySQL."""
+        """Creates a fresh connection to MySQL (used by the pool)."""
         return mysql.connector.connect(database=self.db_name, **self.config)
 
+    def pool_stats(self):
+        """Connection pool counters (created, reused, waits, in_use...)."""
+        return self.pool.stats()
+
+    def close(self):
+        """Closes the idle pooled connections."""
+        self.pool.close_all()
+
     def init_database(self):
         """Creates the Database and Tables if they don't exist."""
         # 1. Connect without DB to create it
@@ -32,14 +82,26 @@ class DatabaseManager:
             cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.db_name}")
             conn.close()
         except mysql.connector.Error as err:
-            print(f"❌ Connection Error: {err}")
+            log.error("❌ Connection Error: %s", err)
             return
 
         # 2. Connect WITH DB to create tables
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.pool.connection() as conn:
+                self._create_tables(conn)
+            log.info("✅ MySQL Database initialized successfully.")
+
+        except mysql.connector.Error as err:
+            log.error("❌ Database Error: %s", err)
+            return
+
+        # 3. Convert any old JSON encodings to the binary format
+        self.migrate_json_encodings()
 
+    def _create_tables(self, conn):
+        """Creates (or upgrades) every table the system uses."""
+        cursor = conn.cursor()
+        try:
             # Table: Users
             # We use VARCHAR(36) for UUIDs
             cursor.execute('''
@@ -48,115 +110,666 @@ class DatabaseManager:
                     username VARCHAR(50) UNIQUE NOT NULL,
                     password_hash VARCHAR(255),
                     face_encoding TEXT, 
-                    created_at DATETIME
+                    created_at DATETIME,
+                    face_blob MEDIUMBLOB,
+                    face_angles SMALLINT,
+                    face_dim SMALLINT,
+                    added_version BIGINT
                 )
             ''')
 
-            # Table: Activity Logs (For later stages)
+            # Older databases were created before the binary columns existed
+            self._add_missing_columns(cursor, "users", USER_COLUMNS)
+
+            # Table: Activity Logs (lock / unlock / presence events, see activity_log.py)
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS activity_logs (
                     log_id INT AUTO_INCREMENT PRIMARY KEY,
                     user_id VARCHAR(36),
                     action VARCHAR(100),
                     timestamp DATETIME,
+                    username VARCHAR(50),
+                    client VARCHAR(64),
                     FOREIGN KEY (user_id) REFERENCES users(user_id)
                 )
             ''')
+            self._add_missing_columns(cursor, "activity_logs", ACTIVITY_LOG_COLUMNS)
+            # Time-range and per-user queries
+            self._add_missing_indexes(cursor, "activity_logs", ACTIVITY_LOG_INDEXES)
+
+            # Table: Gallery Version (one row, bumped on every register/delete)
+            # Lets the server tell if its cached user list is stale with one tiny query.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS gallery_version (
+                    id TINYINT PRIMARY KEY,
+                    version BIGINT NOT NULL
+                )
+            ''')
+            cursor.execute("INSERT IGNORE INTO gallery_version (id, version) VALUES (1, 0)")
+
+            # Table: Gallery Changes (what each version added/removed, for delta syncs)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS gallery_changes (
+                    version BIGINT PRIMARY KEY,
+                    username VARCHAR(50) NOT NULL,
+                    op CHAR(3) NOT NULL,
+                    changed_at DATETIME
+                )
+            ''')
+
+            # Table: Rental Sessions (written behind by rental_sessions.RentalEngine)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS rental_sessions (
+                    session_id VARCHAR(36) PRIMARY KEY,
+                    username VARCHAR(50) NOT NULL,
+                    client VARCHAR(64),
+                    started_at DATETIME,
+                    expires_at DATETIME,
+                    ended_at DATETIME,
+                    status VARCHAR(10) NOT NULL,
+                    INDEX idx_rentals_status_expiry (status, expires_at),
+                    INDEX idx_rentals_user (username, started_at)
+                )
+            ''')
 
             conn.commit()
-            conn.close()
-            print("✅ MySQL Database initialized successfully.")
+        finally:
+            cursor.close()
+
+    def _add_missing_columns(self, cursor, table, columns):
+        """Adds newer columns ({name: type}) to a table that predates them."""
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+            (self.db_name, table)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for column, column_type in columns.items():
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                log.info("🔧 Added column %s.%s", table, column)
+
+    def _add_missing_indexes(self, cursor, table, indexes):
+        """Creates the indexes ({name: column list}) a table doesn't have yet."""
+        cursor.execute(
+            "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+            (self.db_name, table)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for index, columns in indexes.items():
+            if index not in existing:
+                cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+                log.info("🔧 Added index %s.%s", table, index)
+
+    def migrate_json_encodings(self, batch_size=500):
+        """
+        Converts rows that still store JSON text in 'face_encoding' to packed
+        float32 blobs. Safe to run repeatedly; only unconverted rows are touched.
+        Rows whose JSON can't be decoded are reported and left as they are.
+        Returns the number of migrated users.
+        """
+        migrated = 0
+        skipped = 0
+        last_id = ""
+        try:
+            with self.pool.connection() as conn:
+                while True:
+                    # Walk by user_id so skipped rows aren't fetched again
+                    cursor = conn.execute(
+                        "SELECT user_id, face_encoding FROM users "
+                        "WHERE face_blob IS NULL AND face_encoding IS NOT NULL AND user_id > %s "
+                        "ORDER BY user_id LIMIT %s",
+                        (last_id, batch_size)
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+
+                    updates = []
+                    for user_id, encoding_json in rows:
+                        try:
+                            blob, angles, dim = pack_encodings(json.loads(encoding_json))
+                        except (ValueError, TypeError) as e:
+                            log.warning("⚠ Skipping user %s: unreadable face_encoding (%s)", user_id, e)
+                            skipped += 1
+                            continue
+                        updates.append((blob, angles, dim, user_id))
+                    if not updates:
+                        continue
+
+                    # Drop the JSON copy in the same statement so a row is never half-migrated
+                    sql = ("UPDATE users SET face_blob = %s, face_angles = %s, face_dim = %s, "
+                           "face_encoding = NULL WHERE user_id = %s")
+                    conn.prepared(sql).executemany(sql, updates)
+                    conn.commit()
+                    migrated += len(updates)
+
+            if migrated:
+                log.info("🔧 Migrated %s users to binary encodings.", migrated)
+            if skipped:
+                log.warning("⚠ %s users still have an unreadable JSON encoding.", skipped)
+            return migrated
 
         except mysql.connector.Error as err:
-            print(f"❌ Database Error: {err}")
+            log.error("❌ Migration Error: %s", err)
+            return migrated
 
+    @REGISTRY.timed("db.register_user")
     def register_user(self, username, password, face_encoding_list):
         """
         Saves a new user to MySQL.
         """
         user_id = str(uuid.uuid4())
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        face_json = json.dumps(face_encoding_list)
+        # Single face or gallery, both are stored as an (angles x dim) float32 blob
+        face_blob, face_angles, face_dim = pack_encodings(face_encoding_list)
 
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.pool.connection() as conn:
+                # Bump first: the row lock on gallery_version orders concurrent writers
+                version = self._bump_version(conn, username, "ADD")
 
-            sql = "INSERT INTO users (user_id, username, password_hash, face_encoding, created_at) VALUES (%s, %s, %s, %s, %s)"
-            val = (user_id, username, password, face_json, created_at)
+                sql = ("INSERT INTO users (user_id, username, password_hash, created_at, face_blob, face_angles, face_dim, added_version) "
+                       "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)")
+                val = (user_id, username, password, created_at, face_blob, face_angles, face_dim, version)
 
-            cursor.execute(sql, val)
-            conn.commit()
-            conn.close()
+                conn.execute(sql, val)
+                conn.commit()
 
-            print(f"✅ User {username} registered! ID: {user_id}")
+            log.info("✅ User %s registered! ID: %s", username, user_id)
             return user_id
 
         except mysql.connector.IntegrityError:
-            print(f"⚠ Error: Username '{username}' already exists.")
+            log.warning("⚠ Error: Username '%s' already exists.", username)
             return None
         except mysql.connector.Error as err:
-            print(f"❌ MySQL Error: {err}")
+            log.error("❌ MySQL Error: %s", err)
             return None
 
+    @REGISTRY.timed("db.register_users")
+    def register_users(self, users, chunk_size=REGISTER_CHUNK_SIZE):
+        """
+        Registers many users with multi-row inserts, one transaction per chunk.
+        'users' is a list of (username, password, face_encoding_list).
+        Returns (registered_names, failed) where failed maps username -> reason.
+        Existing usernames are skipped, not overwritten.
+        """
+        registered = []
+        failed = {}
+
+        # The first entry of a username wins, across the whole list (not per chunk)
+        unique = []
+        seen = set()
+        for username, password, encodings in users:
+            if username in seen:
+                failed[username] = "Duplicate username in import"
+                continue
+            seen.add(username)
+            unique.append((username, password, encodings))
+
+        for start in range(0, len(unique), chunk_size):
+            chunk = unique[start:start + chunk_size]
+
+            try:
+                with self.pool.connection() as conn:
+                    # 1. Skip people who are already registered
+                    # (plain cursor: the IN list length varies, not worth a prepared statement each)
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute(f"SELECT username FROM users WHERE username IN ({placeholders})",
+                                       tuple(username for username, _, _ in chunk))
+                        existing = {row[0] for row in cursor.fetchall()}
+                    finally:
+                        cursor.close()
+                    for username in existing:
+                        failed[username] = "Username already exists"
+                    chunk = [user for user in chunk if user[0] not in existing]
+                    if not chunk:
+                        continue
+
+                    # 2. One version per user, reserved in one go
+                    versions = self._bump_versions(conn, [username for username, _, _ in chunk], "ADD")
+
+                    # 3. One multi-row INSERT for the whole chunk
+                    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    rows = []
+                    for (username, password, encodings), version in zip(chunk, versions):
+                        face_blob, face_angles, face_dim = pack_encodings(encodings)
+                        rows.append((str(uuid.uuid4()), username, password, created_at,
+                                     face_blob, face_angles, face_dim, version))
+                    conn.executemany(
+                        "INSERT INTO users (user_id, username, password_hash, created_at, face_blob, face_angles, face_dim, added_version) "
+                        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", rows
+                    )
+                    conn.commit()
+                registered.extend(username for username, _, _ in chunk)
+
+            except mysql.connector.Error as err:
+                # The whole chunk was rolled back (e.g. someone registered one of them meanwhile)
+                log.error("❌ MySQL Error in batch of %s users: %s", len(chunk), err)
+                for username, _, _ in chunk:
+                    failed[username] = str(err)
+
+        return registered, failed
+
+    @REGISTRY.timed("db.get_usernames")
+    def get_usernames(self):
+        """Every registered username, sorted. Doesn't touch the face encodings."""
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute("SELECT username FROM users ORDER BY username").fetchall()
+            return [row[0] for row in rows]
+
+        except mysql.connector.Error as err:
+            log.error("❌ Error listing users: %s", err)
+            return []
+
     def delete_user(self, username):
         """
         Deletes a user and their data from the database.
         """
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+        deleted, missing = self.delete_users([username])
+        if missing:
+            log.warning("❌ User '%s' not found.", username)
+            return False
+        if not deleted:
+            return False
 
-            # 1. Check if user exists first
-            cursor.execute("SELECT user_id FROM users WHERE username = %s", (username,))
-            result = cursor.fetchone()
+        log.info("🗑️  SUCCESS: User '%s' has been deleted.", username)
+        return True
 
-            if not result:
-                print(f"❌ User '{username}' not found.")
-                return False
+    def _query_plain(self, conn, sql, params):
+        """Runs a query with a plain cursor (IN lists vary in length, not worth preparing each)."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.with_rows else cursor.rowcount
+        finally:
+            cursor.close()
 
-            # 2. Delete the user
-            # Note: If you have activity logs, this might fail unless we delete logs first.
-            # For now, since your logs are empty, this works fine.
-            cursor.execute("DELETE FROM users WHERE username = %s", (username,))
+    def _delete_logs(self, conn, where, params=()):
+        """
+        Deletes matching activity_logs rows in chunks of LOG_DELETE_CHUNK,
+        committing after each one so a big cleanup never holds one huge transaction.
+        Returns the number of deleted rows.
+        """
+        total = 0
+        while True:
+            deleted = self._query_plain(conn, f"DELETE FROM activity_logs WHERE {where} LIMIT {LOG_DELETE_CHUNK}", params)
             conn.commit()
-            conn.close()
+            total += deleted
+            if deleted < LOG_DELETE_CHUNK:
+                return total
+
+    @REGISTRY.timed("db.delete_users")
+    def delete_users(self, usernames):
+        """
+        Deletes many users at once.
+        Their activity_logs are removed first (chunked), then all the users go
+        in one transaction with one version bump per user.
+        Returns (deleted_names, missing_names); deleted names are spelled as stored.
+        """
+        usernames = list(dict.fromkeys(usernames))
+        deleted = []
+        missing = []
+
+        try:
+            with self.pool.connection() as conn:
+                for start in range(0, len(usernames), DELETE_NAMES_CHUNK):
+                    names = usernames[start:start + DELETE_NAMES_CHUNK]
+                    placeholders = ", ".join(["%s"] * len(names))
 
-            print(f"🗑️  SUCCESS: User '{username}' has been deleted.")
+                    # 1. Who actually exists
+                    rows = self._query_plain(
+                        conn, f"SELECT user_id, username FROM users WHERE username IN ({placeholders})", tuple(names)
+                    )
+                    found_names = [row[1] for row in rows]
+                    # usernames compare case-insensitively in MySQL: 'alice' finds 'Alice'
+                    found_keys = {name.casefold() for name in found_names}
+                    missing.extend(name for name in names if name.casefold() not in found_keys)
+                    if not rows:
+                        continue
+                    user_ids = tuple(row[0] for row in rows)
+                    id_placeholders = ", ".join(["%s"] * len(user_ids))
+
+                    # 2. Their logs reference them (foreign key), so the bulk of those go first
+                    self._delete_logs(conn, f"user_id IN ({id_placeholders})", user_ids)
+
+                    # 3. The users themselves + change log, in one transaction.
+                    # Locking the users first makes insert_activity_logs wait (or see them gone),
+                    # so no new log can reference them between the last log delete and ours.
+                    self._query_plain(conn, f"SELECT user_id FROM users WHERE user_id IN ({id_placeholders}) FOR UPDATE",
+                                      user_ids)
+                    self._query_plain(conn, f"DELETE FROM activity_logs WHERE user_id IN ({id_placeholders})", user_ids)
+                    self._query_plain(conn, f"DELETE FROM users WHERE user_id IN ({id_placeholders})", user_ids)
+                    self._bump_versions(conn, found_names, "DEL")
+                    conn.commit()
+
+                    deleted.extend(found_names)
+
+        except mysql.connector.Error as err:
+            log.error("❌ MySQL Error: %s", err)
+
+        return deleted, missing
+
+    @REGISTRY.timed("db.delete_all_users")
+    def delete_all_users(self):
+        """
+        Wipes every user (and their activity logs).
+        Instead of logging one change per user, the change log is cleared and
+        the version bumped once, so every client falls back to a full (empty) sync.
+        Returns the number of deleted users, or None on error.
+        """
+        try:
+            with self.pool.connection() as conn:
+                self._delete_logs(conn, "user_id IS NOT NULL")
+
+                conn.execute("UPDATE gallery_version SET version = version + 1 WHERE id = 1")
+                # Same as delete_users: lock the users, then drop the logs written meanwhile
+                self._query_plain(conn, "SELECT COUNT(*) FROM users FOR UPDATE", ())
+                self._query_plain(conn, "DELETE FROM activity_logs WHERE user_id IS NOT NULL", ())
+                deleted = self._query_plain(conn, "DELETE FROM users", ())
+                self._query_plain(conn, "DELETE FROM gallery_changes", ())
+                conn.commit()
+
+            log.info("🗑️  SUCCESS: Deleted all %s users.", deleted)
+            return deleted
+
+        except mysql.connector.Error as err:
+            log.error("❌ MySQL Error: %s", err)
+            return None
+
+    @REGISTRY.timed("db.insert_activity_logs")
+    def insert_activity_logs(self, events):
+        """
+        Appends a batch of events ({"username", "action", "ts", "client"}) to
+        activity_logs with one multi-row INSERT. Usernames are resolved to
+        user_ids in one query. Returns True on success.
+        """
+        if not events:
+            return True
+        try:
+            with self.pool.connection() as conn:
+                names = tuple({e["username"] for e in events if e.get("username")})
+                user_ids = {}
+                if names:
+                    placeholders = ", ".join(["%s"] * len(names))
+                    # Shared lock until our commit: a concurrent delete_users waits for these logs
+                    # (and removes them) instead of failing on the foreign key
+                    rows = self._query_plain(
+                        conn, f"SELECT username, user_id FROM users WHERE username IN ({placeholders}) "
+                              "LOCK IN SHARE MODE", names
+                    )
+                    # The username column compares case-insensitively, so "Alice" is "alice" here too
+                    user_ids = {username.casefold(): user_id for username, user_id in rows}
+
+                rows = []
+                for e in events:
+                    timestamp = datetime.fromtimestamp(e["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+                    username = e.get("username")
+                    rows.append((user_ids.get(username.casefold()) if username else None, e["action"], timestamp,
+                                 username, e.get("client")))
+                conn.executemany(
+                    "INSERT INTO activity_logs (user_id, action, timestamp, username, client) "
+                    "VALUES (%s, %s, %s, %s, %s)", rows
+                )
+                conn.commit()
             return True
 
         except mysql.connector.Error as err:
-            print(f"❌ MySQL Error: {err}")
+            log.error("❌ Error writing activity logs: %s", err)
             return False
 
-    def get_all_users(self):
+    @REGISTRY.timed("db.get_activity_logs")
+    def get_activity_logs(self, username=None, since=None, until=None, limit=ACTIVITY_LOG_QUERY_LIMIT):
         """
-        Fetches all users. Supports both Single-Face and Multi-Face storage.
+        Newest-first events, optionally for one user and/or a time range
+        (datetime or "YYYY-MM-DD HH:MM:SS"). Returns a list of dicts.
         """
-        users_data = []
+        conditions = []
+        params = []
+        if username is not None:
+            conditions.append("username = %s")
+            params.append(username)
+        if since is not None:
+            conditions.append("timestamp >= %s")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < %s")
+            params.append(until)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT timestamp, username, action, client FROM activity_logs {where} "
+                    f"ORDER BY timestamp DESC LIMIT {int(limit)}", tuple(params)
+                ).fetchall()
+            return [{"timestamp": str(t), "username": u, "action": a, "client": c} for t, u, a, c in rows]
+
+        except mysql.connector.Error as err:
+            log.error("❌ Error reading activity logs: %s", err)
+            return []
 
-            cursor.execute("SELECT username, face_encoding FROM users")
-            rows = cursor.fetchall()
+    @REGISTRY.timed("db.save_rental_sessions")
+    def save_rental_sessions(self, sessions):
+        """
+        Upserts a batch of rental sessions (RentalSession.to_row() dicts) with
+        one multi-row INSERT ... ON DUPLICATE KEY UPDATE. Later rows for the
+        same session win. Returns True on success.
+        """
+        if not sessions:
+            return True
 
-            for name, encoding_json in rows:
-                if encoding_json:
-                    data = json.loads(encoding_json)
+        def as_datetime(ts):
+            return None if ts is None else datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+        rows = [(s["session_id"], s["username"], s.get("client"), as_datetime(s["started_at"]),
+                 as_datetime(s["expires_at"]), as_datetime(s.get("ended_at")), s["status"]) for s in sessions]
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany(
+                    "INSERT INTO rental_sessions (session_id, username, client, started_at, expires_at, ended_at, status) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE expires_at = VALUES(expires_at), ended_at = VALUES(ended_at), "
+                    "status = VALUES(status)", rows
+                )
+                conn.commit()
+            return True
 
-                    # CHECK: Is this a single face (list of floats) or a gallery (list of lists)?
-                    if len(data) > 0 and isinstance(data[0], list):
-                        # It's a gallery (Multi-Shot)! Add each angle separately.
-                        for angle in data:
-                            users_data.append({"name": name, "encoding": angle})
-                    else:
-                        # It's a single face (Old style)
-                        users_data.append({"name": name, "encoding": data})
+        except mysql.connector.Error as err:
+            log.error("❌ Error saving rental sessions: %s", err)
+            return False
 
-            conn.close()
-            return users_data
+    def load_active_rental_sessions(self):
+        """Sessions still ACTIVE and not yet expired, as dicts with epoch timestamps."""
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT session_id, username, client, started_at, expires_at FROM rental_sessions "
+                    "WHERE status = 'ACTIVE' AND expires_at > NOW()"
+                ).fetchall()
+            return [{"session_id": sid, "username": u, "client": c,
+                     "started_at": started.timestamp(), "expires_at": expires.timestamp()}
+                    for sid, u, c, started, expires in rows]
+
+        except mysql.connector.Error as err:
+            log.error("❌ Error loading rental sessions: %s", err)
+            return []
+
+    def _bump_version(self, conn, username, op):
+        """
+        Marks the gallery as changed and logs what changed ('ADD' or 'DEL').
+        Runs inside the caller's transaction; returns the new version.
+        """
+        return self._bump_versions(conn, [username], op)[0]
+
+    def _bump_versions(self, conn, usernames, op):
+        """
+        Same as _bump_version for many users at once: one UPDATE reserves a
+        consecutive range of versions, one multi-row INSERT logs them.
+        Returns the versions, in the order of 'usernames'.
+        """
+        count = len(usernames)
+        conn.execute("UPDATE gallery_version SET version = LAST_INSERT_ID(version + %s) WHERE id = 1", (count,))
+        last = conn.execute("SELECT LAST_INSERT_ID()").fetchall()[0][0]
+        versions = list(range(last - count + 1, last + 1))
+
+        changed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.executemany(
+            "INSERT INTO gallery_changes (version, username, op, changed_at) VALUES (%s, %s, %s, %s)",
+            [(version, username, op, changed_at) for version, username in zip(versions, usernames)]
+        )
+        # Forget changes that are too old to be worth a delta
+        conn.execute("DELETE FROM gallery_changes WHERE version <= %s", (last - CHANGELOG_RETENTION,))
+        return versions
+
+    @REGISTRY.timed("db.get_gallery_version")
+    def get_gallery_version(self):
+        """
+        Current gallery version (changes whenever a user is registered or deleted,
+        by any process). Returns None if it can't be read.
+        """
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute("SELECT version FROM gallery_version WHERE id = 1").fetchall()
+            return rows[0][0] if rows else 0
+
+        except mysql.connector.Error as err:
+            log.error("❌ Error reading gallery version: %s", err)
+            return None
+
+    def _decode_row(self, encoding_json, face_blob, face_angles, face_dim):
+        """Returns the (angles x dim) float32 matrix of one user row, or None."""
+        if face_blob is not None:
+            return unpack_encodings(face_blob, face_angles, face_dim)
+        if encoding_json:
+            # Row written before the migration ran (e.g. by an older tool)
+            try:
+                data = np.asarray(json.loads(encoding_json), dtype=ENCODING_DTYPE)
+            except (ValueError, TypeError):
+                return None  # Unreadable, reported by migrate_json_encodings
+            if data.ndim == 1:
+                data = data[None, :]
+            return data if data.ndim == 2 else None
+        return None
+
+    def _read_gallery(self, conn, where="", params=()):
+        """Runs the gallery SELECT (optionally filtered) and returns (names, matrix)."""
+        names = []
+        blocks = []
+        cursor = conn.execute(
+            "SELECT username, face_encoding, face_blob, face_angles, face_dim FROM users " + where, params
+        )
+        for name, encoding_json, face_blob, face_angles, face_dim in cursor.fetchall():
+            block = self._decode_row(encoding_json, face_blob, face_angles, face_dim)
+            if block is None or len(block) == 0:
+                continue
+            names.extend([name] * len(block))
+            blocks.append(block)
+
+        if not blocks:
+            return [], np.empty((0, 0), dtype=ENCODING_DTYPE)
+        return names, np.concatenate(blocks)
+
+    @REGISTRY.timed("db.get_gallery")
+    def get_gallery(self):
+        """
+        Fetches every stored angle as one float32 matrix.
+        Returns (names, matrix) where names[i] owns matrix row i.
+        """
+        try:
+            with self.pool.connection() as conn:
+                return self._read_gallery(conn)
+
+        except mysql.connector.Error as err:
+            log.error("❌ Error fetching users: %s", err)
+            return [], np.empty((0, 0), dtype=ENCODING_DTYPE)
+
+    @REGISTRY.timed("db.get_gallery_changes")
+    def get_gallery_changes(self, since_version):
+        """
+        What changed after 'since_version'.
+        Returns (version, removed_names, names, matrix): the client drops every
+        name in removed_names, then adds the (names, matrix) rows.
+        Returns None when the change log no longer reaches back that far
+        (the caller should send a full snapshot instead).
+        """
+        try:
+            with self.pool.connection() as conn:
+                # All reads below share one transaction snapshot
+                version = conn.execute("SELECT version FROM gallery_version WHERE id = 1").fetchall()[0][0]
+                if since_version > version:
+                    return None  # Client saw a different (or reset) database
+                if since_version == version:
+                    return version, [], [], np.empty((0, 0), dtype=ENCODING_DTYPE)
+
+                oldest = conn.execute("SELECT MIN(version) FROM gallery_changes").fetchall()[0][0]
+                if oldest is None or oldest > since_version + 1:
+                    return None
+
+                cursor = conn.execute(
+                    "SELECT DISTINCT username FROM gallery_changes WHERE version > %s", (since_version,)
+                )
+                # Re-registered users are both removed and re-added, so the client ends up in sync
+                removed = [row[0] for row in cursor.fetchall()]
+                names, matrix = self._read_gallery(conn, "WHERE added_version > %s", (since_version,))
+                return version, removed, names, matrix
 
         except mysql.connector.Error as err:
-            print(f"❌ Error fetching users: {err}")
-            return []
\ No newline at end of file
+            log.error("❌ Error fetching gallery changes: %s", err)
+            return None
+
+    def iter_users(self, batch_size=500):
+        """
+        Streams the gallery in pages instead of loading it all at once.
+        Yields lists of {"name", "encoding"} entries (at most 'batch_size' users
+        per page), see iter_gallery.
+        """
+        for names, matrix in self.iter_gallery(batch_size):
+            yield users_to_json(names, matrix)
+
+    def iter_gallery(self, batch_size=500):
+        """
+        Streams the gallery as (names, float32 matrix) pages of at most
+        'batch_size' users. Every page is its own keyset query (by user_id),
+        so the pooled connection is returned between pages and a slow reader
+        never holds one; memory stays bounded by one page.
+        """
+        last_id = ""
+        while True:
+            with self.pool.connection() as conn:
+                with REGISTRY.timer("db.iter_users.page"):
+                    rows = conn.execute(
+                        "SELECT user_id, username, face_encoding, face_blob, face_angles, face_dim FROM users "
+                        "WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                        (last_id, batch_size)
+                    ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+
+            names = []
+            blocks = []
+            for _, name, encoding_json, face_blob, face_angles, face_dim in rows:
+                block = self._decode_row(encoding_json, face_blob, face_angles, face_dim)
+                if block is None or len(block) == 0:
+                    continue
+                names.extend([name] * len(block))
+                blocks.append(block)
+
+            if blocks:
+                yield names, np.concatenate(blocks)
+
+    def get_all_users(self):
+        """
+        Fetches all users. Supports both Single-Face and Multi-Face storage.
+        Every angle of a gallery becomes its own {"name", "encoding"} entry.
+        """
+        names, matrix = self.get_gallery()
+        return users_to_json(names, matrix)
@@ -0,0 +1,218 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+
+from metrics import REGISTRY
+
+
+class PooledConnection:
+    """
+    A MySQL connection owned by the pool.
+    Keeps one prepared cursor per SQL string so repeated queries skip the
+    server-side parse/plan step.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_used = time.monotonic()
+        self._statements = {}
+
+    def cursor(self, *args, **kwargs):
+        return self.conn.cursor(*args, **kwargs)
+
+    def prepared(self, sql):
+        """Returns the cached prepared cursor for 'sql' (prepares it on first use)."""
+        cursor = self._statements.get(sql)
+        if cursor is None:
+            cursor = self.conn.cursor(prepared=True)
+            self._statements[sql] = cursor
+        return cursor
+
+    def execute(self, sql, params=()):
+        """Runs 'sql' through its prepared statement and returns the cursor."""
+        cursor = self.prepared(sql)
+        with REGISTRY.timer("db.execute"):
+            cursor.execute(sql, params)
+        return cursor
+
+    def executemany(self, sql, rows):
+        """
+        Runs a multi-row write. Uses a plain cursor on purpose: the driver
+        folds 'INSERT ... VALUES' into one multi-row statement (one round trip).
+        Returns the number of affected rows.
+        """
+        cursor = self.conn.cursor()
+        try:
+            with REGISTRY.timer("db.executemany"):
+                cursor.executemany(sql, rows)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        for cursor in self._statements.values():
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+        self._statements.clear()
+        try:
+            self.conn.close()
+        except mysql.connector.Error:
+            pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of MySQL connections.
+    At most 'size' connections exist at once; callers wait up to 'timeout'
+    seconds for a free one. Idle connections are pinged before reuse when
+    they have been idle longer than 'health_check_interval'.
+    """
+
+    def __init__(self, connect, size=8, timeout=10.0, health_check_interval=30.0):
+        self._connect = connect  # Factory returning a new DB-API connection
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = []  # LIFO: the most recently used connection is the warmest
+        self._total = 0  # Idle + checked out
+        self._lock = threading.Condition()
+
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_failures": 0,
+            "discarded": 0,
+        }
+
+    def _is_healthy(self, pooled):
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        try:
+            pooled.conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    @REGISTRY.timed("db.pool_acquire")
+    def acquire(self):
+        """Checks out a connection, creating one if the pool is not full yet."""
+        deadline = time.monotonic() + self.timeout
+
+        with self._lock:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    pooled = None
+                    break
+
+                self._stats["waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._lock.wait(remaining):
+                    if not self._idle and self._total >= self.size:
+                        self._stats["timeouts"] += 1
+                        raise errors.PoolError(f"No free connection after {self.timeout}s (pool size {self.size})")
+
+        # Connecting and pinging happen outside the lock
+        if pooled is not None:
+            if self._is_healthy(pooled):
+                with self._lock:
+                    self._stats["reused"] += 1
+                return pooled
+            with self._lock:
+                self._stats["health_failures"] += 1
+            pooled.close()
+
+        try:
+            pooled = PooledConnection(self._connect())
+        except Exception:
+            self._forget()
+            raise
+
+        with self._lock:
+            self._stats["created"] += 1
+        return pooled
+
+    def release(self, pooled, broken=False):
+        """Returns a connection to the pool (or drops it if it is broken)."""
+        if not broken:
+            try:
+                # Never hand out a connection with an open transaction/snapshot
+                if pooled.conn.in_transaction:
+                    pooled.rollback()
+            except mysql.connector.Error:
+                broken = True
+
+        if broken:
+            pooled.close()
+            with self._lock:
+                self._stats["discarded"] += 1
+            self._forget()
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+            self._lock.notify()
+
+    def _forget(self):
+        """Frees the slot of a connection that no longer exists."""
+        with self._lock:
+            self._total -= 1
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        with pool.connection() as conn:
+            conn.execute(...)
+        The connection goes back to the pool even when the block raises.
+        """
+        pooled = self.acquire()
+        broken = False
+        try:
+            yield pooled
+        except (errors.OperationalError, errors.InterfaceError):
+            broken = True  # Lost connection, don't reuse it
+            raise
+        except Exception:
+            try:
+                pooled.rollback()
+            except mysql.connector.Error:
+                broken = True
+            raise
+        finally:
+            self.release(pooled, broken)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = self._total
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._total - len(self._idle)
+        return stats
+
+    def close_all(self):
+        """Closes every idle connection (checked-out ones close on release)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for pooled in idle:
+            pooled.close()
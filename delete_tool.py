@@ -1,3 +1,4 @@
+import logging
 from database_manager import DatabaseManager
 
 
@@ -6,30 +7,37 @@ def delete_user_tool():
 
     print("--- DELETE USER TOOL ---")
 
-    # List current users so you know who to delete
+    # List current users so you know who to delete (names only, no face data)
     print("Current Users:")
-    users = db.get_all_users()
-    if not users:
+    unique_names = db.get_usernames()
+    if not unique_names:
         print(" (Database is empty)")
     else:
-        # distinct names only (since we might have multi-shots)
-        unique_names = set(u['name'] for u in users)
         for name in unique_names:
             print(f" - {name}")
 
-    target = input("\nEnter username to delete (or 'ALL' to wipe everyone): ").strip()
+    target = input("\nEnter username(s) to delete, comma separated (or 'ALL' to wipe everyone): ").strip()
 
     if target.upper() == "ALL":
         confirm = input("⚠ ARE YOU SURE? This deletes EVERYONE. (yes/no): ")
         if confirm.lower() == "yes":
-            # We assume you want to loop through and delete them one by one
-            # (Or you could execute 'TRUNCATE TABLE users' for a faster wipe)
-            for name in unique_names:
-                db.delete_user(name)
-            print("Done.")
+            # One transaction for the users, activity logs cleaned up in chunks first
+            deleted = db.delete_all_users()
+            if deleted is None:
+                print("❌ Nothing was deleted, see the error above.")
+            else:
+                print("Done.")
+    elif "," in target:
+        names = [name.strip() for name in target.split(",") if name.strip()]
+        deleted, missing = db.delete_users(names)
+        print(f"🗑️  Deleted {len(deleted)} users.")
+        for name in missing:
+            print(f"❌ User '{name}' not found.")
     else:
         db.delete_user(target)
 
 
 if __name__ == "__main__":
-    delete_user_tool()
\ No newline at end of file
+    # DatabaseManager reports through logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    delete_user_tool()
@@ -0,0 +1,30 @@
+import numpy as np
+
+# Little-endian float32, the layout of every face_blob in the database
+ENCODING_DTYPE = np.dtype('<f4')
+
+
+def pack_encodings(face_encoding_list):
+    """
+    Packs one face (list of floats) or a gallery (list of lists) into bytes.
+    Returns (blob, angle_count, dim).
+    """
+    matrix = np.asarray(face_encoding_list, dtype=ENCODING_DTYPE)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]  # Single face = gallery with one angle
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a face or a list of faces, got shape {matrix.shape}")
+
+    angles, dim = matrix.shape
+    return matrix.tobytes(), angles, dim
+
+
+def unpack_encodings(blob, angles, dim):
+    """
+    Decodes a face_blob straight into an (angles x dim) float32 array.
+    No Python float lists are created; the array is a view on 'blob'.
+    """
+    expected = angles * dim * ENCODING_DTYPE.itemsize
+    if len(blob) != expected:
+        raise ValueError(f"Encoding blob is {len(blob)} bytes, expected {expected}")
+    return np.frombuffer(blob, dtype=ENCODING_DTYPE).reshape(angles, dim)
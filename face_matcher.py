@@ -0,0 +1,373 @@
+import logging
+
+import numpy as np
+from ann_index import IVFIndex
+from quantization import CODE_DTYPES, INT8_MAX, SCALE_HEADROOM, check_precision, dequantize, fit_scale, quantize
+
+ENCODING_DIM = 128  # face_recognition / dlib embeddings are 128-d
+DEFAULT_TOLERANCE = 0.6  # Same cut-off face_recognition.compare_faces uses
+EXACT_SEARCH_LIMIT = 2048  # Below this many rows brute force beats the index
+SCAN_CHUNK = 4096  # float16 / int8 galleries are widened to float32 this many rows at a time
+RERANK_CANDIDATES = 8  # Closest rows per query that get an exact float32 distance
+
+log = logging.getLogger(__name__)
+
+
+class FaceMatcher:
+    """
+    Keeps the known-face gallery in one contiguous matrix.
+    Row i of the matrix belongs to names[i] (one row per stored angle),
+    so all detected faces can be scored against the whole gallery at once.
+
+    'precision' is how rows are stored: float32 (exact), float16 (half the
+    memory) or int8 (a quarter, one scale per dimension, see quantization.py).
+    Quantized galleries are scanned in float32 chunks and the best
+    candidates of every query are re-scored exactly.
+    """
+
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, dim=ENCODING_DIM, precision="float32",
+                 rerank=RERANK_CANDIDATES):
+        self.tolerance = tolerance
+        self.dim = dim
+        self.names = []  # Parallel index: names[i] owns row i
+        self.precision = check_precision(precision)
+        self.rerank = rerank
+        self._dtype = CODE_DTYPES[precision]
+        self._scale = None  # int8 only: float32 step per dimension
+
+        # The matrix grows by doubling, only the first _count rows are valid
+        self._matrix = np.empty((0, dim), dtype=self._dtype)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._count = 0
+        self._attached = False  # True while using someone else's (read-only) arrays
+
+        # Optional ANN index (see build_index), None = always exact
+        self.index = None
+        self.exact_search_limit = EXACT_SEARCH_LIMIT
+
+        # name -> that user's own rows, for 1:1 verification (see user_rows)
+        self._user_rows = {}
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def codes(self):
+        """The valid part of the gallery matrix as stored (N x dim, in 'precision')."""
+        return self._matrix[:self._count]
+
+    @property
+    def encodings(self):
+        """
+        The gallery as float32 (N x dim). A view for float32 galleries;
+        float16 / int8 galleries are widened into a new array.
+        """
+        if self.precision == "float32":
+            return self.codes
+        return dequantize(self.codes, self.precision, self._scale)
+
+    @property
+    def scale(self):
+        """int8 galleries: the per-dimension scale (None otherwise)."""
+        return self._scale
+
+    @property
+    def sq_norms(self):
+        """Pre-computed squared L2 norm of every gallery row."""
+        return self._sq_norms[:self._count]
+
+    @property
+    def nbytes(self):
+        """Memory held by the valid rows (codes + norms + scale)."""
+        scale = self._scale.nbytes if self._scale is not None else 0
+        return self.codes.nbytes + self.sq_norms.nbytes + scale
+
+    def attach(self, names, matrix, sq_norms=None, scale=None):
+        """
+        Uses an existing matrix (e.g. a read-only np.memmap) as the gallery
+        without copying it. The first add/remove makes a private copy.
+        'matrix' must already be in this matcher's precision.
+        """
+        if matrix.dtype != self._dtype:
+            raise ValueError(f"Can't attach a {matrix.dtype} matrix to a {self.precision} gallery")
+        if self.precision == "int8" and scale is None:
+            raise ValueError("An int8 gallery needs its scale")
+        self._scale = scale
+        if sq_norms is None:
+            sq_norms = self._norms_of(matrix)
+
+        self._matrix = matrix
+        self._sq_norms = sq_norms
+        self._count = len(matrix)
+        self.names = names
+        self.index = None
+        self._attached = True
+        self._user_rows = {}
+
+    def _detach(self):
+        """Copies attached arrays into private, writable ones."""
+        self._matrix = np.array(self.codes, dtype=self._dtype)
+        self._sq_norms = np.array(self.sq_norms, dtype=np.float32)
+        self.names = list(self.names)
+        self._attached = False
+
+    def _norms_of(self, codes):
+        """Squared norms of stored rows (of what is stored, so quantized distances stay consistent)."""
+        norms = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK):
+            rows = dequantize(codes[start:start + SCAN_CHUNK], self.precision, self._scale)
+            norms[start:start + len(rows)] = np.einsum('ij,ij->i', rows, rows)
+        return norms
+
+    def _fit_scale(self, rows):
+        """
+        int8: makes sure the scale covers 'rows'. When new rows are out of
+        range the scale is widened and the stored rows re-quantized (rare,
+        the first fit leaves some headroom).
+        """
+        peak = np.abs(rows).max(axis=0) if len(rows) else None
+        if peak is None or (self._scale is not None and np.all(peak <= self._scale * INT8_MAX)):
+            return
+        scale = fit_scale(rows, SCALE_HEADROOM)
+        if self._scale is not None:
+            scale = np.maximum(scale, self._scale)
+            stored = self.encodings
+            self._matrix[:self._count], _ = quantize(stored, "int8", scale)
+        self._scale = scale
+        if self._count:
+            self._sq_norms[:self._count] = self._norms_of(self.codes)
+
+    def _reserve(self, needed):
+        """Makes sure the matrix has room for 'needed' rows."""
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.empty((new_capacity, self.dim), dtype=self._dtype)
+        matrix[:self._count] = self._matrix[:self._count]
+        sq_norms = np.empty(new_capacity, dtype=np.float32)
+        sq_norms[:self._count] = self._sq_norms[:self._count]
+
+        self._matrix = matrix
+        self._sq_norms = sq_norms
+
+    def add(self, name, encoding):
+        """Adds a single encoding (one angle) for 'name'."""
+        self.add_many([name], [encoding])
+
+    def add_many(self, names, encodings):
+        """
+        Appends several rows in one copy.
+        'encodings' can be a list of lists or an (N x dim) array.
+        """
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(rows) != len(names):
+            raise ValueError(f"Got {len(names)} names for {len(rows)} encodings")
+        if self._attached:
+            self._detach()
+
+        if self.precision == "int8":
+            self._fit_scale(rows)
+        codes, _ = quantize(rows, self.precision, self._scale)
+        self._append(names, codes, rows)
+
+    def add_codes(self, names, codes, scale=None):
+        """
+        Appends rows that are already stored in this gallery's precision
+        (e.g. packed FETCH_USERS rows) as they are, without rounding them again.
+        int8 codes keep their scale when the gallery is empty or uses the same
+        one; codes with another scale are re-quantized once, from their values.
+        """
+        codes = np.asarray(codes).reshape(-1, self.dim)
+        if codes.dtype != self._dtype:
+            raise ValueError(f"Can't add {codes.dtype} codes to a {self.precision} gallery")
+        if len(codes) != len(names):
+            raise ValueError(f"Got {len(names)} names for {len(codes)} rows")
+        if self.precision == "int8":
+            if scale is None:
+                raise ValueError("int8 codes need their scale")
+            if self._count == 0:
+                self._scale = np.array(scale, dtype=np.float32)
+            elif not np.array_equal(scale, self._scale):
+                self.add_many(names, dequantize(codes, "int8", scale))
+                return
+        if self._attached:
+            self._detach()
+        self._append(names, codes, codes)
+
+    def _append(self, names, codes, rows):
+        """Writes quantized 'codes' (float32 'rows' for the index) after the last row."""
+        start = self._count
+        end = start + len(codes)
+        self._reserve(end)
+
+        self._matrix[start:end] = codes
+        self._sq_norms[start:end] = self._norms_of(codes)
+        self._count = end
+        self.names.extend(names)
+        self._user_rows = {}
+
+        # New users go straight into their closest cluster
+        if self.index is not None and self.precision == "float32":
+            self.index.add(np.arange(start, end), rows)
+
+    def remove_names(self, names):
+        """
+        Drops every row that belongs to one of 'names'.
+        Returns the number of removed rows. Row ids shift, so an existing
+        index is rebuilt.
+        """
+        names = set(names)
+        keep = np.fromiter((name not in names for name in self.names), dtype=bool, count=self._count)
+        removed = int(self._count - keep.sum())
+        if removed == 0:
+            return 0
+        if self._attached:
+            self._detach()
+
+        kept = self._count - removed
+        self._matrix[:kept] = self.codes[keep]
+        self._sq_norms[:kept] = self.sq_norms[keep]
+        self._count = kept
+        self.names = [name for name in self.names if name not in names]
+        self._user_rows = {}
+
+        if self.index is not None:
+            self.build_index(self.index.n_lists, self.index.n_probe)
+        return removed
+
+    def clear(self):
+        """Forgets the whole gallery (keeps the allocated matrix for reuse)."""
+        if self._attached:
+            # Drop the mapping instead of writing into it
+            self._matrix = np.empty((0, self.dim), dtype=self._dtype)
+            self._sq_norms = np.empty(0, dtype=np.float32)
+            self._attached = False
+
+        self._scale = None  # A new gallery gets a scale fitted to it
+        self._count = 0
+        self.names = []
+        self.index = None  # Clusters of the old gallery are meaningless now
+        self._user_rows = {}
+
+    def build_index(self, n_lists=None, n_probe=8):
+        """
+        Builds an IVF index over the current gallery.
+        n_probe is the recall/speed knob (more probes = closer to exact).
+        """
+        if self._count == 0:
+            self.index = None
+            return None
+        if self.precision != "float32":
+            log.warning("⚠ The IVF index needs a float32 gallery, %s galleries are searched exactly", self.precision)
+            self.index = None
+            return None
+
+        self.index = IVFIndex(n_lists=n_lists, n_probe=n_probe)
+        self.index.build(self.encodings)
+        return self.index
+
+    def _use_index(self):
+        """Exact fallback for small galleries or when probing every cluster."""
+        if self.index is None or self._count < self.exact_search_limit:
+            return False
+        return self.index.n_probe < len(self.index.centroids)
+
+    def distances(self, queries):
+        """
+        Euclidean distance from every query to every gallery row (Q x N).
+        Uses |q - g|^2 = |q|^2 + |g|^2 - 2 q.g so the whole thing is one matmul.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+
+        if self.precision == "float32":
+            dist_sq = queries @ self.encodings.T
+        else:
+            # Widen one chunk at a time, never the whole gallery.
+            # int8: q.(s*c) = (q*s).c, so the scale is applied to the queries once.
+            scaled = queries * self._scale if self.precision == "int8" else queries
+            dist_sq = np.empty((len(queries), self._count), dtype=np.float32)
+            for start in range(0, self._count, SCAN_CHUNK):
+                block = self.codes[start:start + SCAN_CHUNK].astype(np.float32)
+                dist_sq[:, start:start + len(block)] = scaled @ block.T
+        dist_sq *= -2
+        dist_sq += q_sq[:, None]
+        dist_sq += self.sq_norms[None, :]
+        np.maximum(dist_sq, 0, out=dist_sq)  # Rounding can go slightly negative
+        return np.sqrt(dist_sq, out=dist_sq)
+
+    def match(self, queries):
+        """
+        Finds the closest gallery identity for every query.
+        Returns a list of (name, distance); name is "Unknown" when the
+        closest row is further away than the tolerance.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if len(queries) == 0:
+            return []
+        if self._count == 0:
+            return [("Unknown", float("inf"))] * len(queries)
+
+        if self._use_index():
+            best_rows, best_dist = self.index.search(self.encodings, self.sq_norms, queries)
+        elif self.precision != "float32":
+            best_rows, best_dist = self._rerank(queries, self.distances(queries))
+        else:
+            dist = self.distances(queries)
+            best_rows = dist.argmin(axis=1)
+            best_dist = dist[np.arange(len(queries)), best_rows]
+
+        results = []
+        for row, distance in zip(best_rows, best_dist):
+            distance = float(distance)
+            name = self.names[row] if distance <= self.tolerance else "Unknown"
+            results.append((name, distance))
+        return results
+
+    def _rerank(self, queries, dist):
+        """
+        Quantized galleries: the chunked scan picks the closest 'rerank' rows
+        per query, which are then scored directly as |q - g| in float32
+        (no |q|^2 + |g|^2 - 2 q.g cancellation) to choose the winner.
+        """
+        k = max(1, min(self.rerank, self._count))
+        if k == self._count:
+            candidates = np.broadcast_to(np.arange(k), (len(queries), k))
+        else:
+            candidates = np.argpartition(dist, k - 1, axis=1)[:, :k]
+
+        rows = dequantize(self.codes[candidates.ravel()], self.precision, self._scale)
+        diff = queries[:, None, :] - rows.reshape(len(queries), k, self.dim)
+        exact = np.sqrt(np.einsum('qkd,qkd->qk', diff, diff))
+        best = exact.argmin(axis=1)
+        picked = np.arange(len(queries))
+        return candidates[picked, best], exact[picked, best]
+
+    def user_rows(self, name):
+        """
+        The gallery rows of one user (k x dim, one per stored angle).
+        Found with one scan of the names, then cached until the gallery changes.
+        """
+        rows = self._user_rows.get(name)
+        if rows is None:
+            ids = [i for i, row_name in enumerate(self.names) if row_name == name]
+            rows = dequantize(self.codes[ids], self.precision, self._scale).reshape(-1, self.dim)
+            self._user_rows[name] = rows
+        return rows
+
+    def verify(self, queries, name):
+        """
+        1:1 check: distance from every query to the closest row of 'name' only.
+        Returns a list of distances (inf if the user has no rows).
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        rows = self.user_rows(name)
+        if len(queries) == 0:
+            return []
+        if len(rows) == 0:
+            return [float("inf")] * len(queries)
+
+        diff = queries[:, None, :] - rows[None, :, :]
+        return [float(d) for d in np.sqrt(np.einsum('qkd,qkd->qk', diff, diff)).min(axis=1)]
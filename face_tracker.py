@@ -0,0 +1,156 @@
+from startup import LazyModule
+
+cv2 = LazyModule("cv2")  # Imported on first use, keeps client startup fast
+
+DETECT_EVERY = 10  # Full detection + encoding once every N frames
+MATCH_THRESHOLD = 0.55  # Below this template score a track counts as lost
+SEARCH_MARGIN = 0.5  # How far (in box sizes) a face may move between two frames
+TRACK_SCALE = 0.5  # Tracking runs on a half-size grayscale copy
+
+
+class Track:
+    """One followed face: who it is and where it was last seen."""
+
+    def __init__(self, name, box, template):
+        self.name = name
+        self.box = box  # (top, right, bottom, left) in tracking coordinates
+        self.template = template  # Grayscale patch taken when the face was detected
+
+
+class FaceTracker:
+    """
+    Detect-and-track wrapper around FaceAuthenticator.
+    The expensive part (face_locations + face_encodings + matching) only runs
+    every 'detect_every' frames or when a track is lost. In between, every
+    face box is followed with cv2.matchTemplate and keeps its identity.
+    Exposes the same identify(frame) -> [(name, location), ...] interface.
+    """
+
+    def __init__(self, auth, detect_every=DETECT_EVERY, match_threshold=MATCH_THRESHOLD,
+                 search_margin=SEARCH_MARGIN, track_scale=TRACK_SCALE):
+        self.auth = auth
+        self.detect_every = detect_every
+        self.match_threshold = match_threshold
+        self.search_margin = search_margin
+        self.track_scale = track_scale
+
+        self.tracks = []
+        self.frames_since_detect = None  # None = detect on the next frame
+
+        # Counters, to see how much work tracking saves
+        self.detections = 0
+        self.tracked_frames = 0
+
+    @property
+    def matcher(self):
+        return self.auth.matcher
+
+    def reset(self):
+        """Forgets every track; the next frame runs a full detection."""
+        self.tracks = []
+        self.frames_since_detect = None
+
+    def _detection_due(self):
+        return self.frames_since_detect is None or self.frames_since_detect >= self.detect_every - 1
+
+    def identify(self, frame):
+        gray = self._prepare(frame)
+
+        if not self._detection_due():
+            # 1. Follow every face with the cheap tracker
+            results = self._follow_all(gray)
+            if results is not None:
+                return results
+
+        # 2. Time for a full detection, or lost someone (moved too fast, turned away, left)
+        return self._detect(frame, gray)
+
+    def verify(self, frame, username, roi=None):
+        """
+        Presence check for the logged-in user (see FaceAuthenticator.verify).
+        Between detections the user's track is simply followed; on detection
+        frames only the 1:1 check runs. Returns None when the user wasn't
+        found, so the caller can fall back to identify().
+        """
+        if not hasattr(self.auth, "verify"):
+            return None
+        gray = self._prepare(frame)
+
+        if not self._detection_due() and any(track.name == username for track in self.tracks):
+            results = self._follow_all(gray)
+            if results is not None:
+                return results
+
+        results = self.auth.verify(frame, username, roi)
+        if results is None:
+            self.reset()  # Let the fallback identify() run a full detection
+            return None
+        self._start_tracks(gray, results)
+        return results
+
+    def _prepare(self, frame):
+        small = cv2.resize(frame, (0, 0), fx=self.track_scale, fy=self.track_scale)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _follow_all(self, gray):
+        """Moves every track one frame. Returns the results, or None if any track was lost."""
+        for track in self.tracks:
+            box = self._follow(gray, track)
+            if box is None:
+                return None
+            track.box = box
+
+        self.frames_since_detect += 1
+        self.tracked_frames += 1
+        return [(track.name, self._to_frame(track.box)) for track in self.tracks]
+
+    def _detect(self, frame, gray):
+        results = self.auth.identify(frame)
+        self._start_tracks(gray, results)
+        return results
+
+    def _start_tracks(self, gray, results):
+        """Starts a fresh track for every detected face."""
+        self.detections += 1
+        self.frames_since_detect = 0
+
+        self.tracks = []
+        for name, location in results:
+            top, right, bottom, left = self._to_track(location, gray.shape)
+            if bottom - top < 4 or right - left < 4:
+                continue  # Too small to track, it will be picked up by the next detection
+            template = gray[top:bottom, left:right].copy()
+            self.tracks.append(Track(name, (top, right, bottom, left), template))
+
+    def _follow(self, gray, track):
+        """Finds the track's template near its last box. Returns the new box, or None if lost."""
+        top, right, bottom, left = track.box
+        height, width = bottom - top, right - left
+        margin_y = int(height * self.search_margin)
+        margin_x = int(width * self.search_margin)
+
+        # Search window around the last position, clipped to the frame
+        y0, y1 = max(0, top - margin_y), min(gray.shape[0], bottom + margin_y)
+        x0, x1 = max(0, left - margin_x), min(gray.shape[1], right + margin_x)
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < height or window.shape[1] < width:
+            return None  # Face is leaving the picture
+
+        scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, best_score, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+        if best_score < self.match_threshold:
+            return None
+
+        new_top, new_left = y0 + best_y, x0 + best_x
+        return (new_top, new_left + width, new_top + height, new_left)
+
+    def _to_track(self, location, shape):
+        top, right, bottom, left = location
+        s = self.track_scale
+        return (max(0, int(top * s)), min(shape[1], int(right * s)),
+                min(shape[0], int(bottom * s)), max(0, int(left * s)))
+
+    def _to_frame(self, box):
+        top, right, bottom, left = box
+        s = self.track_scale
+        return (int(round(top / s)), int(round(right / s)), int(round(bottom / s)), int(round(left / s)))
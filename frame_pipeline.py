@@ -0,0 +1,181 @@
+import collections
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class LatestQueue:
+    """
+    Bounded queue where the newest item always wins.
+    When it is full, put() throws away the oldest item instead of blocking,
+    so a slow consumer always gets the freshest frame, never a stale backlog.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = collections.deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Returns the oldest kept item, or None on timeout / after close()."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Throughput and latency counters for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy_time = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self._window_count += 1
+            self.busy_time += seconds
+
+    def snapshot(self):
+        """Returns (fps since the last snapshot, average ms per item) and starts a new window."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self._window_start, 1e-9)
+            fps = self._window_count / elapsed
+            avg_ms = 1000 * self.busy_time / self.count if self.count else 0.0
+            self._window_start = now
+            self._window_count = 0
+        return fps, avg_ms
+
+
+class Frame:
+    """A captured frame plus when (and in what order) it was taken."""
+
+    def __init__(self, index, image):
+        self.index = index
+        self.image = image
+        self.captured_at = time.monotonic()
+
+
+class FramePipeline:
+    """
+    Runs capture and recognition in their own threads:
+
+        capture --(latest frame)--> recognition --(latest results)--> display
+
+    The display stage (which must stay on the main thread for cv2.imshow)
+    pulls the newest captured frame and the newest recognition results.
+    Each queue keeps only the freshest item and counts what it drops.
+    """
+
+    def __init__(self, camera, recognize, on_results=None, stats_interval=5.0):
+        self.camera = camera  # Anything with get_frame() -> (ret, frame)
+        self.recognize = recognize  # frame -> results (runs on the recognition thread)
+        self.on_results = on_results  # Called with (frame, results) on the recognition thread
+
+        self.to_recognition = LatestQueue(maxsize=1)
+        self.to_display = LatestQueue(maxsize=1)
+        self.stats = {name: StageStats(name) for name in ("capture", "recognition", "display")}
+        self.stats_interval = stats_interval
+
+        self.latest_results = []
+        self.latest_results_frame = -1  # Index of the frame the results belong to
+        self.running = False
+        self._threads = []
+        self._last_report = time.monotonic()
+
+    def start(self):
+        self.running = True
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._recognition_loop, name="recognition", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.to_recognition.close()
+        self.to_display.close()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def _capture_loop(self):
+        index = 0
+        while self.running:
+            start = time.monotonic()
+            ret, image = self.camera.get_frame()
+            if not ret:
+                self.running = False
+                break
+
+            frame = Frame(index, image)
+            index += 1
+            self.to_recognition.put(frame)
+            self.to_display.put(frame)
+            self.stats["capture"].record(time.monotonic() - start)
+
+        self.to_recognition.close()
+        self.to_display.close()
+
+    def _recognition_loop(self):
+        while self.running:
+            frame = self.to_recognition.get(timeout=0.5)
+            if frame is None:
+                continue
+
+            start = time.monotonic()
+            results = self.recognize(frame.image)
+            self.latest_results = results
+            self.latest_results_frame = frame.index
+            if self.on_results:
+                self.on_results(frame, results)
+            self.stats["recognition"].record(time.monotonic() - start)
+
+    def next_display_frame(self, timeout=0.5):
+        """For the display stage: newest frame plus the newest results (or None)."""
+        frame = self.to_display.get(timeout)
+        if frame is None:
+            return None, self.latest_results
+        return frame, self.latest_results
+
+    def record_display(self, seconds):
+        self.stats["display"].record(seconds)
+        self._maybe_report()
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self._last_report < self.stats_interval:
+            return
+        self._last_report = now
+
+        parts = []
+        for name, stage in self.stats.items():
+            fps, avg_ms = stage.snapshot()
+            parts.append(f"{name} {fps:.1f} fps ({avg_ms:.1f} ms)")
+        log.info("📊 %s | dropped: recognition %s, display %s",
+                 " | ".join(parts), self.to_recognition.dropped, self.to_display.dropped)
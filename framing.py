@@ -0,0 +1,170 @@
+import asyncio
+import json
+import struct
+import zlib
+
+# Every message on the wire is: header (10 bytes) + payload.
+#   version (1 byte) | flags (1 byte) | request id (4 bytes) | payload length (4 bytes)
+# All in network byte order, so clients and server agree on any CPU.
+# Replies carry the id of the request they answer, so several requests can be
+# in flight on one connection. Id 0 = not tied to a request (server push).
+PROTOCOL_VERSION = 2
+HEADER = struct.Struct('!BBII')
+DEFAULT_MAX_FRAME_SIZE = 64 * 1024 * 1024
+SMALL_FRAME = 64 * 1024  # Below this, header + payload go out in one send
+
+# Flag bits
+FLAG_ZLIB = 0x01  # Payload is zlib-compressed (only after both sides agreed, see HELLO)
+
+SUPPORTED_COMPRESSION = ("zlib",)
+COMPRESS_MIN_SIZE = 1024  # Not worth compressing tiny replies
+COMPRESS_LEVEL = 6
+
+
+class FrameError(Exception):
+    """Raised for malformed, oversized or wrong-version frames."""
+
+
+class ConnectionClosed(FrameError):
+    """The peer closed the socket in the middle of a frame."""
+
+
+def encode_header(length, flags=0, request_id=0):
+    return HEADER.pack(PROTOCOL_VERSION, flags, request_id, length)
+
+
+def parse_header(header, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+    """Returns (flags, request_id, length) or raises FrameError."""
+    version, flags, request_id, length = HEADER.unpack(header)
+    if version != PROTOCOL_VERSION:
+        raise FrameError(f"Unsupported protocol version {version} (expected {PROTOCOL_VERSION})")
+    if length > max_frame_size:
+        raise FrameError(f"Frame of {length} bytes exceeds the {max_frame_size} byte limit")
+    return flags, request_id, length
+
+
+def send_frame(sock, payload, flags=0, request_id=0):
+    """
+    Sends one frame. Small payloads are joined with the header (one send);
+    large ones are sent straight from the caller's buffer without a copy.
+    """
+    header = encode_header(len(payload), flags, request_id)
+    if len(payload) < SMALL_FRAME:
+        sock.sendall(header + payload)
+    else:
+        sock.sendall(header)
+        sock.sendall(memoryview(payload))
+
+
+def encode_json(data):
+    """JSON payload for a frame ('data' may already be encoded bytes)."""
+    return data if isinstance(data, (bytes, bytearray)) else json.dumps(data).encode('utf-8')
+
+
+def decode_json(payload, flags=0, max_size=DEFAULT_MAX_FRAME_SIZE):
+    """
+    Decodes a JSON payload (bytes or memoryview) without an extra bytes copy.
+    Compressed payloads are inflated first, up to 'max_size' bytes.
+    """
+    if flags & FLAG_ZLIB:
+        inflater = zlib.decompressobj()
+        payload = inflater.decompress(payload, max_size)
+        if inflater.unconsumed_tail:
+            raise FrameError(f"Compressed frame inflates beyond the {max_size} byte limit")
+    return json.loads(str(payload, 'utf-8'))
+
+
+class CachedPayload:
+    """
+    An already-encoded JSON reply that many clients receive (e.g. the
+    gallery snapshot). Its compressed form is built once, on first use.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._zlib = None
+
+    def __len__(self):
+        return len(self.raw)
+
+    def zlib(self):
+        if self._zlib is None:
+            self._zlib = zlib.compress(self.raw, COMPRESS_LEVEL)
+        return self._zlib
+
+
+def encode_payload(data, compression=None):
+    """
+    Turns a reply (dict, bytes or CachedPayload) into (payload, flags),
+    compressing it if 'compression' was negotiated and it is big enough.
+    """
+    raw = data.raw if isinstance(data, CachedPayload) else encode_json(data)
+    if compression != "zlib" or len(raw) < COMPRESS_MIN_SIZE:
+        return raw, 0
+    if isinstance(data, CachedPayload):
+        return data.zlib(), FLAG_ZLIB
+    return zlib.compress(raw, COMPRESS_LEVEL), FLAG_ZLIB
+
+
+class FrameReader:
+    """
+    Reads frames from a blocking socket into one reusable buffer with
+    recv_into(), so a multi-megabyte reply is received without the
+    quadratic 'data += packet' copying.
+    The memoryview returned by read_frame() is only valid until the next call.
+    """
+
+    def __init__(self, sock, max_frame_size=DEFAULT_MAX_FRAME_SIZE, initial_size=64 * 1024):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self._header = bytearray(HEADER.size)
+        self._buffer = bytearray(initial_size)
+
+    def _recv_exactly(self, view):
+        """Fills 'view' completely. Returns False if the peer closed before sending anything."""
+        received = 0
+        while received < len(view):
+            n = self.sock.recv_into(view[received:])
+            if n == 0:
+                if received == 0:
+                    return False
+                raise ConnectionClosed(f"Connection closed after {received} of {len(view)} bytes")
+            received += n
+        return True
+
+    def read_frame(self):
+        """
+        Returns (flags, request_id, payload_view), or None if the peer closed
+        the connection cleanly between frames.
+        """
+        if not self._recv_exactly(memoryview(self._header)):
+            return None
+        flags, request_id, length = parse_header(self._header, self.max_frame_size)
+
+        if length > len(self._buffer):
+            self._buffer = bytearray(max(length, len(self._buffer) * 2))
+
+        payload = memoryview(self._buffer)[:length]
+        if length and not self._recv_exactly(payload):
+            raise ConnectionClosed("Connection closed before the frame payload")
+        return flags, request_id, payload
+
+
+async def read_frame_async(reader, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+    """
+    asyncio version of FrameReader.read_frame() for a StreamReader.
+    Returns (flags, request_id, payload) or None on a clean close between frames.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ConnectionClosed("Connection closed in the middle of a frame header")
+    flags, request_id, length = parse_header(header, max_frame_size)
+
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionClosed("Connection closed before the frame payload")
+    return flags, request_id, payload
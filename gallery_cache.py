@@ -0,0 +1,137 @@
+import json
+import logging
+import threading
+import time
+
+from database_manager import users_to_json
+from framing import CachedPayload
+from quantization import pack_rows
+
+MAX_CACHED_DELTAS = 64  # Distinct 'since' versions we keep replies for
+
+log = logging.getLogger(__name__)
+
+
+def encode_rows(names, matrix, precision=None):
+    """
+    The rows part of a FETCH_USERS reply: "users" as JSON numbers (the
+    original format), or "packed" float32 / float16 / int8 codes.
+    """
+    if precision is None:
+        return {"users": users_to_json(names, matrix)}
+    return {"packed": pack_rows(names, matrix, precision)}
+
+
+class GallerySnapshot:
+    """
+    One immutable copy of the gallery plus its ready-to-send replies.
+    Replies are encoded on first use, once per precision the clients ask for.
+    """
+
+    def __init__(self, version, names, matrix):
+        self.version = version
+        self.names = names  # names[i] owns matrix row i
+        self.matrix = matrix  # float32, one row per stored angle
+        self.payloads = {}  # precision (None = JSON numbers) -> CachedPayload of the full reply
+        self.deltas = {}  # (since_version, precision) -> CachedPayload of the delta reply
+        self._lock = threading.Lock()  # A burst of clients encodes each reply once
+
+    def full_payload(self, precision=None):
+        payload = self.payloads.get(precision)
+        if payload is None:
+            with self._lock:
+                payload = self.payloads.get(precision)
+                if payload is None:
+                    response = {"status": "SUCCESS", "full": True, "version": self.version,
+                                **encode_rows(self.names, self.matrix, precision)}
+                    payload = CachedPayload(json.dumps(response).encode('utf-8'))
+                    self.payloads[precision] = payload
+        return payload
+
+    @property
+    def payload(self):
+        """CachedPayload of the original (JSON numbers) FETCH_USERS reply."""
+        return self.full_payload(None)
+
+
+class GalleryCache:
+    """
+    Server-side cache for FETCH_USERS.
+    Holds the last user list and its pre-serialized response, and rebuilds
+    them only when the DB gallery version changes. The version is checked
+    at most once every 'check_interval' seconds, so a burst of clients
+    costs one tiny query instead of one full scan + encode each.
+    """
+
+    def __init__(self, db, check_interval=2.0):
+        self.db = db
+        self.check_interval = check_interval
+
+        self._snapshot = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()  # Only one thread rebuilds at a time
+
+    def invalidate(self):
+        """Forces a version check on the next get()."""
+        self._last_check = 0.0
+
+    def _build(self, version):
+        names, matrix = self.db.get_gallery()
+        return GallerySnapshot(version, names, matrix)
+
+    def get(self):
+        """Returns the current GallerySnapshot, rebuilding it if the gallery changed."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._last_check < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have refreshed it while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._last_check < self.check_interval:
+                return snapshot
+
+            version = self.db.get_gallery_version()
+            if version is None and snapshot is not None:
+                # Can't reach the DB: keep serving the last good copy
+                return snapshot
+
+            if snapshot is None or version != snapshot.version:
+                snapshot = self._build(version)
+                self._snapshot = snapshot
+                log.info("🗂️  Gallery cache rebuilt: %s entries (version %s)", len(snapshot.names), version)
+
+            self._last_check = time.monotonic()
+            return snapshot
+
+    def get_delta(self, since_version, precision=None):
+        """
+        Reply for a client that already has 'since_version': only the users
+        added/removed after it, or the full snapshot if it is too far behind.
+        Replies are memoized per (since_version, precision) until the gallery changes.
+        """
+        snapshot = self.get()
+        if since_version == snapshot.version:
+            return {"status": "SUCCESS", "full": False, "version": snapshot.version, "removed": [],
+                    **encode_rows([], snapshot.matrix[:0], precision)}
+
+        payload = snapshot.deltas.get((since_version, precision))
+        if payload is not None:
+            return payload
+
+        changes = self.db.get_gallery_changes(since_version)
+        if changes is None:
+            return snapshot.full_payload(precision)
+
+        version, removed, names, matrix = changes
+        payload = CachedPayload(json.dumps({
+            "status": "SUCCESS",
+            "full": False,
+            "version": version,
+            "removed": removed,
+            **encode_rows(names, matrix, precision),
+        }).encode('utf-8'))
+
+        if len(snapshot.deltas) < MAX_CACHED_DELTAS:
+            snapshot.deltas[(since_version, precision)] = payload
+        return payload
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from face_matcher import ENCODING_DIM, FaceMatcher
+
+MAX_BATCH_ROWS = 512  # Embeddings matched in one matrix product
+MAX_WAIT = 0.005  # Seconds the first request may wait for others to join its batch
+MAX_EMBEDDINGS_PER_REQUEST = 32
+
+
+class _Job:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.future = Future()
+
+
+class IdentifyBatcher:
+    """
+    Serves IDENTIFY requests against a server-resident gallery.
+    Requests that arrive within 'max_wait' of each other (from any client)
+    are stacked and matched in one batched distance computation, so the
+    cost of scanning the gallery is shared by the whole fleet.
+    """
+
+    def __init__(self, gallery, tolerance=0.6, max_batch_rows=MAX_BATCH_ROWS, max_wait=MAX_WAIT):
+        self.gallery = gallery  # GalleryCache, tells us when the users changed
+        self.tolerance = tolerance
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+
+        self._matcher = None
+        self._matcher_version = None
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="identify-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, embeddings):
+        """
+        Queues one request's embeddings (list of 128-d vectors).
+        Returns a Future resolving to [(name, distance), ...].
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[None, :]
+        if embeddings.ndim != 2 or embeddings.shape[1] != ENCODING_DIM:
+            raise ValueError(f"Expected {ENCODING_DIM}-d embeddings, got shape {embeddings.shape}")
+        if len(embeddings) > MAX_EMBEDDINGS_PER_REQUEST:
+            raise ValueError(f"At most {MAX_EMBEDDINGS_PER_REQUEST} embeddings per request")
+
+        job = _Job(embeddings)
+        self._jobs.put(job)
+        return job.future
+
+    def _current_matcher(self):
+        """Rebuilds the matching matrix whenever the gallery version moves."""
+        snapshot = self.gallery.get()
+        if self._matcher is None or snapshot.version != self._matcher_version:
+            matcher = FaceMatcher(tolerance=self.tolerance)
+            if snapshot.names:
+                matcher.add_many(snapshot.names, snapshot.matrix)
+            self._matcher = matcher
+            self._matcher_version = snapshot.version
+        return self._matcher
+
+    def _collect(self):
+        """Waits for a job, then gathers others until the batch is full or max_wait passed."""
+        batch = [self._jobs.get()]
+        rows = len(batch[0].embeddings)
+        deadline = time.monotonic() + self.max_wait
+
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(job)
+            rows += len(job.embeddings)
+        return batch
+
+    def _run(self):
+        while True:
+            # Requests that timed out (and were cancelled) while queued are dropped
+            batch = [job for job in self._collect() if job.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                matcher = self._current_matcher()
+                # One matrix product for every request in the batch
+                matches = matcher.match(np.concatenate([job.embeddings for job in batch]))
+            except Exception as e:
+                for job in batch:
+                    job.future.set_exception(e)
+                continue
+
+            start = 0
+            for job in batch:
+                end = start + len(job.embeddings)
+                job.future.set_result(matches[start:end])
+                start = end
@@ -1,63 +1,291 @@
-import face_recognition
-import cv2
 import os
 import numpy as np
 import ctypes
 import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from startup import LazyModule, StartupTimeline, warm_up_models
 from network_client import NetworkClient
+from face_matcher import FaceMatcher
+from client_gallery import GALLERY_CACHE_FILE, load_gallery, save_gallery
+from remote_matcher import RemoteMatcher
+from frame_pipeline import FramePipeline
+from face_tracker import FaceTracker
+from adaptive_resize import DEFAULT_FACTOR, AdaptiveResize
+from metrics import REGISTRY, start_reporter
+from activity_log import EventUploader
+from quantization import unpack_codes, unpack_rows
+from rental_sessions import RentalWatcher
+
+# Thin client: don't keep the gallery here, let the server match (IDENTIFY)
+THIN_CLIENT = False
+
+# Run capture, recognition and display as separate stages
+PIPELINED = False
+
+# Full recognition only every few frames, track the face boxes in between
+TRACKING = False
+
+# While unlocked, verify the logged-in user 1:1 instead of searching the whole gallery
+VERIFY_PRESENCE = False
+
+# Pick the downscale from face size / frame time and search near the last faces
+ADAPTIVE_RESIZE = False
+
+# > 0: detect/encode faces on this many worker processes (see recognition_service.py)
+RECOGNITION_WORKERS = 0
+
+# Seconds between metric dumps in the log (0 = off)
+METRICS_INTERVAL = 60
+
+# Seconds between PRESENT audit events while the user is at the PC
+PRESENCE_EVENT_INTERVAL = 60
+
+# Only unlock for users with an active rental and lock when it runs out.
+# Rentals are started with rental_tool.py; with this off anyone known may unlock.
+RENTAL_ENFORCEMENT = False
+
+# How the gallery is downloaded, cached and kept in memory: "float32",
+# "float16" (half the size) or "int8" (a quarter) for low-RAM kiosks.
+# benchmarks/quantization_accuracy.py shows how often the decisions change.
+GALLERY_PRECISION = "float32"
+
+log = logging.getLogger("client")
+
+# Imported on first use: loading the dlib models happens on a background thread (see startup.py)
+cv2 = LazyModule("cv2")
+face_recognition = LazyModule("face_recognition")
 
 class FaceAuthenticator:
     """
     Handles facial recognition logic with support for multiple users from DB.
     """
 
-    def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_names = []
+    def __init__(self, tolerance=0.6, use_index=False, n_probe=8, cache_path=GALLERY_CACHE_FILE, matcher=None,
+                 adaptive=False, precision="float32"):
+        # All known encodings live in one float32 / float16 / int8 matrix (see FaceMatcher).
+        # A RemoteMatcher can be passed instead to match on the server.
+        self.matcher = matcher or FaceMatcher(tolerance=tolerance, precision=precision)
+        self.precision = precision
+
+        # Large galleries: approximate search over k-means partitions
+        self.use_index = use_index
+        self.n_probe = n_probe
+
+        # Local copy of the gallery, kept in sync with the server via deltas
+        self.cache_path = cache_path
+        self.gallery_version = None
+
+        # Adaptive downscale + region of interest (see adaptive_resize.py), None = fixed factor
+        self.adaptive = AdaptiveResize() if adaptive else None
 
     def load_users_from_db(self, user_list):
         """
         Receives a list of users from DatabaseManager and loads them.
         Format: [{'name': 'Yonatan', 'encoding': [0.1, 0.2...]}, ...]
         """
-        print(f"Loading {len(user_list)} users from Database...")
+        log.info("Loading %s users from Database...", len(user_list))
 
+        names = []
+        encodings = []
         for user in user_list:
-            name = user['name']
-            encoding = np.array(user['encoding'])  # Convert list back to numpy
+            names.append(user['name'])
+            encodings.append(user['encoding'])
+            log.debug(" - Loaded: %s", user['name'])
+
+        # One copy into the gallery matrix instead of one array per user
+        if names:
+            self.matcher.add_many(names, encodings)
+
+        if self.use_index and self.matcher.index is None:
+            self.matcher.build_index(n_probe=self.n_probe)
+
+    def load_rows(self, reply):
+        """Adds the rows of a FETCH_USERS reply / page, packed ("packed") or not ("users")."""
+        if "packed" in reply:
+            packed = reply["packed"]
+            if packed["precision"] == self.matcher.precision:
+                # Same precision: keep the server's codes (and int8 scale), don't round them twice
+                names, codes, scale = unpack_codes(packed)
+                if names:
+                    self.matcher.add_codes(names, codes, scale)
+            else:
+                names, matrix = unpack_rows(packed)
+                if names:
+                    self.matcher.add_many(names, matrix)
+            if self.use_index and self.matcher.index is None:
+                self.matcher.build_index(n_probe=self.n_probe)
+        else:
+            self.load_users_from_db(reply.get("users", []))
+
+    def save_cache(self):
+        save_gallery(self.gallery_version, self.matcher.names, self.matcher.codes, self.cache_path,
+                     self.matcher.sq_norms, self.matcher.scale)
+
+    def load_cache(self):
+        """Loads the on-disk gallery cache. Returns True if one was found."""
+        cached = load_gallery(self.cache_path) if self.cache_path else None
+        if cached is None:
+            return False
+
+        # The memory-mapped file *is* the matching matrix: no parsing, no copy
+        version, names, matrix, sq_norms, scale = cached
+        if matrix.dtype != self.matcher.codes.dtype:
+            log.warning("⚠ Gallery cache is %s, not %s: downloading the gallery again", matrix.dtype, self.precision)
+            return False
+        self.matcher.attach(names, matrix, sq_norms, scale)
+        if self.use_index and len(matrix):
+            self.matcher.build_index(n_probe=self.n_probe)
+
+        self.gallery_version = version
+        log.info("📂 Mapped %s cached faces (gallery version %s)", len(names), version)
+        return True
+
+    def apply_sync(self, response):
+        """
+        Applies a FETCH_USERS reply: either a full snapshot ("full": True)
+        or a delta of removed names + added users. Updates the local cache.
+        """
+        added = response.get("users") or (response.get("packed") or {}).get("names")
+        changed = bool(response.get("full", True) or response.get("removed") or added)
 
-            self.known_face_encodings.append(encoding)
-            self.known_face_names.append(name)
-            print(f" - Loaded: {name}")
+        if response.get("full", True):
+            self.matcher.clear()
+        else:
+            self.matcher.remove_names(response.get("removed", []))
+        self.load_rows(response)
 
-    def identify(self, frame, resize_factor=0.25):
+        self.gallery_version = response.get("version")
+        if changed and self.cache_path and self.gallery_version is not None:
+            self.save_cache()
+
+    def apply_stream(self, pages):
+        """
+        Loads a paginated full snapshot (NetworkClient.fetch_users_stream).
+        Every page is matchable as soon as it is loaded; the local cache is
+        only rewritten once the last page arrived. Returns True on success.
+        """
+        self.matcher.clear()
+        for page in pages:
+            if page.get("status") != "SUCCESS":
+                return False
+            self.load_rows(page)
+
+            if not page.get("more", False):
+                self.gallery_version = page.get("version")
+                if self.cache_path and self.gallery_version is not None:
+                    self.save_cache()
+                return True
+        return False
+
+    @staticmethod
+    def _crop(frame, region):
+        """Cuts 'region' (top, right, bottom, left) out of the frame. Returns (image, (y0, x0))."""
+        if region is None:
+            return frame, (0, 0)
+        top, right, bottom, left = region
+        return frame[top:bottom, left:right], (top, left)
+
+    @staticmethod
+    def _detect(image, resize_factor):
+        """Downscales, then finds + encodes faces. Returns (small locations, encodings, small image)."""
+        with REGISTRY.timer("identify.resize"):
+            small_frame = cv2.resize(image, (0, 0), fx=resize_factor, fy=resize_factor)
+            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+        with REGISTRY.timer("identify.detect"):
+            face_locations = face_recognition.face_locations(rgb_small_frame)
+        if not face_locations:
+            return face_locations, [], small_frame
+        with REGISTRY.timer("identify.encode"):
+            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        return face_locations, face_encodings, small_frame
+
+    @staticmethod
+    def _scale_location(location, image, small_frame, offset):
+        """Maps a box from the downscaled image back to full-frame pixels."""
+        # Exact per-axis ratio (cv2.resize rounds the output size)
+        scale_y = image.shape[0] / small_frame.shape[0]
+        scale_x = image.shape[1] / small_frame.shape[1]
+        top, right, bottom, left = location
+        y0, x0 = offset
+        return (y0 + int(round(top * scale_y)), x0 + int(round(right * scale_x)),
+                y0 + int(round(bottom * scale_y)), x0 + int(round(left * scale_x)))
+
+    def identify(self, frame, resize_factor=None):
         """
         Returns a list of (name, location) tuples.
+        Without an explicit resize_factor, adaptive mode picks the factor and
+        the search region; otherwise the whole frame is scanned at 0.25.
         """
-        small_frame = cv2.resize(frame, (0, 0), fx=resize_factor, fy=resize_factor)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        start = time.monotonic()
+        region = None
+        if resize_factor is None:
+            if self.adaptive:
+                resize_factor, region = self.adaptive.plan()
+            else:
+                resize_factor = DEFAULT_FACTOR
 
-        results = []
+        image, offset = self._crop(frame, region)
+        face_locations, face_encodings, small_frame = self._detect(image, resize_factor)
 
-        for face_encoding, location in zip(face_encodings, face_locations):
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding)
-            name = "Unknown"
+        # Score every detected face against the whole gallery in one go.
+        # The closest identity wins (not the first one under the tolerance).
+        with REGISTRY.timer("identify.match"):
+            matches = self.matcher.match(face_encodings)
 
-            if True in matches:
-                first_match_index = matches.index(True)
-                name = self.known_face_names[first_match_index]
+        results = []
 
+        for (name, distance), location in zip(matches, face_locations):
             # Scale location back up
-            top, right, bottom, left = location
-            scale = int(1 / resize_factor)
-            scaled_location = (top * scale, right * scale, bottom * scale, left * scale)
-            results.append((name, scaled_location))
+            results.append((name, self._scale_location(location, image, small_frame, offset)))
 
+        elapsed = time.monotonic() - start
+        REGISTRY.observe("identify.frame", elapsed)
+        if self.adaptive:
+            self.adaptive.update([loc for _, loc in results], elapsed, frame.shape, full_sweep=region is None)
         return results
 
+    def verify(self, frame, username, roi=None, resize_factor=None, roi_padding=0.5):
+        """
+        1:1 presence check: is 'username' in the frame?
+        Only looks inside 'roi' (top, right, bottom, left) grown by
+        'roi_padding' box sizes, and only compares against that user's own
+        encodings. Returns [(username, location)] or None if not found.
+        """
+        if not hasattr(self.matcher, "verify"):
+            return None  # e.g. RemoteMatcher: no local gallery to verify against
+
+        if resize_factor is None:
+            resize_factor = self.adaptive.factor if self.adaptive else DEFAULT_FACTOR
+
+        # 1. Cut out the region around the last known position
+        region = None
+        if roi is not None:
+            top, right, bottom, left = roi
+            pad_y = int((bottom - top) * roi_padding)
+            pad_x = int((right - left) * roi_padding)
+            region = (max(0, top - pad_y), min(frame.shape[1], right + pad_x),
+                      min(frame.shape[0], bottom + pad_y), max(0, left - pad_x))
+            if region[2] <= region[0] or region[1] <= region[3]:
+                return None
+        image, offset = self._crop(frame, region)
+
+        # 2. Detect + encode inside the region only
+        face_locations, face_encodings, small_frame = self._detect(image, resize_factor)
+        if not face_locations:
+            return None
+
+        # 3. Compare against the user's own rows, not the whole gallery
+        with REGISTRY.timer("verify.match"):
+            distances = self.matcher.verify(face_encodings, username)
+        best = int(np.argmin(distances))
+        if distances[best] > self.matcher.tolerance:
+            return None
+
+        return [(username, self._scale_location(face_locations[best], image, small_frame, offset))]
+
 
 class WebcamStream:
     """Handles the video capture device."""
@@ -75,16 +303,43 @@ class WebcamStream:
         self.video_capture.release()
 
 
+def open_camera(source=0):
+    """Opens the webcam and reads one frame (the first read is the slow one on most cameras)."""
+    camera = WebcamStream(source)
+    camera.get_frame()
+    return camera
+
+
 class SecuritySystem:
     """
     Main controller. Now handles Dynamic User Login.
     """
 
-    def __init__(self, face_auth_system, camera_system):
+    def __init__(self, face_auth_system, camera_system, pipelined=PIPELINED, show_window=True,
+                 verify_presence=VERIFY_PRESENCE, events=None, rentals=None, startup=None):
         self.auth = face_auth_system
         self.cam = camera_system
         self.is_running = False
 
+        # Audit trail: lock / unlock / presence events are queued here and
+        # uploaded in batches (EventUploader), never on the recognition path
+        self.events = events
+        self.last_presence_event = 0.0
+
+        # Rental state, pushed by the server (RentalWatcher); None = no rental checks
+        self.rentals = rentals
+
+        # StartupTimeline, closed by the first recognized frame
+        self.startup = startup
+
+        # While someone is logged in, only check for *them* (1:1) near their last position
+        self.verify_presence = verify_presence
+        self.last_user_box = None
+
+        # Capture / recognition / display in separate threads (see frame_pipeline.py)
+        self.pipelined = pipelined
+        self.show_window = show_window
+
         # --- NEW: Dynamic User State ---
         self.current_user = None  # Who is currently using the PC?
         self.is_locked = True  # Does the system think it's locked?
@@ -95,23 +350,35 @@ class SecuritySystem:
 
     def lock_computer(self):
         """Locks Windows and resets the current user."""
-        print("⚠ TIMEOUT: Locking Workstation...")
+        log.warning("⚠ TIMEOUT: Locking Workstation...")
+        self.log_event(self.current_user, "LOCK")
         try:
             ctypes.windll.user32.LockWorkStation()
             self.current_user = None
             self.is_locked = True
             self.missing_frames_count = 0
         except Exception as e:
-            print(f"Error locking computer: {e}")
+            log.error("Error locking computer: %s", e)
 
     def unlock_computer(self, username):
         """Log a user in."""
-        print(f"✅ ACCESS GRANTED: Welcome, {username}")
+        log.info("✅ ACCESS GRANTED: Welcome, %s", username)
+        self.log_event(username, "UNLOCK")
+        self.last_presence_event = time.monotonic()
         self.current_user = username
         self.is_locked = False
         self.missing_frames_count = 0
+        if self.rentals:
+            self.rentals.watch(username)  # Subscribes to this user's expiry notice
         # In a real app, you might minimize the window here
 
+    def has_rental(self, username):
+        return self.rentals is None or self.rentals.is_rented(username)
+
+    def log_event(self, username, action):
+        if self.events:
+            self.events.log(username, action)
+
     def draw_results(self, frame, results):
         for name, (top, right, bottom, left) in results:
             # Green if it's the current user, Blue if authorized but not logged in, Red if unknown
@@ -128,95 +395,229 @@ class SecuritySystem:
                         cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
         return frame
 
+    def recognize(self, frame):
+        """
+        Finds the faces in one frame.
+        While unlocked, first verifies the current user around their last
+        box; full 1:N identification only runs when that fails.
+        """
+        if self.verify_presence and self.current_user is not None and self.last_user_box is not None \
+                and hasattr(self.auth, "verify"):
+            results = self.auth.verify(frame, self.current_user, roi=self.last_user_box)
+            if results:
+                return results
+        return self.auth.identify(frame)
+
+    def process_results(self, results):
+        """Lock / unlock decisions for one recognized frame."""
+        if self.startup is not None:
+            self.startup.mark("first recognition")
+            self.startup.report()
+            self.startup = None
+
+        names_found = [r[0] for r in results]
+
+        # Scenario A: Computer is Locked (No current user)
+        if self.current_user is None:
+            # Check if ANY known user is looking
+            for name in names_found:
+                if name != "Unknown" and self.has_rental(name):
+                    self.unlock_computer(name)
+                    break
+
+        # Scenario B: Computer is Unlocked (User is working)
+        elif not self.has_rental(self.current_user):
+            # The server pushed (or answered) that the rental is over
+            log.info("⏱️  Rental of %s has ended", self.current_user)
+            self.lock_computer()
+
+        else:
+            if self.current_user in names_found:
+                # User is present, reset timer
+                self.missing_frames_count = 0
+
+                # Heartbeat for the audit trail (one event a minute, not one per frame)
+                now = time.monotonic()
+                if now - self.last_presence_event >= PRESENCE_EVENT_INTERVAL:
+                    self.last_presence_event = now
+                    self.log_event(self.current_user, "PRESENT")
+            else:
+                # User missing, start countdown
+                self.missing_frames_count += 1
+
+                if self.missing_frames_count % 10 == 0:
+                    log.debug("User %s missing... %s/%s",
+                              self.current_user, self.missing_frames_count, self.lock_threshold)
+
+            # Check if we need to lock
+            if self.missing_frames_count > self.lock_threshold:
+                self.lock_computer()
+
+        # Where to look for the current user next time (None = search everywhere)
+        self.last_user_box = next((loc for name, loc in results if name == self.current_user), None)
+
+    def render(self, frame, results):
+        """Draws boxes and status overlays on the frame."""
+        frame_with_ui = self.draw_results(frame, results)
+
+        # Overlay status text
+        status_text = f"USER: {self.current_user}" if self.current_user else "LOCKED"
+        time_left = self.rentals.time_left(self.current_user) if self.rentals and self.current_user else None
+        if time_left is not None:
+            status_text += f"  ({time_left // 60}:{time_left % 60:02d} left)"
+        cv2.putText(frame_with_ui, status_text, (20, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 255), 2)
+
+        # Warning text
+        if self.current_user and self.missing_frames_count > 5:
+            cv2.putText(frame_with_ui, f"LOCKING IN {self.lock_threshold - self.missing_frames_count}",
+                        (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+        return frame_with_ui
+
     def run(self):
-        print("System Active. Waiting for user...")
+        if self.pipelined:
+            self.run_pipelined()
+            return
+
+        log.info("System Active. Waiting for user...")
         self.is_running = True
 
         while self.is_running:
             ret, frame = self.cam.get_frame()
             if not ret: break
 
-            results = self.auth.identify(frame)
-            names_found = [r[0] for r in results]
+            results = self.recognize(frame)
 
             # --- LOGIC FLOW ---
+            self.process_results(results)
 
-            # Scenario A: Computer is Locked (No current user)
-            if self.current_user is None:
-                # Check if ANY known user is looking
-                for name in names_found:
-                    if name != "Unknown":
-                        self.unlock_computer(name)
-                        break
-
-            # Scenario B: Computer is Unlocked (User is working)
-            else:
-                if self.current_user in names_found:
-                    # User is present, reset timer
-                    self.missing_frames_count = 0
-                else:
-                    # User missing, start countdown
-                    self.missing_frames_count += 1
-
-                    if self.missing_frames_count % 10 == 0:
-                        print(f"User {self.current_user} missing... {self.missing_frames_count}/{self.lock_threshold}")
+            # --- DISPLAY ---
+            if self.show_window:
+                cv2.imshow('Face ID Client', self.render(frame, results))
 
-                # Check if we need to lock
-                if self.missing_frames_count > self.lock_threshold:
-                    self.lock_computer()
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    self.is_running = False
 
-            # --- DISPLAY ---
-            frame_with_ui = self.draw_results(frame, results)
+        self.cam.release()
+        if self.show_window:
+            cv2.destroyAllWindows()
 
-            # Overlay status text
-            status_text = f"USER: {self.current_user}" if self.current_user else "LOCKED"
-            cv2.putText(frame_with_ui, status_text, (20, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 255), 2)
+    def run_pipelined(self):
+        """
+        Same loop split into stages: capture and recognition run in their
+        own threads, display stays here on the main thread (cv2.imshow needs it).
+        The window keeps playing at camera speed while recognition catches up
+        on the newest frame; lock decisions count recognized frames.
+        """
+        log.info("System Active (pipelined). Waiting for user...")
+        self.is_running = True
 
-            # Warning text
-            if self.current_user and self.missing_frames_count > 5:
-                cv2.putText(frame_with_ui, f"LOCKING IN {self.lock_threshold - self.missing_frames_count}",
-                            (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+        pipeline = FramePipeline(self.cam, self.recognize,
+                                 on_results=lambda frame, results: self.process_results(results))
+        pipeline.start()
 
-            cv2.imshow('Face ID Client', frame_with_ui)
+        try:
+            while self.is_running and pipeline.running:
+                frame, results = pipeline.next_display_frame()
+                if frame is None:
+                    continue
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                self.is_running = False
+                start = time.monotonic()
+                if self.show_window:
+                    cv2.imshow('Face ID Client', self.render(frame.image, results))
 
-        self.cam.release()
-        cv2.destroyAllWindows()
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        self.is_running = False
+                pipeline.record_display(time.monotonic() - start)
+        finally:
+            pipeline.stop()
+            self.cam.release()
+            if self.show_window:
+                cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
-    # --- STEP 1: Connect to Server ---
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    timeline = StartupTimeline(log)
+    timeline.mark("client modules loaded")
+    if METRICS_INTERVAL:
+        start_reporter(REGISTRY, METRICS_INTERVAL)
+
+    # --- STEP 1: Start the slow local parts in the background ---
+    # Loading the dlib models and opening the camera take seconds each and
+    # need nothing from the server, so they overlap with connecting and syncing.
+    startup_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+    models_ready = startup_pool.submit(timeline.track, "face models warmed up", warm_up_models)
+    camera_ready = startup_pool.submit(timeline.track, "camera open", open_camera)
+    startup_pool.shutdown(wait=False)
+
+    # --- STEP 2: Connect to Server ---
     # NOTE: Change "127.0.0.1" to your server's real IP when you use 2 computers!
     net = NetworkClient(server_ip="127.0.0.1", server_port=5000)
 
     if not net.connect():
-        print("CRITICAL: Could not reach the server. Exiting.")
+        log.error("CRITICAL: Could not reach the server. Exiting.")
         exit()
+    timeline.mark("connected to server")
 
-    # Ask the server for the user list
-    response = net.send_request("FETCH_USERS")
-
-    if response and response.get("status") == "SUCCESS":
-        users = response["users"]
-        print(f"✅ Received {len(users)} users from Server.")
+    # --- STEP 3: Initialize Auth ---
+    if THIN_CLIENT:
+        # No local gallery at all: every detected face is matched by the server
+        auth_system = FaceAuthenticator(matcher=RemoteMatcher(net), cache_path=None, adaptive=ADAPTIVE_RESIZE)
     else:
-        print("❌ Failed to download user list.")
-        users = []
-
-    if not users:
-        print("⚠ WARNING: Server returned no users. Is the database empty?")
-
-    # --- STEP 2: Initialize Auth ---
-    auth_system = FaceAuthenticator()
-    auth_system.load_users_from_db(users)
-
-    # --- STEP 3: Start Security System ---
-    camera = WebcamStream()
-    system = SecuritySystem(auth_system, camera)
+        # Start from the local cache, then ask the server only for what changed
+        auth_system = FaceAuthenticator(adaptive=ADAPTIVE_RESIZE, precision=GALLERY_PRECISION)
+        auth_system.load_cache()
+
+        if auth_system.gallery_version is None:
+            # No local copy yet: stream the gallery page by page
+            if auth_system.apply_stream(net.fetch_users_stream(page_size=500, precision=GALLERY_PRECISION)):
+                log.info("✅ Received %s faces from Server (version %s).",
+                         len(auth_system.matcher), auth_system.gallery_version)
+            else:
+                log.error("❌ Failed to download user list.")
+        else:
+            response = net.send_request("FETCH_USERS", {"since_version": auth_system.gallery_version,
+                                                        "precision": GALLERY_PRECISION})
+
+            if response and response.get("status") == "SUCCESS":
+                kind = "users" if response.get("full", True) else "new/changed users"
+                count = len(response.get("users") or (response.get("packed") or {}).get("names", []))
+                log.info("✅ Received %s %s from Server (version %s).", count, kind, response.get('version'))
+                auth_system.apply_sync(response)
+            else:
+                log.error("❌ Failed to sync user list.")
+
+        if len(auth_system.matcher) == 0:
+            log.warning("⚠ WARNING: No known users. Is the database empty?")
+    timeline.mark("gallery ready")
+
+    # --- STEP 4: Start Security System ---
+    camera = camera_ready.result()  # Raises if there is no camera, like before
+    try:
+        models_ready.result()
+    except Exception as e:
+        # Not fatal: the models then load on the first frame instead
+        log.warning("⚠ Model warm-up failed: %s", e)
+
+    service = None
+    if RECOGNITION_WORKERS > 0:
+        from recognition_service import RecognitionService
+
+        service = RecognitionService(auth_system.matcher, workers=RECOGNITION_WORKERS)
+        recognizer = service
+    else:
+        recognizer = auth_system
+    if TRACKING:
+        recognizer = FaceTracker(recognizer)
+    events = EventUploader(net)
+    rentals = RentalWatcher(net) if RENTAL_ENFORCEMENT else None
+    system = SecuritySystem(recognizer, camera, events=events, rentals=rentals, startup=timeline)
     system.run()
 
+    if service:
+        service.close()
+    events.close()  # Uploads whatever is still queued
+
     # Close connection when app quits
     net.close()
\ No newline at end of file
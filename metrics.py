@@ -0,0 +1,167 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in milliseconds (last bucket catches everything above)
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+PERCENTILES = (50, 90, 99)
+
+log = logging.getLogger("metrics")
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets: recording is one bisect plus a
+    few additions, no samples are kept. Percentiles are bucket upper bounds.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        index = bisect.bisect_left(BUCKETS_MS, ms)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms < self.min_ms:
+                self.min_ms = ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def percentile(self, p):
+        target = self.count * p / 100
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target and count:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self):
+        with self._lock:
+            if not self.count:
+                return {"count": 0}
+            result = {
+                "count": self.count,
+                "mean_ms": round(self.total_ms / self.count, 3),
+                "min_ms": round(self.min_ms, 3),
+                "max_ms": round(self.max_ms, 3),
+            }
+            for p in PERCENTILES:
+                result[f"p{p}_ms"] = round(self.percentile(p), 3)
+            return result
+
+
+class MetricsRegistry:
+    """Named counters and latency histograms, created on first use."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def counter(self, name):
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def inc(self, name, amount=1):
+        self.counter(name).inc(amount)
+
+    def observe(self, name, seconds):
+        self.histogram(name).record(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """with REGISTRY.timer("db.get_gallery"): ... records how long the block took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).record(time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator version of timer()."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Everything as a JSON-friendly dict."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "counters": {name: c.value for name, c in sorted(counters.items())},
+            "latency": {name: h.snapshot() for name, h in sorted(histograms.items())},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self.started = time.time()
+
+
+def format_snapshot(snapshot):
+    """Human readable, one line per metric."""
+    lines = [f"📊 Metrics (uptime {snapshot['uptime']}s)"]
+    for name, value in snapshot["counters"].items():
+        lines.append(f"  {name:<32}{value:>10}")
+    for name, h in snapshot["latency"].items():
+        if not h.get("count"):
+            continue
+        lines.append(f"  {name:<32}{h['count']:>10}  mean {h['mean_ms']:.2f} ms  "
+                     f"p50 {h['p50_ms']:.2f}  p90 {h['p90_ms']:.2f}  p99 {h['p99_ms']:.2f}  max {h['max_ms']:.2f}")
+    return "\n".join(lines)
+
+
+def start_reporter(registry, interval=60.0, level=logging.INFO):
+    """Logs the registry every 'interval' seconds from a background thread."""
+    def report():
+        while True:
+            time.sleep(interval)
+            log.log(level, format_snapshot(registry.snapshot()))
+
+    thread = threading.Thread(target=report, name="metrics-reporter", daemon=True)
+    thread.start()
+    return thread
+
+
+# Process-wide registry, shared by the server / client modules
+REGISTRY = MetricsRegistry()
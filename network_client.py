@@ -1,75 +1,308 @@
+import itertools
+import logging
+import queue
+import random
 import socket
-import json
-import struct
+import threading
+import time
+from concurrent.futures import Future
+from framing import (DEFAULT_MAX_FRAME_SIZE, SUPPORTED_COMPRESSION, FrameReader,
+                     decode_json, encode_payload, send_frame)
+from metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+
+class _Connection:
+    """One TCP connection plus the requests still waiting for an answer on it."""
+
+    def __init__(self, sock, max_frame_size):
+        self.sock = sock
+        self.reader = FrameReader(sock, max_frame_size=max_frame_size)
+        self.pending = {}  # request_id -> Future (single reply) or Queue (streamed reply)
+        self.closed = False
 
 
 class NetworkClient:
     """
     Handles all communication with the Central Server.
+    Safe to share between threads: every request gets an id, a background
+    thread routes replies back to whoever is waiting, so several requests
+    can be in flight on one connection. Lost connections are re-opened
+    with exponential backoff on the next request.
     """
 
-    def __init__(self, server_ip="127.0.0.1", server_port=5000):
+    def __init__(self, server_ip="127.0.0.1", server_port=5000, max_frame_size=DEFAULT_MAX_FRAME_SIZE,
+                 compression=True, timeout=30.0, auto_reconnect=True, max_retries=5,
+                 backoff_base=0.5, backoff_max=30.0):
         self.server_ip = server_ip
         self.server_port = server_port
-        self.sock = None
+        self.max_frame_size = max_frame_size  # Largest reply we accept (full gallery snapshots are big)
+        self.use_compression = compression
+        self.compression = None  # What the server agreed to in HELLO
+        self.timeout = timeout  # Seconds to wait for a reply
+
+        # Reconnect policy
+        self.auto_reconnect = auto_reconnect
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._conn = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()  # Guards _conn and its pending table
+        self._send_lock = threading.Lock()  # One frame on the wire at a time
+        self._connect_lock = threading.RLock()  # One (re)connect attempt at a time
+        self._push_handlers = []  # Called with every server-initiated frame (request id 0)
+        self._connect_handlers = []  # Called after every (re)connect, e.g. to re-subscribe
+
+    @property
+    def sock(self):
+        conn = self._conn
+        return conn.sock if conn else None
 
     def connect(self):
         """Establishes connection to the server."""
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((self.server_ip, self.server_port))
-            print(f"✅ Connected to Server at {self.server_ip}:{self.server_port}")
-            return True
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.connect((self.server_ip, self.server_port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            log.info("✅ Connected to Server at %s:%s", self.server_ip, self.server_port)
         except Exception as e:
-            print(f"❌ Connection Failed: {e}")
+            log.error("❌ Connection Failed: %s", e)
             return False
 
-    def send_request(self, action, data=None):
+        conn = _Connection(sock, self.max_frame_size)
+        with self._lock:
+            self._conn = conn
+        self.compression = None
+
+        reader_thread = threading.Thread(target=self._reader_loop, args=(conn,), daemon=True)
+        reader_thread.start()
+
+        if self.use_compression:
+            self.negotiate()
+        for handler in list(self._connect_handlers):
+            handler()
+        return True
+
+    def on_push(self, handler):
         """
-        Sends a JSON command to the server and waits for a reply.
-        Example: send_request("FETCH_USERS")
+        handler(notice) is called for every frame the server sends on its own
+        (e.g. a rental expiry notice). Runs on the reader thread: keep it short.
         """
-        if not self.sock:
-            print("⚠ Error: Not connected to server.")
-            return None
+        self._push_handlers.append(handler)
+
+    def on_connect(self, handler):
+        """handler() is called after every successful (re)connect, server state is per connection."""
+        self._connect_handlers.append(handler)
+
+    def reconnect(self):
+        """Tries to connect again, waiting longer after every failure. Returns True once connected."""
+        with self._connect_lock:
+            if self._conn:
+                return True
+            for attempt in range(self.max_retries):
+                # Exponential backoff with jitter, so a server restart isn't hit by every client at once
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                log.info("🔄 Reconnecting in %.1fs (attempt %s/%s)...", delay, attempt + 1, self.max_retries)
+                time.sleep(delay)
+                if self.connect():
+                    return True
+            return False
+
+    def _ensure_connected(self):
+        if self._conn:
+            return True
+        return self.auto_reconnect and self.reconnect()
+
+    def negotiate(self):
+        """Agrees on per-connection options (compression) with the server."""
+        self.compression = None
+        response = self.send_request("HELLO", {"compression": list(SUPPORTED_COMPRESSION)})
+        if response and response.get("status") == "SUCCESS":
+            self.compression = response.get("compression")
+        return self.compression
+
+    def _reader_loop(self, conn):
+        """Background thread: reads reply frames and hands them to their waiters."""
+        error = ConnectionError("Server closed the connection")
+        try:
+            while True:
+                frame = conn.reader.read_frame()
+                if frame is None:
+                    break
+                flags, request_id, payload = frame
+                self._dispatch(conn, request_id, decode_json(payload, flags, self.max_frame_size))
+        except Exception as e:
+            if not conn.closed:
+                log.warning("❌ Communication Error: %s", e)
+            error = e
+        finally:
+            self._connection_lost(conn, error)
+
+    def _dispatch(self, conn, request_id, response):
+        if request_id == 0:
+            for handler in list(self._push_handlers):
+                try:
+                    handler(response)
+                except Exception as e:
+                    log.error("❌ Push handler error: %s", e)
+            return
+
+        with self._lock:
+            waiter = conn.pending.get(request_id)
+            finished = not isinstance(waiter, queue.Queue) or \
+                response.get("status") != "SUCCESS" or not response.get("more", False)
+            if waiter is not None and finished:
+                del conn.pending[request_id]
+
+        if isinstance(waiter, queue.Queue):
+            waiter.put(response)
+        elif waiter is not None and not waiter.done():
+            waiter.set_result(response)
+        # else: a reply nobody waits for anymore (timed out), drop it
+
+    def _connection_lost(self, conn, error):
+        """Fails every request that was waiting on 'conn' and forgets the socket."""
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+            pending, conn.pending = conn.pending, {}
+            conn.closed = True
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+
+        for waiter in pending.values():
+            if isinstance(waiter, queue.Queue):
+                waiter.put(error)
+            elif not waiter.done():
+                waiter.set_exception(error)
+
+    def _submit(self, action, data, waiter):
+        """Registers 'waiter' under a new request id and sends the request frame."""
+        if not self._ensure_connected():
+            raise ConnectionError("Not connected to server")
 
         req = {"action": action}
         if data:
             req.update(data)
 
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                raise ConnectionError("Not connected to server")
+            request_id = next(self._ids) % 0xFFFFFFFF + 1  # 1..2^32-1, 0 is reserved for pushes
+            conn.pending[request_id] = waiter
+
         try:
-            # 1. Serialize Data to JSON
-            json_payload = json.dumps(req).encode('utf-8')
+            # Serialize to JSON and send it as one frame (see framing.py)
+            payload, flags = encode_payload(req, self.compression)
+            with self._send_lock:
+                send_frame(conn.sock, payload, flags, request_id)
+        except Exception as e:
+            self._connection_lost(conn, e)
+            raise
+        return conn, request_id
 
-            # 2. Create Header (4 bytes containing the size of the message)
-            # 'I' = unsigned int (4 bytes)
-            header = struct.pack('I', len(json_payload))
+    def submit(self, action, data=None):
+        """
+        Sends a request without waiting for the reply.
+        Returns a concurrent.futures.Future that resolves to the reply dict.
+        """
+        future = Future()
+        try:
+            conn, request_id = self._submit(action, data, future)
+            future.request = (conn, request_id)
+        except Exception as e:
+            if not future.done():  # A lost connection may have failed it already
+                future.set_exception(e)
+        return future
 
-            # 3. Send Header + Data
-            self.sock.sendall(header + json_payload)
+    def _forget(self, future):
+        """Stops waiting for a reply (e.g. after a timeout)."""
+        conn, request_id = getattr(future, "request", (None, None))
+        if conn is not None:
+            with self._lock:
+                conn.pending.pop(request_id, None)
+
+    def send_request(self, action, data=None, timeout=None):
+        """
+        Sends a JSON command to the server and waits for a reply.
+        Example: send_request("FETCH_USERS")
+        Returns None if the request failed.
+        """
+        start = time.perf_counter()
+        future = self.submit(action, data)
+        try:
+            return future.result(timeout or self.timeout)
+        except Exception as e:
+            self._forget(future)
+            REGISTRY.inc(f"client.errors.{action}")
+            log.warning("❌ Communication Error: %s", e or type(e).__name__)
+            return None
+        finally:
+            REGISTRY.observe(f"client.{action}", time.perf_counter() - start)
 
-            # 4. Receive Response Header
-            resp_header = self.sock.recv(4)
-            if not resp_header:
-                return None
+    def send_batch(self, requests, timeout=None):
+        """
+        Sends several actions in one frame.
+        'requests' is a list of (action, data) pairs; returns the list of replies
+        in the same order, or None if the batch failed.
+        """
+        sub_requests = []
+        for action, data in requests:
+            req = {"action": action}
+            if data:
+                req.update(data)
+            sub_requests.append(req)
 
-            resp_length = struct.unpack('I', resp_header)[0]
+        response = self.send_request("BATCH", {"requests": sub_requests}, timeout)
+        if response and response.get("status") == "SUCCESS":
+            return response["responses"]
+        return None
 
-            # 5. Receive Response Body (in chunks if large)
-            resp_data = b""
-            while len(resp_data) < resp_length:
-                chunk = self.sock.recv(4096)
-                if not chunk: break
-                resp_data += chunk
+    def fetch_users_stream(self, page_size=500, precision=None):
+        """
+        Downloads the gallery page by page.
+        Yields every page reply as it arrives; the last one has "more": False
+        and carries the gallery "version". Each page can be used right away.
+        'precision' (float32 / float16 / int8) asks for packed rows.
+        """
+        pages = queue.Queue()
+        data = {"page_size": page_size}
+        if precision:
+            data["precision"] = precision
+        try:
+            conn, request_id = self._submit("FETCH_USERS", data, pages)
+        except Exception as e:
+            log.warning("❌ Communication Error: %s", e)
+            return
 
-            # 6. Decode
-            return json.loads(resp_data.decode('utf-8'))
+        try:
+            while True:
+                page = pages.get(timeout=self.timeout)
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+                if page.get("status") != "SUCCESS" or not page.get("more", False):
+                    break
 
         except Exception as e:
-            print(f"❌ Communication Error: {e}")
-            self.close()
-            return None
+            log.warning("❌ Communication Error: %s", e or type(e).__name__)
+        finally:
+            with self._lock:
+                conn.pending.pop(request_id, None)
 
     def close(self):
-        if self.sock:
-            self.sock.close()
\ No newline at end of file
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn:
+            conn.closed = True
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)  # Wakes up the reader thread
+            except OSError:
+                pass
+            conn.sock.close()
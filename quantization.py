@@ -0,0 +1,87 @@
+import base64
+
+import numpy as np
+
+# How a gallery can be held in memory, on disk and on the wire:
+#   float32 - 4 bytes per value, exact
+#   float16 - 2 bytes per value, ~3 significant digits (plenty for 0.6 thresholds)
+#   int8    - 1 byte per value, one float32 scale per dimension
+PRECISIONS = ("float32", "float16", "int8")
+CODE_DTYPES = {"float32": np.dtype('<f4'), "float16": np.dtype('<f2'), "int8": np.dtype('i1')}
+INT8_MAX = 127
+SCALE_HEADROOM = 1.25  # int8: room for later users before the scale has to be re-fitted
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    return precision
+
+
+def fit_scale(matrix, headroom=1.0):
+    """int8: per-dimension step so the largest |value| of every dimension maps to 127."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    peak = np.abs(matrix).max(axis=0) if len(matrix) else np.zeros(matrix.shape[-1], dtype=np.float32)
+    return (np.maximum(peak, 1e-6) * headroom / INT8_MAX).astype(np.float32)
+
+
+def quantize(matrix, precision, scale=None):
+    """
+    float rows -> (codes, scale). 'scale' is only used (and returned) for
+    int8; pass the gallery's scale to add rows to an existing gallery.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if precision != "int8":
+        return matrix.astype(CODE_DTYPES[check_precision(precision)]), None
+    if scale is None:
+        scale = fit_scale(matrix)
+    codes = np.rint(matrix / scale)
+    np.clip(codes, -INT8_MAX, INT8_MAX, out=codes)
+    return codes.astype(np.int8), scale
+
+
+def dequantize(codes, precision, scale=None):
+    """codes -> float32 rows (a new array)."""
+    rows = np.asarray(codes).astype(np.float32)
+    if precision == "int8":
+        rows *= scale
+    return rows
+
+
+def pack_rows(names, matrix, precision):
+    """
+    Gallery rows in the compact FETCH_USERS wire format: the names plus all
+    codes as one base64 string, instead of one JSON number per value.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)  # N x dim, one row per name
+    codes, scale = quantize(matrix, precision)
+    return {
+        "precision": precision,
+        "dim": int(matrix.shape[1]),
+        "names": list(names),
+        "rows": base64.b64encode(np.ascontiguousarray(codes).tobytes()).decode('ascii'),
+        "scale": None if scale is None else base64.b64encode(scale.astype('<f4').tobytes()).decode('ascii'),
+    }
+
+
+def unpack_codes(packed):
+    """
+    Inverse of pack_rows that keeps the stored codes: returns (names, N x dim
+    codes in the packed precision, scale or None). No rounding happens here.
+    """
+    precision = check_precision(packed["precision"])
+    names = packed["names"]
+    dim = int(packed["dim"])
+    codes = np.frombuffer(base64.b64decode(packed["rows"]), dtype=CODE_DTYPES[precision])
+    if codes.size != len(names) * dim:
+        raise ValueError(f"Packed gallery has {codes.size} values for {len(names)} rows of {dim}")
+    scale = None
+    if precision == "int8":
+        scale = np.frombuffer(base64.b64decode(packed["scale"]), dtype='<f4')
+    return names, codes.reshape(len(names), dim), scale
+
+
+def unpack_rows(packed):
+    """Inverse of pack_rows: returns (names, float32 matrix)."""
+    names, codes, scale = unpack_codes(packed)
+    return names, dequantize(codes, packed["precision"], scale)
@@ -0,0 +1,239 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from face_matcher import ENCODING_DIM
+from frame_pipeline import LatestQueue
+
+DEFAULT_RESIZE_FACTOR = 0.25
+MAX_FRAME_SHAPE = (1080, 1920, 3)  # Largest camera frame we expect (before downscaling)
+SLOTS_PER_WORKER = 2  # Shared-memory frame buffers per worker process
+MAX_IN_FLIGHT_PER_STREAM = 2  # Newer frames are dropped while a stream has this many queued
+
+log = logging.getLogger(__name__)
+
+# --- Worker process side ---
+
+_face_recognition = None
+_blocks = {}  # Shared memory blocks this worker already attached to, by name
+
+
+def _init_worker():
+    """Loads dlib once per worker process instead of once per frame."""
+    global _face_recognition
+    import face_recognition
+    _face_recognition = face_recognition
+
+
+def _attach(name):
+    block = _blocks.get(name)
+    if block is None:
+        # Workers share the parent's resource tracker, the parent unlinks the block on close()
+        block = shared_memory.SharedMemory(name=name)
+        _blocks[name] = block
+    return block
+
+
+def _encode_frame(block_name, shape):
+    """Runs in a worker: finds and encodes every face of the RGB image in 'block_name'."""
+    block = _attach(block_name)
+    image = np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+
+    locations = _face_recognition.face_locations(image)
+    encodings = _face_recognition.face_encodings(image, locations)
+    return locations, np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+
+
+# --- Parent process side ---
+
+class FrameSlots:
+    """
+    Fixed set of shared-memory frame buffers, reused for every frame.
+    Frames are written once here and read in place by the workers,
+    so no pixel data is pickled through the pool's pipes.
+    """
+
+    def __init__(self, count, max_shape):
+        self.max_bytes = int(np.prod(max_shape))
+        self.blocks = [shared_memory.SharedMemory(create=True, size=self.max_bytes) for _ in range(count)]
+        self._free = list(range(count))
+        self._cond = threading.Condition()
+
+    def acquire(self, blocking=True):
+        """Returns a free slot index, or None if 'blocking' is False and all are busy."""
+        with self._cond:
+            while not self._free:
+                if not blocking:
+                    return None
+                self._cond.wait()
+            return self._free.pop()
+
+    def release(self, slot):
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify()
+
+    def write(self, slot, image):
+        """Copies 'image' into the slot. Returns (block name, shape) for the worker."""
+        if image.nbytes > self.max_bytes:
+            raise ValueError(f"Frame of {image.nbytes} bytes doesn't fit a {self.max_bytes} byte slot")
+        block = self.blocks[slot]
+        np.ndarray(image.shape, dtype=np.uint8, buffer=block.buf)[...] = image
+        return block.name, image.shape
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+class RecognitionService:
+    """
+    Face recognition for several cameras on a pool of worker processes.
+    dlib detection/encoding is CPU-bound and holds the GIL, so each frame
+    is handed to a separate process through shared memory; matching
+    against the gallery stays here (one cheap matrix product).
+    Results are routed back to the stream the frame came from.
+    """
+
+    def __init__(self, matcher, workers=None, resize_factor=DEFAULT_RESIZE_FACTOR, max_frame_shape=MAX_FRAME_SHAPE,
+                 max_in_flight=MAX_IN_FLIGHT_PER_STREAM):
+        self.matcher = matcher  # FaceMatcher (or RemoteMatcher) used for the 1:N search
+        self.workers = workers or os.cpu_count() or 1
+        self.resize_factor = resize_factor
+        self.max_in_flight = max_in_flight
+
+        small_shape = (int(max_frame_shape[0] * resize_factor) + 1, int(max_frame_shape[1] * resize_factor) + 1, 3)
+        self.slots = FrameSlots(self.workers * SLOTS_PER_WORKER, small_shape)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        # Matching (a network round trip with a RemoteMatcher) and the result callbacks run here,
+        # never on the pool's management thread, which collects the results of every worker
+        self.matching = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recognition-match")
+
+        self.streams = {}  # stream_id -> _Stream
+        self.running = True
+
+    def submit(self, frame, blocking=True):
+        """
+        Queues one BGR frame for recognition.
+        Returns a Future resolving to [(name, location), ...] in frame
+        coordinates, or None if 'blocking' is False and no slot is free.
+        """
+        small = cv2.resize(frame, (0, 0), fx=self.resize_factor, fy=self.resize_factor)
+        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+        slot = self.slots.acquire(blocking)
+        if slot is None:
+            return None
+
+        result = Future()
+        try:
+            block_name, shape = self.slots.write(slot, rgb_small)
+            job = self.pool.submit(_encode_frame, block_name, shape)
+        except Exception as e:
+            self.slots.release(slot)
+            result.set_exception(e)
+            return result
+
+        scale_y = frame.shape[0] / small.shape[0]
+        scale_x = frame.shape[1] / small.shape[1]
+
+        def done(job):
+            self.slots.release(slot)
+            try:
+                self.matching.submit(self._match, job, result, scale_y, scale_x)
+            except RuntimeError as e:
+                result.set_exception(e)  # Closed meanwhile
+
+        job.add_done_callback(done)
+        return result
+
+    def _match(self, job, result, scale_y, scale_x):
+        """Runs on the matching thread: names the faces a worker found, in frame coordinates."""
+        try:
+            locations, encodings = job.result()
+            matches = self.matcher.match(encodings)
+            result.set_result([
+                (name, (int(round(top * scale_y)), int(round(right * scale_x)),
+                        int(round(bottom * scale_y)), int(round(left * scale_x))))
+                for (name, distance), (top, right, bottom, left) in zip(matches, locations)
+            ])
+        except Exception as e:
+            result.set_exception(e)
+
+    def identify(self, frame):
+        """Same interface as FaceAuthenticator.identify, for single-camera use."""
+        return self.submit(frame).result()
+
+    def add_stream(self, stream_id, camera, on_results=None):
+        """
+        Starts feeding 'camera' (anything with get_frame()) into the pool.
+        Every result is put in the stream's LatestQueue (see results())
+        and passed to on_results(stream_id, frame, results) if given.
+        """
+        stream = _Stream(stream_id, camera, on_results)
+        self.streams[stream_id] = stream
+        stream.thread = threading.Thread(target=self._feed, args=(stream,), name=f"camera-{stream_id}", daemon=True)
+        stream.thread.start()
+        return stream
+
+    def results(self, stream_id, timeout=None):
+        """Newest (frame, results) of one stream, or None."""
+        return self.streams[stream_id].results.get(timeout)
+
+    def _feed(self, stream):
+        while self.running:
+            ret, frame = stream.camera.get_frame()
+            if not ret:
+                break
+
+            with stream.lock:
+                if stream.in_flight >= self.max_in_flight:
+                    stream.dropped += 1  # Workers are busy: skip this frame, keep the camera live
+                    continue
+                stream.in_flight += 1
+
+            future = self.submit(frame)
+            future.add_done_callback(lambda f, frame=frame: self._deliver(stream, frame, f))
+
+        stream.results.close()
+
+    def _deliver(self, stream, frame, future):
+        with stream.lock:
+            stream.in_flight -= 1
+            stream.processed += 1
+        try:
+            results = future.result()
+        except Exception as e:
+            log.error("❌ Recognition failed on stream %s: %s", stream.stream_id, e)
+            return
+
+        stream.results.put((frame, results))
+        if stream.on_results:
+            stream.on_results(stream.stream_id, frame, results)
+
+    def close(self):
+        self.running = False
+        for stream in self.streams.values():
+            stream.thread.join(timeout=2.0)
+        self.pool.shutdown(wait=True)
+        self.matching.shutdown(wait=True)  # After the pool: its last results still get matched
+        self.slots.close()
+
+
+class _Stream:
+    def __init__(self, stream_id, camera, on_results):
+        self.stream_id = stream_id
+        self.camera = camera
+        self.on_results = on_results
+        self.results = LatestQueue(maxsize=1)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.processed = 0
+        self.dropped = 0
+        self.thread = None
@@ -1,5 +1,6 @@
 import cv2
 import face_recognition
+import logging
 import time
 from database_manager import DatabaseManager
 
@@ -61,11 +62,13 @@ def register_multi_angle_user():
     # Save the LIST of faces to the database
     if len(face_gallery) > 0:
         print(f"\nSaving {len(face_gallery)} face angles for {username}...")
-        # Note: We are passing a List of Lists, which our DB Manager handles via JSON
+        # Note: We are passing a List of Lists, which our DB Manager packs into a float32 blob
         db.register_user(username, password, face_gallery)
     else:
         print("❌ No faces captured.")
 
 
 if __name__ == "__main__":
-    register_multi_angle_user()
\ No newline at end of file
+    # DatabaseManager reports through logging
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    register_multi_angle_user()
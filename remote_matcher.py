@@ -0,0 +1,29 @@
+import numpy as np
+
+
+class RemoteMatcher:
+    """
+    Drop-in replacement for FaceMatcher on thin clients.
+    Instead of holding the gallery locally, match() sends the embeddings to
+    the server's IDENTIFY action. Same return format: [(name, distance), ...].
+    """
+
+    def __init__(self, net, timeout=2.0):
+        self.net = net  # Connected NetworkClient
+        self.timeout = timeout
+
+    def match(self, queries):
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.size == 0:
+            return []
+        queries = queries.reshape(len(queries), -1)
+
+        response = self.net.send_request("IDENTIFY", {"embeddings": queries.tolist()}, timeout=self.timeout)
+        if not response or response.get("status") != "SUCCESS":
+            # Server unreachable: treat everyone as unknown rather than guessing
+            return [("Unknown", float("inf"))] * len(queries)
+
+        return [
+            (m["name"], float("inf") if m["distance"] is None else m["distance"])
+            for m in response["matches"]
+        ]
@@ -0,0 +1,272 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+import uuid
+
+from activity_log import BatchBuffer
+
+WARN_BEFORE = 60  # Seconds before expiry when connected clients get a RENTAL_EXPIRING notice
+MAX_RENTAL_SECONDS = 7 * 24 * 3600
+
+log = logging.getLogger(__name__)
+
+
+class RentalSession:
+    """One user's rental: who, since when, until when."""
+
+    def __init__(self, username, expires_at, client=None, session_id=None, started_at=None):
+        self.session_id = session_id or str(uuid.uuid4())
+        self.username = username
+        self.client = client
+        self.started_at = started_at or time.time()
+        self.expires_at = expires_at
+        self.ended_at = None
+        self.status = "ACTIVE"  # ACTIVE, ENDED or EXPIRED
+
+    def time_left(self, now=None):
+        return max(0, math.ceil(self.expires_at - (now or time.time())))
+
+    def to_row(self):
+        return {
+            "session_id": self.session_id,
+            "username": self.username,
+            "client": self.client,
+            "started_at": self.started_at,
+            "expires_at": self.expires_at,
+            "ended_at": self.ended_at,
+            "status": self.status,
+        }
+
+
+class SessionWriter(BatchBuffer):
+    """Write-behind persistence: session changes are upserted in batches."""
+
+    def __init__(self, db, **kwargs):
+        kwargs.setdefault("name", "rental_sessions")
+        self.db = db
+        super().__init__(**kwargs)
+
+    def write(self, batch):
+        return self.db.save_rental_sessions(batch)
+
+
+class RentalEngine:
+    """
+    Active rentals kept in memory:
+      - a dict by username, so CHECK_RENTAL is one lookup (no DB hit)
+      - a heap by deadline, so one timer thread fires warnings and expiries
+    Every change is persisted to MySQL in the background (SessionWriter).
+    on_event(kind, session) is called with "RENTAL_STARTED", "RENTAL_EXTENDED",
+    "RENTAL_EXPIRING", "RENTAL_EXPIRED" or "RENTAL_ENDED".
+    """
+
+    def __init__(self, db, on_event=None, warn_before=WARN_BEFORE):
+        self.db = db
+        self.on_event = on_event
+        self.warn_before = warn_before
+
+        self._by_user = {}  # username -> active RentalSession
+        self._heap = []  # (when, seq, kind, session) - stale entries are skipped when popped
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.writer = SessionWriter(db)
+
+        self._load()
+        self._timer = threading.Thread(target=self._run, name="rental-expiry", daemon=True)
+        self._timer.start()
+
+    def _load(self):
+        """Restores the sessions that were still active when the server stopped."""
+        rows = self.db.load_active_rental_sessions()
+        with self._cond:
+            for row in rows:
+                session = RentalSession(row["username"], row["expires_at"], row.get("client"),
+                                        row["session_id"], row["started_at"])
+                self._by_user[session.username] = session
+                self._schedule(session)
+        if self._by_user:
+            log.info("⏱️  Restored %s active rentals", len(self._by_user))
+
+    def _schedule(self, session):
+        """Queues the warning and expiry of 'session' (caller holds the lock)."""
+        warn_at = session.expires_at - self.warn_before
+        if warn_at > time.time():
+            heapq.heappush(self._heap, (warn_at, next(self._seq), "RENTAL_EXPIRING", session))
+        heapq.heappush(self._heap, (session.expires_at, next(self._seq), "RENTAL_EXPIRED", session))
+        self._cond.notify()
+
+    def _emit(self, kind, session):
+        if self.on_event:
+            try:
+                self.on_event(kind, session)
+            except Exception as e:
+                log.error("❌ Rental event handler failed: %s", e)
+
+    def start(self, username, seconds, client=None):
+        """Starts (or replaces) a rental for 'username'. Returns the session."""
+        seconds = min(max(1, int(seconds)), MAX_RENTAL_SECONDS)
+        with self._cond:
+            old = self._by_user.get(username)
+            if old is not None:
+                self._finish(old, "ENDED")
+            session = RentalSession(username, time.time() + seconds, client)
+            self._by_user[username] = session
+            self._schedule(session)
+        # The replaced session is saved as ENDED too, or a restart would restore it
+        self.writer.extend([row.to_row() for row in (old, session) if row is not None])
+        self._emit("RENTAL_STARTED", session)
+        return session
+
+    def extend(self, username, seconds):
+        """Adds time to an active rental. Returns the session, or None if there is none."""
+        with self._cond:
+            session = self._by_user.get(username)
+            if session is None:
+                return None
+            expires_at = min(session.expires_at + max(0, int(seconds)), session.started_at + MAX_RENTAL_SECONDS)
+            if expires_at != session.expires_at:
+                session.expires_at = expires_at
+                self._schedule(session)  # The old heap entries no longer match and are skipped
+        self.writer.extend([session.to_row()])
+        self._emit("RENTAL_EXTENDED", session)
+        return session
+
+    def end(self, username):
+        """Ends a rental early. Returns the session, or None if there was none."""
+        with self._cond:
+            session = self._by_user.get(username)
+            if session is None:
+                return None
+            self._finish(session, "ENDED")
+        self.writer.extend([session.to_row()])
+        self._emit("RENTAL_ENDED", session)
+        return session
+
+    def _finish(self, session, status):
+        session.status = status
+        session.ended_at = time.time()
+        if self._by_user.get(session.username) is session:
+            del self._by_user[session.username]
+
+    def check(self, username):
+        """CHECK_RENTAL: O(1), straight from memory."""
+        session = self._by_user.get(username)
+        now = time.time()
+        if session is None or session.expires_at <= now:
+            return {"rented": False, "time_left": 0}
+        return {"rented": True, "time_left": session.time_left(now), "expires_at": session.expires_at}
+
+    def active_count(self):
+        return len(self._by_user)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Sleep until the earliest deadline (or until something new is scheduled)
+                while not self._closed and (not self._heap or self._heap[0][0] > time.time()):
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+
+                when, _, kind, session = heapq.heappop(self._heap)
+                if session.status != "ACTIVE" or when != self._deadline(kind, session):
+                    continue  # Ended, replaced or extended meanwhile
+                if kind == "RENTAL_EXPIRED":
+                    self._finish(session, "EXPIRED")
+
+            if kind == "RENTAL_EXPIRED":
+                self.writer.extend([session.to_row()])
+            self._emit(kind, session)
+
+    def _deadline(self, kind, session):
+        if kind == "RENTAL_EXPIRED":
+            return session.expires_at
+        return session.expires_at - self.warn_before
+
+    def close(self, timeout=5.0):
+        """Stops the expiry thread and writes the session changes that are still buffered."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._timer.join(timeout)
+        self.writer.close(timeout)
+
+
+class RentalWatcher:
+    """
+    Client side: knows whether the logged-in user's rental is still running.
+    One CHECK_RENTAL when a user logs in subscribes this connection; after
+    that the server pushes RENTAL_* notices, nothing is polled.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        self.username = None
+        self._expires = {}  # username -> time.monotonic() deadline, or None when not rented
+        self._lock = threading.Lock()
+        net.on_push(self.on_notice)
+        net.on_connect(self._resubscribe)  # Subscriptions don't survive a reconnect
+
+    def watch(self, username):
+        """Starts following 'username' (non-blocking, the answer arrives in the background)."""
+        self.username = username
+        if username is None:
+            return
+        future = self.net.submit("CHECK_RENTAL", {"username": username})
+        future.add_done_callback(self._on_reply)
+
+    def _resubscribe(self):
+        if self.username is not None:
+            self.watch(self.username)
+
+    def _on_reply(self, future):
+        try:
+            reply = future.result()
+        except Exception as e:
+            log.error("❌ Rental check failed: %s", e)
+            return
+        if reply.get("status") == "SUCCESS":
+            self._update(reply)
+
+    def _update(self, notice):
+        username = notice.get("username")
+        if username is None:
+            return
+        with self._lock:
+            if notice.get("rented"):
+                self._expires[username] = time.monotonic() + notice.get("time_left", 0)
+            else:
+                self._expires[username] = None
+
+    def on_notice(self, notice):
+        """Push handler (runs on the network reader thread)."""
+        event = notice.get("event")
+        if not event or not event.startswith("RENTAL_"):
+            return
+        self._update(notice)
+        if event == "RENTAL_EXTENDED":
+            log.info("⏱️  Rental of %s extended, %ss left", notice.get('username'), notice.get('time_left'))
+        elif event == "RENTAL_EXPIRING":
+            log.info("⏱️  Rental of %s ends in %ss", notice.get('username'), notice.get('time_left'))
+        elif event in ("RENTAL_EXPIRED", "RENTAL_ENDED"):
+            log.info("⏱️  Rental of %s is over", notice.get('username'))
+
+    def is_rented(self, username):
+        """False only once the server said so; unknown users get the benefit of the doubt."""
+        with self._lock:
+            if username not in self._expires:
+                return True
+            deadline = self._expires[username]
+        # The local deadline also covers a notice lost while reconnecting
+        return deadline is not None and deadline > time.monotonic()
+
+    def time_left(self, username):
+        """Seconds left for 'username', or None if unknown / not rented."""
+        with self._lock:
+            deadline = self._expires.get(username)
+        return None if deadline is None else max(0, int(deadline - time.monotonic()))
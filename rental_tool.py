@@ -0,0 +1,55 @@
+import argparse
+import logging
+
+from network_client import NetworkClient
+
+
+def format_rental(response):
+    if not response.get("rented"):
+        return f"{response.get('username')}: no active rental"
+    minutes, seconds = divmod(response.get("time_left", 0), 60)
+    return f"{response.get('username')}: rented, {minutes}m {seconds:02d}s left"
+
+
+def rental_tool():
+    """
+    Front desk tool: starts, extends, ends or checks a user's rental on the
+    server. Clients with RENTAL_ENFORCEMENT on only unlock for rented users.
+    """
+    parser = argparse.ArgumentParser(description="Start, extend, end or check a rental")
+    parser.add_argument("action", choices=("start", "extend", "end", "check"))
+    parser.add_argument("username")
+    parser.add_argument("minutes", type=float, nargs="?", help="Rental length (start) or extra time (extend)")
+    parser.add_argument("--server", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.action in ("start", "extend") and not (args.minutes and args.minutes > 0):
+        parser.error(f"'{args.action}' needs a positive number of minutes")
+
+    net = NetworkClient(server_ip=args.server, server_port=args.port, auto_reconnect=False)
+    if not net.connect():
+        raise SystemExit(1)
+
+    try:
+        data = {"username": args.username}
+        if args.action == "check":
+            data["watch"] = False  # Just asking, don't subscribe to its notices
+        if args.minutes:
+            data["seconds"] = int(args.minutes * 60)
+        action = "CHECK_RENTAL" if args.action == "check" else f"{args.action.upper()}_RENTAL"
+
+        response = net.send_request(action, data)
+        if response is None:
+            raise SystemExit(1)
+        if response.get("status") != "SUCCESS":
+            print(f"❌ {response.get('message')}")
+            raise SystemExit(1)
+        print(f"✅ {format_rental(response)}")
+    finally:
+        net.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    rental_tool()
@@ -1,97 +1,526 @@
+import argparse
+import json
+import logging
+import math
+import queue
 import socket
 import threading
-import json
-import struct
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import numpy as np
 from database_manager import DatabaseManager
+from gallery_cache import GalleryCache, encode_rows
+from identify_batcher import IdentifyBatcher
+from framing import (CachedPayload, FrameReader, PROTOCOL_VERSION, SUPPORTED_COMPRESSION,
+                     decode_json, encode_payload, send_frame)
+from metrics import REGISTRY
+from activity_log import ActivityLogWriter, MAX_ACTION_LENGTH
+from rental_sessions import RentalEngine
+from quantization import PRECISIONS
 
 # Configuration
 SERVER_IP = "0.0.0.0"  # Listen on all available network interfaces
 SERVER_PORT = 5000  # The port we open for clients
+LISTEN_BACKLOG = 128  # Pending connections the OS queues for us
+GALLERY_CHECK_INTERVAL = 2.0  # Seconds between gallery version checks
+MAX_REQUEST_SIZE = 8 * 1024 * 1024  # Bigger frames mean a broken/hostile client
+MAX_PAGE_SIZE = 5000  # Users per FETCH_USERS page when a client asks for streaming
+MAX_BATCH_SIZE = 256  # Actions allowed in one BATCH frame
+IDENTIFY_TIMEOUT = 5.0  # Seconds an IDENTIFY may wait for its batch
+MAX_EVENTS_PER_REQUEST = 1000  # LOG_EVENTS batch limit
+MAX_QUEUED_PUSHES = 64  # Rental notices waiting for a client that stopped reading before it is unsubscribed
+AUDIT_REQUESTS = False  # Also write every request (action + client) to activity_logs
+# Actions that get their own metrics (anything else is counted as UNKNOWN)
+KNOWN_ACTIONS = ("HELLO", "BATCH", "FETCH_USERS", "IDENTIFY", "CHECK_RENTAL", "START_RENTAL", "EXTEND_RENTAL",
+                 "END_RENTAL", "STATS", "LOG_EVENTS")
+
+log = logging.getLogger("server")
+
+
+def record_request(action, seconds):
+    """Per-action request count + latency histogram."""
+    action = action if action in KNOWN_ACTIONS else "UNKNOWN"
+    REGISTRY.inc(f"requests.{action}")
+    REGISTRY.observe(f"request.{action}", seconds)
+
+
+class ClientSession:
+    """Per-connection state, e.g. what was negotiated in HELLO."""
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.compression = None  # "zlib" once the client asked for it
+        self.push = None  # push(dict): sends a server-initiated frame (request id 0), set by the server
+        self.send_lock = threading.Lock()  # Replies and pushes come from different threads
+        self.watching = set()  # Usernames whose rental notices this connection gets
+
+
+class PushQueue:
+    """
+    Threaded server: rental notices for one connection are sent by a thread
+    of its own (started on the first notice), so the expiry thread only
+    queues them and never blocks on a slow client's socket.
+    """
+
+    def __init__(self, send, name, maxsize=MAX_QUEUED_PUSHES):
+        self.send = send  # send(notice) -> False once the connection is broken
+        self.name = name
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, notice):
+        """Queues a notice. Raises queue.Full when the client isn't keeping up."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        self._queue.put_nowait(notice)
+
+    def _run(self):
+        while True:
+            notice = self._queue.get()
+            if notice is None or not self.send(notice):
+                return
+
+    def close(self):
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass  # The sender is stuck on the socket, closing it ends the thread
+
+
+class StreamedResponse:
+    """
+    A reply that goes out as several frames (e.g. a paginated FETCH_USERS).
+    'parts' is an iterator of response dicts; the last one has "more": False.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self._iter = None
+        # The asyncio server pulls parts and closes on any worker thread: never both at once
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def next_part(self):
+        """The next part, or None when there are no more (callable from any thread)."""
+        with self._lock:
+            if self._iter is None:
+                self._iter = iter(self.parts)
+            return next(self._iter, None)
+
+    def close(self):
+        """Stops the producer early (e.g. the client disconnected)."""
+        with self._lock:
+            close = getattr(self.parts, "close", None)
+            if close:
+                close()
 
 
 class RentalServer:
-    def __init__(self):
-        self.db = DatabaseManager()  # The server owns the DB connection now
+    def __init__(self, host=SERVER_IP, port=SERVER_PORT, backlog=LISTEN_BACKLOG, db=None):
+        self.db = db or DatabaseManager()  # The server owns the DB connection now
+        # FETCH_USERS is served from memory until a user is registered/deleted
+        self.gallery = GalleryCache(self.db, check_interval=GALLERY_CHECK_INTERVAL)
+        # IDENTIFY requests from all clients are matched together in small batches
+        self.identifier = IdentifyBatcher(self.gallery)
+        # Audit events are buffered and written in multi-row INSERTs by a background thread
+        self.activity_log = ActivityLogWriter(self.db)
+        # Active rentals live in memory (CHECK_RENTAL never hits the DB), expiries are pushed
+        self.watchers = {}  # username -> set of ClientSessions that get its rental notices
+        self._watch_lock = threading.Lock()
+        self.rentals = RentalEngine(self.db, on_event=self.notify_rental)
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.server_socket = None
+
+    def listen(self):
+        """Opens the listening socket (threaded mode)."""
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((SERVER_IP, SERVER_PORT))
-        self.server_socket.listen(5)  # Allow up to 5 pending connections
-        print(f"✅ SERVER STARTED on {SERVER_IP}:{SERVER_PORT}")
-        print("Waiting for clients...")
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.backlog)
+        log.info("✅ SERVER STARTED on %s:%s", self.host, self.port)
+        log.info("Waiting for clients...")
 
-    def send_json(self, client_socket, data):
+    def send_json(self, client_socket, data, session=None, request_id=0):
         """
-        Helper to send JSON data reliably.
-        We prefix the message with its length (4 bytes) so the client knows how much to read.
+        Helper to send JSON data reliably (one frame, see framing.py).
+        'data' is a dict, bytes or a CachedPayload (e.g. the cached FETCH_USERS reply).
+        It is compressed if the client negotiated compression, and tagged with
+        the id of the request it answers. Returns False on failure.
         """
         try:
-            message = json.dumps(data).encode('utf-8')
-            # 'I' = unsigned int (4 bytes) representing the length
-            header = struct.pack('I', len(message))
-            client_socket.sendall(header + message)
+            if session is None:
+                payload, flags = encode_payload(data)
+                send_frame(client_socket, payload, flags, request_id)
+                return True
+            payload, flags = encode_payload(data, session.compression)
+            with session.send_lock:
+                send_frame(client_socket, payload, flags, request_id)
+            return True
         except Exception as e:
-            print(f"❌ Send Error: {e}")
+            log.error("❌ Send Error: %s", e)
+            return False
 
-    def handle_client(self, client_socket, addr):
+    def hello(self, request, session):
+        """HELLO: negotiates per-connection options (currently compression)."""
+        offered = request.get("compression") or []
+        session.compression = next((c for c in offered if c in SUPPORTED_COMPRESSION), None)
+        return {"status": "SUCCESS", "protocol": PROTOCOL_VERSION, "compression": session.compression}
+
+    def stream_users(self, page_size, precision=None):
+        """Paginated FETCH_USERS: one frame per page, each page read with its own DB query."""
+        # Read the version first: pages may include newer users, never miss older ones
+        version = self.db.get_gallery_version()
+        page_number = 0
+        dim = None
+        try:
+            for names, matrix in self.db.iter_gallery(batch_size=page_size):
+                dim = matrix.shape[1]
+                yield {"status": "SUCCESS", "page": page_number, "more": True,
+                       **encode_rows(names, matrix, precision)}
+                page_number += 1
+        except Exception as e:
+            log.error("❌ Error streaming users: %s", e)
+            yield {"status": "ERROR", "message": "Streaming failed", "more": False}
+            return
+        empty = np.empty((0, dim or 0), dtype=np.float32)
+        yield {"status": "SUCCESS", "page": page_number, "more": False, "full": True, "version": version,
+               **encode_rows([], empty, precision)}
+
+    def start_identify(self, request):
         """
-        This runs in a separate thread for EACH connected computer.
+        IDENTIFY, first half: queues the request's embeddings with the batcher.
+        Returns a Future of the matches, or an error reply for bad input.
         """
-        print(f"🔗 New Connection from: {addr}")
+        try:
+            return self.identifier.submit(request.get("embeddings"))
+        except (ValueError, TypeError) as e:
+            return {"status": "ERROR", "message": f"Bad embeddings: {e}"}
 
+    def identify_response(self, matches):
+        """IDENTIFY, second half: turns [(name, distance), ...] into the reply."""
+        return {
+            "status": "SUCCESS",
+            "matches": [
+                {"name": name, "distance": distance if math.isfinite(distance) else None}
+                for name, distance in matches
+            ],
+        }
+
+    def log_events(self, request, session):
+        """LOG_EVENTS: queues a client's batch of audit events for the background writer."""
+        events = request.get("events")
+        if not isinstance(events, list) or len(events) > MAX_EVENTS_PER_REQUEST:
+            return {"status": "ERROR", "message": f"LOG_EVENTS needs a list of at most {MAX_EVENTS_PER_REQUEST} events"}
+
+        client = str(session.addr[0]) if session.addr else None
+        now = time.time()
+        queued = []
+        for event in events:
+            if not isinstance(event, dict) or not isinstance(event.get("action"), str):
+                continue
+            username = event.get("username")
+            timestamp = event.get("ts")
+            if not isinstance(timestamp, (int, float)) or not 0 < timestamp <= now + 300:
+                timestamp = now  # Missing or absurd client clock
+            queued.append({
+                "username": username[:50] if isinstance(username, str) else None,
+                "action": event["action"][:MAX_ACTION_LENGTH],
+                "ts": timestamp,
+                "client": client,
+            })
+
+        accepted = self.activity_log.extend(queued)
+        return {"status": "SUCCESS", "accepted": accepted, "rejected": len(events) - accepted}
+
+    def watch(self, session, username):
+        """'session' will get pushed notices about the rental of 'username'."""
+        if session.push is None:
+            return
+        with self._watch_lock:
+            self.watchers.setdefault(username, set()).add(session)
+            session.watching.add(username)
+
+    def unwatch_all(self, session):
+        """Called when a connection closes."""
+        with self._watch_lock:
+            for username in session.watching:
+                sessions = self.watchers.get(username)
+                if sessions:
+                    sessions.discard(session)
+                    if not sessions:
+                        del self.watchers[username]
+            session.watching.clear()
+
+    def notify_rental(self, kind, rental):
+        """RentalEngine callback: pushes the event to every connection watching that user."""
+        with self._watch_lock:
+            sessions = list(self.watchers.get(rental.username, ()))
+        if not sessions:
+            return
+        notice = {
+            "status": "SUCCESS",
+            "event": kind,
+            "username": rental.username,
+            "rented": rental.status == "ACTIVE",
+            "time_left": rental.time_left() if rental.status == "ACTIVE" else 0,
+        }
+        log.debug("📣 %s for %s -> %s clients", kind, rental.username, len(sessions))
+        for session in sessions:
+            try:
+                session.push(notice)
+            except Exception as e:
+                # Closing, or not reading its notices: stop queueing more for it
+                log.warning("⚠ Could not push %s to %s (%s), unsubscribing it", kind, session.addr,
+                            str(e) or type(e).__name__)
+                self.unwatch_all(session)
+
+    def _rental_username(self, request):
+        # Older clients sent the field as "user_id"
+        username = request.get("username", request.get("user_id"))
+        return username if isinstance(username, str) and 0 < len(username) <= 50 else None
+
+    def check_rental(self, request, session):
+        """
+        CHECK_RENTAL: answered from memory. Unless "watch" is False the
+        connection is also subscribed, so it is told when the rental changes
+        or expires instead of having to poll.
+        """
+        username = self._rental_username(request)
+        if username is None:
+            return {"status": "ERROR", "message": "CHECK_RENTAL needs a username"}
+        if request.get("watch", True):
+            self.watch(session, username)
+        return {"status": "SUCCESS", "username": username, **self.rentals.check(username)}
+
+    def change_rental(self, action, request, session):
+        """START_RENTAL / EXTEND_RENTAL (with "seconds") and END_RENTAL."""
+        username = self._rental_username(request)
+        if username is None:
+            return {"status": "ERROR", "message": f"{action} needs a username"}
+
+        if action == "END_RENTAL":
+            rental = self.rentals.end(username)
+        else:
+            seconds = request.get("seconds")
+            if not isinstance(seconds, (int, float)) or seconds <= 0:
+                return {"status": "ERROR", "message": f"{action} needs a positive number of seconds"}
+            if action == "START_RENTAL":
+                client = str(session.addr[0]) if session.addr else None
+                rental = self.rentals.start(username, seconds, client)
+            else:
+                rental = self.rentals.extend(username, seconds)
+
+        if rental is None:
+            return {"status": "ERROR", "message": f"No active rental for {username}"}
+        self.activity_log.log(username, action)
+        return {"status": "SUCCESS", "username": username, **self.rentals.check(username)}
+
+    def stats(self):
+        """STATS: request / DB / identify metrics of this server process."""
+        snapshot = self.gallery.get()
+        return {
+            "status": "SUCCESS",
+            "metrics": REGISTRY.snapshot(),
+            "db_pool": self.db.pool_stats(),
+            "gallery": {"version": snapshot.version, "entries": len(snapshot.names)},
+            "activity_log": {"buffered": len(self.activity_log), "dropped": self.activity_log.dropped},
+            "rentals": {"active": self.rentals.active_count(), "watched_users": len(self.watchers),
+                        "unsaved": len(self.rentals.writer)},
+        }
+
+    def batch(self, request, session):
+        """BATCH: runs several actions sent in one frame and returns all replies at once."""
+        sub_requests = request.get("requests")
+        if not isinstance(sub_requests, list) or len(sub_requests) > MAX_BATCH_SIZE:
+            return {"status": "ERROR", "message": f"BATCH needs a list of at most {MAX_BATCH_SIZE} requests"}
+
+        responses = []
+        for sub_request in sub_requests:
+            if not isinstance(sub_request, dict) or sub_request.get("action") == "BATCH":
+                responses.append({"status": "ERROR", "message": "Invalid request in BATCH"})
+                continue
+
+            response = self.process_request(sub_request, session)
+            if isinstance(response, StreamedResponse):
+                response.close()
+                response = {"status": "ERROR", "message": "Paginated requests can't be batched"}
+            elif isinstance(response, CachedPayload):
+                response = json.loads(response.raw)
+            responses.append(response)
+
+        return {"status": "SUCCESS", "responses": responses}
+
+    def process_request(self, request, session=None):
+        """
+        Routes one decoded request to its handler and returns the response
+        (a dict, an encoded payload, or a StreamedResponse).
+        Shared by the threaded and the asyncio server (may block on the DB).
+        """
+        start = time.perf_counter()
+        if AUDIT_REQUESTS and session and session.addr:
+            self.activity_log.log(None, f"REQUEST {request.get('action')}", client=str(session.addr[0]))
         try:
-            while True:
-                # 1. Read the header (4 bytes) to get message length
-                header = client_socket.recv(4)
-                if not header: break  # Client disconnected
+            return self._route(request, session)
+        finally:
+            record_request(request.get("action"), time.perf_counter() - start)
 
-                msg_length = struct.unpack('I', header)[0]
+    def _route(self, request, session):
+        action = request.get("action")
+        session = session or ClientSession(None)
+        response = {"status": "ERROR", "message": "Unknown Action"}
 
-                # 2. Read the actual message based on length
-                data = b""
-                while len(data) < msg_length:
-                    packet = client_socket.recv(4096)
-                    if not packet: break
-                    data += packet
+        # --- ROUTING LOGIC ---
+        if action == "HELLO":
+            response = self.hello(request, session)
 
-                if not data: break
+        elif action == "BATCH":
+            response = self.batch(request, session)
 
-                # 3. Process the Request
-                request = json.loads(data.decode('utf-8'))
-                action = request.get("action")
-                print(f"📩 Request from {addr}: {action}")
+        elif action == "FETCH_USERS":
+            since_version = request.get("since_version")
+            page_size = request.get("page_size")
+            # "precision": float32 / float16 / int8 packed rows instead of JSON numbers
+            precision = request.get("precision")
+            if precision is not None and precision not in PRECISIONS:
+                response = {"status": "ERROR", "message": f"Unknown precision, expected one of {PRECISIONS}"}
+            elif isinstance(page_size, int) and page_size > 0 and not isinstance(since_version, int):
+                # Client wants the gallery in pages: memory stays bounded by one page
+                response = StreamedResponse(self.stream_users(min(page_size, MAX_PAGE_SIZE), precision))
+            elif isinstance(since_version, int):
+                # Client has a local copy: only send what changed since then
+                response = self.gallery.get_delta(since_version, precision)
+            else:
+                # Pre-serialized reply, shared by every client until the gallery changes
+                response = self.gallery.get().full_payload(precision)
+
+        elif action == "IDENTIFY":
+            pending = self.start_identify(request)
+            if isinstance(pending, dict):
+                response = pending
+            else:
+                try:
+                    response = self.identify_response(pending.result(timeout=IDENTIFY_TIMEOUT))
+                except FutureTimeoutError:
+                    response = {"status": "ERROR", "message": "IDENTIFY timed out"}
+                except Exception as e:
+                    log.warning("⚠ IDENTIFY failed: %s", e)
+                    response = {"status": "ERROR", "message": "IDENTIFY failed"}
+
+        elif action == "STATS":
+            response = self.stats()
+
+        elif action == "LOG_EVENTS":
+            response = self.log_events(request, session)
+
+        elif action == "CHECK_RENTAL":
+            response = self.check_rental(request, session)
 
-                response = {"status": "ERROR", "message": "Unknown Action"}
+        elif action in ("START_RENTAL", "EXTEND_RENTAL", "END_RENTAL"):
+            response = self.change_rental(action, request, session)
 
-                # --- ROUTING LOGIC ---
-                if action == "FETCH_USERS":
-                    users = self.db.get_all_users()
-                    response = {"status": "SUCCESS", "users": users}
+        return response
 
-                elif action == "CHECK_RENTAL":
-                    # Placeholder for future logic
-                    user_id = request.get("user_id")
-                    response = {"status": "SUCCESS", "rented": True, "time_left": 60}
+    def handle_client(self, client_socket, addr):
+        """
+        This runs in a separate thread for EACH connected computer.
+        """
+        log.info("🔗 New Connection from: %s", addr)
+        reader = FrameReader(client_socket, max_frame_size=MAX_REQUEST_SIZE)
+        session = ClientSession(addr)
+        # Rental notices arrive from the expiry thread and are sent by this connection's
+        # push thread (send_json serializes them with the replies)
+        pushes = PushQueue(lambda notice: self.send_json(client_socket, notice, session, 0), f"push-{addr}")
+        session.push = pushes.put
+
+        try:
+            while True:
+                # 1. Read one frame (header + payload) into the reusable buffer
+                frame = reader.read_frame()
+                if frame is None: break  # Client disconnected
+
+                # 2. Decode the payload straight from the buffer
+                flags, request_id, payload = frame
+                request = decode_json(payload, flags, MAX_REQUEST_SIZE)
+
+                # 3. Process the Request
+                log.debug("📩 Request from %s: %s", addr, request.get('action'))
+                response = self.process_request(request, session)
 
-                # 4. Send Response
-                self.send_json(client_socket, response)
+                # 4. Send Response (one frame, or one per page), tagged with the request id.
+                # Pipelined requests are answered in the order they arrived.
+                if isinstance(response, StreamedResponse):
+                    for part in response:
+                        if not self.send_json(client_socket, part, session, request_id):
+                            response.close()
+                            break
+                else:
+                    self.send_json(client_socket, response, session, request_id)
 
         except Exception as e:
-            print(f"⚠ Connection Error {addr}: {e}")
+            log.warning("⚠ Connection Error %s: %s", addr, e)
         finally:
-            print(f"❌ Disconnected: {addr}")
+            self.unwatch_all(session)
+            pushes.close()
+            log.info("❌ Disconnected: %s", addr)
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)  # Also wakes a push stuck in sendall
+            except OSError:
+                pass
             client_socket.close()
 
     def start(self):
-        while True:
-            client_sock, addr = self.server_socket.accept()
-            # Spin up a new thread for this client so others aren't blocked
-            client_handler = threading.Thread(
-                target=self.handle_client,
-                args=(client_sock, addr)
-            )
-            client_handler.daemon = True  # Kills thread if server stops
-            client_handler.start()
+        self.listen()
+        try:
+            while True:
+                client_sock, addr = self.server_socket.accept()
+                client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # Spin up a new thread for this client so others aren't blocked
+                client_handler = threading.Thread(
+                    target=self.handle_client,
+                    args=(client_sock, addr)
+                )
+                client_handler.daemon = True  # Kills thread if server stops
+                client_handler.start()
+        finally:
+            self.server_socket.close()
+            self.close()
+
+    def close(self):
+        """
+        Shutdown (also Ctrl-C): writes what the background writers still buffer.
+        Without it an ENDED / EXPIRED rental could stay ACTIVE in MySQL and be
+        restored on the next start.
+        """
+        log.info("🛑 Shutting down, saving buffered rentals and activity logs...")
+        self.rentals.close()
+        self.activity_log.close()
+        self.db.close()
 
 
 if __name__ == "__main__":
-    server = RentalServer()
+    parser = argparse.ArgumentParser(description="Central rental server")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Serve every client from one asyncio event loop instead of a thread each")
+    parser.add_argument("--backlog", type=int, default=LISTEN_BACKLOG)
+    parser.add_argument("--db-workers", type=int, default=16,
+                        help="Threads (and pooled DB connections) for blocking work in async mode")
+    parser.add_argument("--log-level", default="INFO",
+                        help="DEBUG shows every request, WARNING only problems")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+
+    if args.use_async:
+        from async_server import AsyncRentalServer
+
+        db = DatabaseManager(pool_size=args.db_workers)
+        server = AsyncRentalServer(backlog=args.backlog, db_workers=args.db_workers, db=db)
+    else:
+        server = RentalServer(backlog=args.backlog)
     server.start()
\ No newline at end of file
@@ -0,0 +1,77 @@
+import importlib
+import threading
+import time
+
+import numpy as np
+
+# Reference point of the startup timeline: when the client started importing its modules
+PROCESS_START = time.perf_counter()
+WARM_UP_FRAME = (120, 160)  # Dummy frame size (rows, cols) used to warm the models up
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first use (cv2 = LazyModule("cv2")).
+    face_recognition loads the dlib models when imported, which takes seconds;
+    this way that happens on a background thread instead of before main() runs.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)  # The import lock makes this thread-safe
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def warm_up_models():
+    """
+    Imports face_recognition and runs the detector and the encoder once on
+    a blank frame, so the first real frame doesn't pay for model loading.
+    """
+    face_recognition = importlib.import_module("face_recognition")
+    frame = np.zeros((*WARM_UP_FRAME, 3), dtype=np.uint8)
+    face_recognition.face_locations(frame)
+    # No face on a blank frame: give the encoder a box so the landmark and encoder nets run too
+    rows, cols = WARM_UP_FRAME
+    face_recognition.face_encodings(frame, [(10, cols - 10, rows - 10, 10)])
+
+
+class StartupTimeline:
+    """
+    Records when each startup step finished, relative to PROCESS_START,
+    logging every step as it happens and a summary once the client is up.
+    Steps may be marked from any thread.
+    """
+
+    def __init__(self, log, start=PROCESS_START):
+        self.log = log
+        self.start = start
+        self.steps = []  # (seconds since start, what)
+        self._lock = threading.Lock()
+
+    def mark(self, what):
+        offset = time.perf_counter() - self.start
+        with self._lock:
+            self.steps.append((offset, what))
+        self.log.info("⏱️  +%.3fs %s", offset, what)
+        return offset
+
+    def track(self, what, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) and marks when it finished and how long it took."""
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.mark(f"{what} ({time.perf_counter() - started:.2f}s)")
+        return result
+
+    def report(self):
+        with self._lock:
+            steps = sorted(self.steps)
+        lines = ["⏱️  Startup timeline:"]
+        lines += [f"  +{offset:7.3f}s  {what}" for offset, what in steps]
+        self.log.info("\n".join(lines))
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from activity_log import BatchBuffer
+
+
+class ListWriter(BatchBuffer):
+    """Stores batches in a list; 'fail' makes writes fail, 'gate' holds them."""
+
+    def __init__(self, **kwargs):
+        self.batches = []
+        self.fail = False
+        self.gate = None
+        self.active = 0
+        self.overlapped = False
+        super().__init__(**kwargs)
+
+    def write(self, batch):
+        self.active += 1
+        self.overlapped |= self.active > 1
+        try:
+            if self.gate is not None:
+                self.gate.wait()
+            if self.fail:
+                return False
+            self.batches.append([event["action"] for event in batch])
+            return True
+        finally:
+            self.active -= 1
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_write_must_be_implemented():
+    with pytest.raises(TypeError):
+        BatchBuffer()
+
+
+def test_full_batch_is_written_without_waiting_for_the_interval():
+    buffer = ListWriter(flush_interval=60, max_batch=3)
+    buffer.extend([{"action": str(i)} for i in range(3)])
+    wait_for(lambda: buffer.batches)
+    assert buffer.batches == [["0", "1", "2"]]
+    buffer.close()
+
+
+def test_partial_batch_is_written_after_the_interval():
+    buffer = ListWriter(flush_interval=0.05, max_batch=100)
+    buffer.log("alice", "UNLOCK")
+    wait_for(lambda: buffer.batches)
+    assert buffer.batches == [["UNLOCK"]]
+    buffer.close()
+
+
+def test_failed_batch_is_retried_in_order():
+    buffer = ListWriter(flush_interval=0.05, max_batch=2)
+    buffer.fail = True
+    buffer.extend([{"action": a} for a in "abc"])
+    time.sleep(0.1)
+    assert buffer.batches == [] and len(buffer) == 3
+
+    buffer.fail = False
+    wait_for(lambda: len(buffer) == 0)
+    assert buffer.batches == [["a", "b"], ["c"]]
+    buffer.close()
+
+
+def test_overflow_is_dropped_and_counted():
+    buffer = ListWriter(flush_interval=60, max_batch=100, max_buffered=2)
+    assert buffer.extend([{"action": a} for a in "abc"]) == 2
+    assert buffer.dropped == 1
+    buffer.close()
+    assert buffer.batches == [["a", "b"]]
+
+
+def test_close_flushes_what_is_left():
+    buffer = ListWriter(flush_interval=60, max_batch=100)
+    buffer.log(None, "LOCK")
+    buffer.close()
+    assert buffer.batches == [["LOCK"]]
+    assert not buffer._thread.is_alive()
+
+
+def test_close_timeout_does_not_flush_alongside_the_writer():
+    buffer = ListWriter(flush_interval=60, max_batch=1)
+    buffer.gate = threading.Event()
+    buffer.log(None, "first")
+    wait_for(lambda: buffer.active == 1)  # The writer thread is stuck in write()
+    buffer.log(None, "second")
+
+    buffer.close(timeout=0.05)
+    assert buffer.batches == []  # close() gave up instead of writing from this thread
+
+    buffer.gate.set()
+    buffer._thread.join(2)
+    assert buffer.batches == [["first"], ["second"]]
+    assert not buffer.overlapped
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+
+import client_gallery
+from client_gallery import load_gallery, save_gallery
+from face_matcher import ENCODING_DIM
+
+
+def gallery(count, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((count, ENCODING_DIM)).astype(np.float32)
+    return [f"user{i}" for i in range(count)], rows
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "gallery.fgal")
+    names, rows = gallery(3)
+    save_gallery(7, names, rows, path)
+
+    version, loaded_names, matrix, _, _ = load_gallery(path)
+    assert version == 7
+    assert list(loaded_names) == names
+    assert np.array_equal(matrix, rows)
+
+
+def test_mapped_file_keeps_the_update(tmp_path, monkeypatch):
+    path = str(tmp_path / "gallery.fgal")
+    save_gallery(1, *gallery(2), path)
+
+    # Windows refuses to replace a mapped file
+    real_replace, real_remove = os.replace, os.remove
+
+    def replace(src, dst):
+        if dst == path:
+            raise PermissionError("in use")
+        real_replace(src, dst)
+
+    def remove(name):
+        if name == path:
+            raise PermissionError("in use")
+        real_remove(name)
+    monkeypatch.setattr(client_gallery.os, "replace", replace)
+    monkeypatch.setattr(client_gallery.os, "remove", remove)
+
+    names, rows = gallery(4, seed=1)
+    save_gallery(2, names, rows, path)
+    assert os.path.exists(path + ".2")
+
+    version, loaded_names, matrix, _, _ = load_gallery(path)
+    assert version == 2 and list(loaded_names) == names
+
+    # Once the old file is free again, the next save goes back to 'path' and cleans up
+    monkeypatch.undo()
+    save_gallery(3, *gallery(1), path)
+    assert load_gallery(path)[0] == 3
+    assert not os.path.exists(path + ".2")
@@ -0,0 +1,127 @@
+import numpy as np
+
+from database_manager import DatabaseManager
+from db_pool import ConnectionPool
+from encoding_format import pack_encodings
+
+
+class UsersCursor:
+    """Answers the keyset page query from an in-memory users table."""
+
+    def __init__(self, users):
+        self.users = users
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        last_id, limit = params
+        self.rows = [row for row in self.users if row[0] > last_id][:limit]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class UsersConnection:
+    def __init__(self, users):
+        self.users = users
+        self.in_transaction = False
+
+    def cursor(self, prepared=False):
+        return UsersCursor(self.users)
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+
+def manager(users, pool_size=1):
+    db = DatabaseManager.__new__(DatabaseManager)  # No MySQL: only the pool is needed
+    db.pool = ConnectionPool(lambda: UsersConnection(users), size=pool_size, timeout=0.05)
+    return db
+
+
+def user_row(user_id, name, value):
+    blob, angles, dim = pack_encodings([[value] * 128])
+    return (user_id, name, None, blob, angles, dim)
+
+
+def test_iter_gallery_pages_by_user_id():
+    users = sorted(user_row(f"id{i:02d}", f"user{i}", i) for i in range(5))
+    pages = list(manager(users).iter_gallery(batch_size=2))
+    assert [names for names, _ in pages] == [["user0", "user1"], ["user2", "user3"], ["user4"]]
+    assert np.array_equal(pages[2][1][0], np.full(128, 4, dtype=np.float32))
+
+
+def test_iter_gallery_returns_the_connection_between_pages():
+    users = sorted(user_row(f"id{i:02d}", f"user{i}", i) for i in range(4))
+    db = manager(users, pool_size=1)
+    pages = db.iter_gallery(batch_size=2)
+    next(pages)  # A slow client is still reading this page
+
+    with db.pool.connection():
+        pass  # Would time out if the stream still held the only connection
+    assert len(list(pages)) == 1
+
+
+class LogCursor:
+    """Answers the username lookup like MySQL (case-insensitive) and records the INSERT."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.with_rows = False
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        wanted = {name.casefold() for name in params}
+        self.rows = [(name, user_id) for name, user_id in self.conn.users if name.casefold() in wanted]
+        self.with_rows = True
+
+    def fetchall(self):
+        return self.rows
+
+    def executemany(self, sql, rows):
+        self.conn.inserted.extend(rows)
+        self.rowcount = len(rows)
+
+    def close(self):
+        pass
+
+
+class LogConnection:
+    def __init__(self, users):
+        self.users = users
+        self.inserted = []
+        self.in_transaction = False
+
+    def cursor(self, prepared=False):
+        return LogCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_activity_logs_find_users_whatever_the_case():
+    conn = LogConnection([("alice", "id-1")])
+    db = DatabaseManager.__new__(DatabaseManager)
+    db.pool = ConnectionPool(lambda: conn, size=1, timeout=0.05)
+
+    events = [{"username": name, "action": "UNLOCK", "ts": 0} for name in ("Alice", "alice", "bob", None)]
+    assert db.insert_activity_logs(events)
+    assert [row[0] for row in conn.inserted] == ["id-1", "id-1", None, None]
@@ -0,0 +1,199 @@
+import threading
+import time
+
+import mysql.connector
+import pytest
+from mysql.connector import errors
+
+from db_pool import ConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, prepared=False):
+        self.prepared = prepared
+        self.executed = []
+        self.closed = False
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, params))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    """Stands in for a mysql.connector connection."""
+
+    def __init__(self):
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.closed = False
+        self.broken = False
+        self.cursors = []
+
+    def cursor(self, prepared=False):
+        cursor = FakeCursor(prepared)
+        self.cursors.append(cursor)
+        return cursor
+
+    def rollback(self):
+        if self.broken:
+            raise errors.OperationalError("Lost connection")
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def commit(self):
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        if self.broken:
+            raise errors.InterfaceError("Gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.made = []
+
+    def __call__(self):
+        conn = FakeConnection()
+        self.made.append(conn)
+        return conn
+
+
+def test_pool_never_opens_more_than_size():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=2, timeout=0.05)
+    a = pool.acquire()
+    b = pool.acquire()
+    with pytest.raises(errors.PoolError):
+        pool.acquire()
+    assert len(factory.made) == 2
+    assert pool.stats()["timeouts"] == 1
+
+    pool.release(a)
+    assert pool.acquire() is a  # Freed slot is reused, not a new connection
+    pool.release(b)
+    assert len(factory.made) == 2
+
+
+def test_acquire_waits_for_a_release():
+    pool = ConnectionPool(Factory(), size=1, timeout=2.0)
+    held = pool.acquire()
+    threading.Timer(0.05, pool.release, (held,)).start()
+
+    started = time.monotonic()
+    assert pool.acquire() is held
+    assert time.monotonic() - started < 1.0
+    assert pool.stats()["waits"] >= 1
+
+
+def test_acquire_timeout_raises_pool_error():
+    pool = ConnectionPool(Factory(), size=1, timeout=0.1)
+    pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(errors.PoolError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.1
+
+
+def test_release_rolls_back_open_transaction():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=1)
+    pooled = pool.acquire()
+    pooled.conn.in_transaction = True
+    pool.release(pooled)
+
+    assert factory.made[0].rollbacks == 1
+    assert pool.acquire().conn.in_transaction is False
+
+
+def test_error_inside_block_rolls_back():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=1)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.conn.in_transaction = True
+            raise RuntimeError("boom")
+
+    assert factory.made[0].rollbacks == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_broken_connection_frees_its_slot():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=1, timeout=0.05)
+    with pytest.raises(errors.OperationalError):
+        with pool.connection():
+            raise errors.OperationalError("Lost connection")
+
+    assert factory.made[0].closed
+    stats = pool.stats()
+    assert (stats["open"], stats["discarded"]) == (0, 1)
+    # The slot is free again: a new connection is made instead of timing out
+    assert pool.acquire().conn is factory.made[1]
+
+
+def test_failed_rollback_on_release_discards_connection():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=1)
+    pooled = pool.acquire()
+    pooled.conn.in_transaction = True
+    pooled.conn.broken = True
+    pool.release(pooled)
+
+    assert pooled.conn.closed
+    assert pool.stats()["open"] == 0
+
+
+def test_stale_idle_connection_is_health_checked():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=1, health_check_interval=0.0)
+    pooled = pool.acquire()
+    pooled.conn.broken = True
+    pool.release(pooled)
+
+    fresh = pool.acquire()
+    assert fresh is not pooled
+    assert pooled.conn.closed
+    assert pool.stats()["health_failures"] == 1
+
+
+def test_failed_connect_frees_its_slot():
+    def refuse():
+        raise mysql.connector.Error("Connection refused")
+
+    pool = ConnectionPool(refuse, size=1, timeout=0.05)
+    for _ in range(3):
+        with pytest.raises(mysql.connector.Error):
+            pool.acquire()
+    assert pool.stats()["open"] == 0
+
+
+def test_prepared_cursor_is_reused_per_statement():
+    pool = ConnectionPool(Factory(), size=1)
+    with pool.connection() as conn:
+        first = conn.execute("SELECT 1 WHERE x = %s", (1,))
+        second = conn.execute("SELECT 1 WHERE x = %s", (2,))
+        other = conn.execute("SELECT 2")
+
+    assert first is second
+    assert first.prepared
+    assert first.executed == [("SELECT 1 WHERE x = %s", (1,)), ("SELECT 1 WHERE x = %s", (2,))]
+    assert other is not first
+
+    # Still cached after a round trip through the pool
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1 WHERE x = %s", (3,)) is first
+
+
+def test_close_closes_prepared_cursors():
+    pool = ConnectionPool(Factory(), size=1)
+    with pool.connection() as conn:
+        cursor = conn.execute("SELECT 1")
+    pool.close_all()
+    assert cursor.closed
+    assert conn.conn.closed
+    assert pool.stats()["open"] == 0
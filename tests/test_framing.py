@@ -0,0 +1,103 @@
+import asyncio
+import socket
+import threading
+import zlib
+
+import pytest
+
+import framing
+from framing import (FLAG_ZLIB, CachedPayload, ConnectionClosed, FrameError, FrameReader, decode_json,
+                     encode_header, encode_payload, read_frame_async, send_frame)
+
+
+@pytest.fixture
+def sock_pair():
+    a, b = socket.socketpair()
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_small_and_large_frames_round_trip(sock_pair):
+    a, b = sock_pair
+    reader = FrameReader(b, initial_size=16)
+    small = b'{"action": "PING"}'
+    large = b"x" * (framing.SMALL_FRAME + 10)
+
+    send_frame(a, small, request_id=7)
+    flags, request_id, payload = reader.read_frame()
+    assert (flags, request_id, bytes(payload)) == (0, 7, small)
+
+    # Sent from another thread: the large frame doesn't fit the socket buffer
+    sender = threading.Thread(target=send_frame, args=(a, large, FLAG_ZLIB, 8))
+    sender.start()
+    flags, request_id, payload = reader.read_frame()
+    sender.join()
+    assert (flags, request_id, len(payload)) == (FLAG_ZLIB, 8, len(large))
+    assert bytes(payload) == large
+
+
+def test_clean_close_between_frames_returns_none(sock_pair):
+    a, b = sock_pair
+    a.close()
+    assert FrameReader(b).read_frame() is None
+
+
+def test_close_in_the_middle_of_a_frame(sock_pair):
+    a, b = sock_pair
+    a.sendall(encode_header(100) + b"partial")
+    a.close()
+    with pytest.raises(ConnectionClosed):
+        FrameReader(b).read_frame()
+
+
+def test_oversized_and_wrong_version_frames_are_rejected(sock_pair):
+    a, b = sock_pair
+    a.sendall(encode_header(1000))
+    with pytest.raises(FrameError):
+        FrameReader(b, max_frame_size=999).read_frame()
+
+    with pytest.raises(FrameError):
+        framing.parse_header(framing.HEADER.pack(1, 0, 0, 0))
+
+
+def test_payload_compression_is_negotiated_and_size_gated():
+    big = {"users": ["someone"] * 1000}
+    raw, flags = encode_payload(big)
+    assert flags == 0
+
+    packed, flags = encode_payload(big, "zlib")
+    assert flags == FLAG_ZLIB
+    assert len(packed) < len(raw)
+    assert decode_json(packed, flags) == big
+
+    tiny, flags = encode_payload({"status": "SUCCESS"}, "zlib")
+    assert flags == 0
+    assert decode_json(tiny) == {"status": "SUCCESS"}
+
+
+def test_cached_payload_compresses_once():
+    cached = CachedPayload(framing.encode_json({"users": ["a"] * 1000}))
+    first, flags = encode_payload(cached, "zlib")
+    second, _ = encode_payload(cached, "zlib")
+    assert flags == FLAG_ZLIB
+    assert first is second
+
+
+def test_decompression_bomb_is_refused():
+    bomb = zlib.compress(b"[" + b"0," * 100000 + b"0]")
+    with pytest.raises(FrameError):
+        decode_json(bomb, FLAG_ZLIB, max_size=1000)
+
+
+def test_async_reader_matches_blocking_reader():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_header(3, request_id=5) + b"abc" + encode_header(10) + b"short")
+        reader.feed_eof()
+        first = await read_frame_async(reader)
+        with pytest.raises(ConnectionClosed):
+            await read_frame_async(reader)
+        return first
+
+    assert asyncio.run(run()) == (0, 5, b"abc")
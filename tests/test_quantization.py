@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from face_matcher import FaceMatcher
+from quantization import dequantize, pack_rows, quantize, unpack_codes, unpack_rows
+
+DIM = 8
+
+
+def random_rows(count, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("precision, tolerance", [("float32", 0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_quantize_round_trip(precision, tolerance):
+    rows = random_rows(20)
+    codes, scale = quantize(rows, precision)
+    assert np.abs(dequantize(codes, precision, scale) - rows).max() <= tolerance
+
+
+def test_int8_uses_the_given_scale():
+    rows = random_rows(5)
+    _, scale = quantize(rows, "int8")
+    codes, same = quantize(rows * 0.5, "int8", scale)
+    assert same is scale
+    assert np.abs(codes).max() <= 64
+
+
+@pytest.mark.parametrize("precision", ["float32", "float16", "int8"])
+def test_pack_unpack_round_trip(precision):
+    rows = random_rows(10)
+    names = [f"user{i}" for i in range(10)]
+    codes, scale = quantize(rows, precision)
+
+    unpacked_names, unpacked_codes, unpacked_scale = unpack_codes(pack_rows(names, rows, precision))
+    assert unpacked_names == names
+    assert np.array_equal(unpacked_codes, codes)
+    if precision == "int8":
+        assert np.array_equal(unpacked_scale, scale)
+    else:
+        assert unpacked_scale is None
+
+    _, matrix = unpack_rows(pack_rows(names, rows, precision))
+    assert np.array_equal(matrix, dequantize(codes, precision, scale))
+
+
+def test_empty_gallery_packs():
+    empty = np.empty((0, DIM), dtype=np.float32)
+    names, codes, _ = unpack_codes(pack_rows([], empty, "int8"))
+    assert names == [] and codes.shape == (0, DIM)
+
+
+def test_truncated_rows_are_rejected():
+    packed = pack_rows(["a", "b"], random_rows(2), "float16")
+    packed["names"].append("c")
+    with pytest.raises(ValueError):
+        unpack_codes(packed)
+
+
+def test_int8_codes_are_kept_as_sent():
+    rows = random_rows(10)
+    names = [f"user{i}" for i in range(10)]
+    _, codes, scale = unpack_codes(pack_rows(names, rows, "int8"))
+
+    matcher = FaceMatcher(dim=DIM, precision="int8")
+    matcher.add_codes(names, codes, scale)
+    assert np.array_equal(matcher.codes, codes)
+    assert np.array_equal(matcher.scale, scale)
+
+    # A second batch with the same scale is appended untouched as well
+    matcher.add_codes(names[:2], codes[:2], scale)
+    assert np.array_equal(matcher.codes[10:], codes[:2])
+
+
+def test_int8_codes_with_another_scale_are_converted():
+    rows = random_rows(10)
+    matcher = FaceMatcher(dim=DIM, precision="int8")
+    codes, scale = quantize(rows, "int8")
+    matcher.add_codes(["a"] * 10, codes, scale)
+
+    other_codes, other_scale = quantize(rows[:3] * 0.5, "int8")
+    matcher.add_codes(["b"] * 3, other_codes, other_scale)
+    assert len(matcher) == 13
+    assert np.abs(matcher.encodings[10:] - rows[:3] * 0.5).max() <= np.max(scale)
+
+
+def test_codes_must_match_the_gallery_precision():
+    matcher = FaceMatcher(dim=DIM, precision="float16")
+    with pytest.raises(ValueError):
+        matcher.add_codes(["a"], random_rows(1))
+
+
+@pytest.mark.parametrize("precision", ["float32", "float16", "int8"])
+def test_remove_keeps_the_other_rows_matchable(precision):
+    rows = random_rows(4)
+    matcher = FaceMatcher(dim=DIM, precision=precision)
+    matcher.add_many(["a", "b", "c", "d"], rows)
+    before = matcher.codes[1:].copy()
+
+    assert matcher.remove_names(["a"]) == 1
+    assert np.array_equal(matcher.codes, before)
+    assert np.allclose(matcher.sq_norms, np.einsum('ij,ij->i', matcher.encodings, matcher.encodings))
+    assert [name for name, _ in matcher.match(rows[1:])] == ["b", "c", "d"]
+    assert matcher.match(rows[:1])[0][0] == "Unknown"
@@ -0,0 +1,129 @@
+import threading
+import time
+
+from benchmarks.memory_db import MemoryDatabase
+from rental_sessions import RentalEngine
+
+
+class Events:
+    """Collects on_event calls as (kind, username)."""
+
+    def __init__(self):
+        self.seen = []
+        self._lock = threading.Lock()
+
+    def __call__(self, kind, session):
+        with self._lock:
+            self.seen.append((kind, session.username))
+
+    def kinds(self):
+        with self._lock:
+            return [kind for kind, _ in self.seen]
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_start_and_check():
+    events = Events()
+    engine = RentalEngine(MemoryDatabase(), on_event=events)
+    assert engine.check("alice") == {"rented": False, "time_left": 0}
+
+    engine.start("alice", 600)
+    status = engine.check("alice")
+    assert status["rented"] and 599 <= status["time_left"] <= 600
+    assert engine.active_count() == 1
+    assert events.seen == [("RENTAL_STARTED", "alice")]
+    engine.close()
+
+
+def test_restart_replaces_the_old_session():
+    db = MemoryDatabase()
+    engine = RentalEngine(db)
+    first = engine.start("alice", 600)
+    second = engine.start("alice", 60)
+    assert first.status == "ENDED" and second.status == "ACTIVE"
+    assert engine.check("alice")["time_left"] <= 60
+    engine.close()
+
+    assert db.rental_sessions[first.session_id]["status"] == "ENDED"
+    restored = RentalEngine(db)
+    assert restored.check("alice")["expires_at"] == second.expires_at
+    restored.close()
+
+
+def test_replaced_session_is_not_restored_after_expiry():
+    db = MemoryDatabase()
+    engine = RentalEngine(db, warn_before=0)
+    engine.start("alice", 600)
+    engine.start("alice", 1)
+    time.sleep(1.2)
+    engine.close()
+
+    restored = RentalEngine(db)
+    assert restored.check("alice") == {"rented": False, "time_left": 0}
+    restored.close()
+
+
+def test_extend_announces_the_new_deadline():
+    events = Events()
+    engine = RentalEngine(MemoryDatabase(), on_event=events)
+    assert engine.extend("alice", 60) is None
+
+    session = engine.start("alice", 60)
+    before = session.expires_at
+    engine.extend("alice", 120)
+    assert session.expires_at == before + 120
+    assert events.kinds() == ["RENTAL_STARTED", "RENTAL_EXTENDED"]
+    engine.close()
+
+
+def test_warning_then_expiry():
+    events = Events()
+    engine = RentalEngine(MemoryDatabase(), on_event=events, warn_before=0.5)
+    session = engine.start("alice", 1)
+    wait_for(lambda: "RENTAL_EXPIRED" in events.kinds())
+    assert events.kinds() == ["RENTAL_STARTED", "RENTAL_EXPIRING", "RENTAL_EXPIRED"]
+    assert session.status == "EXPIRED"
+    assert not engine.check("alice")["rented"]
+    engine.close()
+
+
+def test_ended_session_never_expires():
+    events = Events()
+    engine = RentalEngine(MemoryDatabase(), on_event=events, warn_before=0)
+    engine.start("alice", 1)
+    assert engine.end("alice").status == "ENDED"
+    assert engine.end("alice") is None
+    time.sleep(1.2)
+    assert events.kinds() == ["RENTAL_STARTED", "RENTAL_ENDED"]
+    engine.close()
+
+
+def test_close_writes_buffered_sessions():
+    db = MemoryDatabase()
+    engine = RentalEngine(db)
+    session = engine.start("alice", 600)
+    engine.end("alice")
+    engine.close()
+    assert db.rental_sessions[session.session_id]["status"] == "ENDED"
+    assert not engine._timer.is_alive()
+
+
+def test_active_sessions_are_restored():
+    db = MemoryDatabase()
+    engine = RentalEngine(db)
+    session = engine.start("alice", 600)
+    engine.start("bob", 600)
+    engine.end("bob")
+    engine.close()
+
+    restored = RentalEngine(db)
+    assert restored.active_count() == 1
+    status = restored.check("alice")
+    assert status["rented"] and status["expires_at"] == session.expires_at
+    restored.close()